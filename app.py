@@ -1,129 +1,238 @@
 """
 Aplicación Flask para el Sistema de Gestión de Gimnasio - VITO'S GYM
 """
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, redirect, url_for
+from werkzeug.utils import import_string
 from pymongo import MongoClient
 from datetime import datetime
 import os
 from config import config
+from cli import register_commands
+from utils.serializacion import BSONJSONProvider
+from utils.compresion import configurar_compresion
+from utils.fragmentos import configurar_plantillas
+from reconocimiento import motor, despachador, PoolPuntuacion
+from utils.propagacion import propagador
+from utils.importacion_biometrica import importaciones
 
 # Importar modelos
 from models import db_manager, Usuario, Membresia, Asistencia, PlantillaBiometrica, Plan
 
-# Importar blueprints
-from routes import usuarios_bp, membresias_bp, asistencias_bp, biometria_bp, fotos_bp
-
-# Crear la aplicación Flask
-app = Flask(__name__)
-
-# Cargar configuración
-env = os.getenv('FLASK_ENV', 'development')
-app.config.from_object(config[env])
-
-# Conectar a MongoDB usando el singleton
-db_manager.connect(app.config['MONGO_URI'], app.config['DATABASE_NAME'])
-
-# Registrar blueprints
-app.register_blueprint(usuarios_bp)
-app.register_blueprint(membresias_bp)
-app.register_blueprint(asistencias_bp)
-app.register_blueprint(biometria_bp)
-app.register_blueprint(fotos_bp)
-
-# =====================================
-# RUTAS PRINCIPALES
-# =====================================
-
-@app.route('/')
-def index():
-    """Dashboard principal"""
-    if db_manager.db is None:
-        return "Error: No se pudo conectar a la base de datos", 500
-    
-    # Obtener estadísticas usando los modelos
-    usuario_model = Usuario(db_manager.db)
-    membresia_model = Membresia(db_manager.db)
-    asistencia_model = Asistencia(db_manager.db)
-    
-    stats = {
-        'total_usuarios': usuario_model.get_stats()['total'],
-        'usuarios_activos': usuario_model.get_stats()['activos'],
-        'membresias_vigentes': membresia_model.get_stats()['vigentes'],
-        'asistencias_hoy': len(asistencia_model.get_hoy()),
+# Blueprints por nombre: solo se importan los que usa cada punto de entrada
+BLUEPRINTS = {
+    'usuarios': 'routes.usuarios:usuarios_bp',
+    'membresias': 'routes.membresias:membresias_bp',
+    'asistencias': 'routes.asistencias:asistencias_bp',
+    'biometria': 'routes.biometria:biometria_bp',
+    'fotos': 'routes.fotos:fotos_bp',
+    'debug': 'routes.debug:debug_bp',
+    'metricas': 'routes.metricas:metricas_bp'
+}
+
+
+def create_app(env=None, conectar=True, blueprints=None):
+    """Crear y configurar la aplicación
+
+    No espera a MongoDB: con conectar=True la conexión (e índices) se
+    establece en segundo plano con reintentos; con conectar=False cada
+    proceso crea su cliente en el primer uso (servidores que hacen fork,
+    ver wsgi.py). 'blueprints' limita las secciones cargadas (por defecto
+    BLUEPRINTS de la configuración, o todas); un subconjunto solo sirve
+    las APIs, porque las páginas HTML enlazan a las demás secciones.
+    """
+    app = Flask(__name__)
+    app.json = BSONJSONProvider(app)
+
+    # Cargar configuración
+    env = env or os.getenv('FLASK_ENV', 'development')
+    app.config.from_object(config[env])
+
+    # Bytecode de plantillas en disco y etiqueta {% cache %} (antes de usar jinja_env)
+    configurar_plantillas(app)
+
+    # MongoDB usando el singleton (pool por proceso)
+    opciones_mongo = {
+        'maxPoolSize': app.config['MONGO_MAX_POOL_SIZE'],
+        'minPoolSize': app.config['MONGO_MIN_POOL_SIZE'],
+        'waitQueueTimeoutMS': app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        'reportes_max_staleness': app.config['MONGO_REPORTES_MAX_STALENESS']
     }
-    
-    return render_template('index.html', stats=stats)
-
-@app.route('/api/stats')
-def api_stats():
-    """API: Estadísticas generales"""
-    if db_manager.db is None:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
-    # Obtener estadísticas de cada modelo
-    usuario_model = Usuario(db_manager.db)
-    membresia_model = Membresia(db_manager.db)
-    plantilla_model = PlantillaBiometrica(db_manager.db)
-    asistencia_model = Asistencia(db_manager.db)
-    
-    stats = {
-        'usuarios': usuario_model.get_stats(),
-        'membresias': membresia_model.get_stats(),
-        'plantillas': plantilla_model.get_stats(),
-        'asistencias_hoy': len(asistencia_model.get_hoy())
+    db_manager.configurar(app.config['MONGO_URI'], app.config['DATABASE_NAME'], **opciones_mongo)
+
+    # Galería biométrica mapeada desde disco
+    motor.configurar(app.config['BIOMETRIA_GALERIA_DIR'])
+    ann = {
+        'tipos': app.config['BIOMETRIA_ANN_TIPOS'],
+        'minimo': app.config['BIOMETRIA_ANN_MINIMO'],
+        'nlist': app.config['BIOMETRIA_ANN_NLIST'],
+        'subvectores': app.config['BIOMETRIA_ANN_SUBVECTORES'],
+        'nprobe': app.config['BIOMETRIA_ANN_NPROBE'],
+        'reordenar': app.config['BIOMETRIA_ANN_REORDENAR']
     }
-    
-    return jsonify(stats)
-
-@app.route('/usuarios')
-def usuarios_redirect():
-    """Redireccionar a la lista de usuarios"""
-    from flask import redirect, url_for
-    return redirect(url_for('usuarios.index'))
-
-@app.route('/membresias')
-def membresias_redirect():
-    """Redireccionar a membresías"""
-    from flask import redirect, url_for
-    return redirect(url_for('membresias.index'))
-
-@app.route('/asistencias')
-def asistencias_redirect():
-    """Redireccionar a asistencias"""
-    from flask import redirect, url_for
-    return redirect(url_for('asistencias.index'))
-
-@app.route('/biometria')
-def biometria_redirect():
-    """Redireccionar a biometría"""
-    from flask import redirect, url_for
-    return redirect(url_for('biometria.index'))
-
-@app.route('/reportes')
-def reportes():
-    """Reportes y estadísticas"""
-    return render_template('reportes.html')
+    motor.configurar_ann(**ann)
+    despachador.configurar(app.config['BIOMETRIA_LOTE_MAX'], app.config['BIOMETRIA_LOTE_ESPERA_MS'])
+    importaciones.configurar(app.config['BIOMETRIA_IMPORTACION_DIR'], app.config['BIOMETRIA_IMPORTACION_PROCESOS'],
+                             app.config['BIOMETRIA_COMPRESION'])
+
+    # Puntuación biométrica en procesos aparte (no compite por el GIL con el resto de las rutas)
+    if app.config['BIOMETRIA_PROCESOS'] > 0:
+        despachador.configurar(pool=PoolPuntuacion(
+            app.config['BIOMETRIA_PROCESOS'],
+            app.config['BIOMETRIA_GALERIA_DIR'],
+            ann=ann,
+            mongo=(app.config['MONGO_URI'], app.config['DATABASE_NAME']),
+            cola_max=app.config['BIOMETRIA_PROCESOS_COLA_MAX'],
+            timeout=app.config['BIOMETRIA_TIMEOUT']
+        ).iniciar(crear=conectar))
+
+    if conectar:
+        # La galería en disco se construye (si falta) cuando hay conexión; las
+        # colas de trabajos retoman lo que quedó pendiente
+        tareas = [asegurar_galeria] if despachador.pool is not None else []
+        tareas.append(iniciar_trabajos)
+        db_manager.calentar(tareas=tareas)
+
+    # Salud del proceso y de MongoDB (/healthz, /readyz): siempre
+    from routes.salud import salud_bp
+    app.register_blueprint(salud_bp)
+
+    # Registrar blueprints
+    nombres = blueprints or app.config['BLUEPRINTS'] or list(BLUEPRINTS)
+    desconocidos = set(nombres) - set(BLUEPRINTS)
+    if desconocidos:
+        raise ValueError(f"Blueprints desconocidos: {', '.join(sorted(desconocidos))} (válidos: {', '.join(BLUEPRINTS)})")
+    # Perfilado de MongoDB por solicitud (/debug/perf) y métricas para Prometheus (/metrics)
+    opcionales = {'debug': app.config['PERF_PERFILADO'], 'metricas': app.config['METRICAS']}
+    for nombre in nombres:
+        if opcionales.get(nombre, True):
+            app.register_blueprint(import_string(BLUEPRINTS[nombre]))
+
+    registrar_rutas(app)
+
+    # Después de los blueprints: /metrics cuenta los bytes ya comprimidos
+    configurar_compresion(app)
+
+    # Registrar comandos CLI
+    register_commands(app)
+
+    return app
+
+
+def iniciar_trabajos(db=None):
+    """Threads de las colas de trabajos en segundo plano de este proceso (tarea de calentar)"""
+    propagador.iniciar()
+    importaciones.iniciar()
+
+
+def asegurar_galeria(db=None):
+    """Construir la galería en disco si falta (tarea de calentar)
+
+    Con varios procesos es lo que comparten: sin ella cada worker tiene su
+    galería en memoria y las altas, bajas y reconstrucciones de uno no llegan
+    a los demás; con ella se propagan por el log de deltas.
+    """
+    if motor.almacen is not None:
+        motor.almacen.construir_si_falta(db if db is not None else db_manager.db)
+
+
+def preparar_galeria_compartida():
+    """Construir la galería en disco antes de arrancar varios procesos (en el maestro)
+
+    La conexión se cierra después para no heredar sockets ni threads.
+    """
+    if motor.almacen is None or motor.almacen.manifiesto() is not None:
+        return
+    if db_manager.verificar(crear_indices=False):
+        asegurar_galeria(db_manager.db)
+    db_manager.close()
+
+
+def cerrar_recursos():
+    """Apagado ordenado: workers de puntuación e importación y conexión a MongoDB de este proceso"""
+    if despachador.pool is not None:
+        despachador.pool.cerrar()
+    importaciones.cerrar()
+    db_manager.close()
+
+
+def registrar_rutas(app):
+    """Rutas principales y manejadores de error"""
+
+    # =====================================
+    # RUTAS PRINCIPALES
+    # =====================================
+
+    @app.route('/')
+    def index():
+        """Dashboard principal"""
+        if db_manager.db is None:
+            return "Error: No se pudo conectar a la base de datos", 500
+
+        # Las estadísticas de usuarios y membresías se calculan dentro del
+        # fragmento en caché: con un acierto no se consultan
+        usuario_model = Usuario(db_manager.db)
+        membresia_model = Membresia(db_manager.db)
+        asistencia_model = Asistencia(db_manager.db)
+
+        return render_template('index.html',
+                               usuario_stats=usuario_model.get_stats,
+                               membresia_stats=membresia_model.get_stats,
+                               asistencias_hoy=asistencia_model.contar_hoy())
+
+    @app.route('/api/stats')
+    def api_stats():
+        """API: Estadísticas generales"""
+        if db_manager.db is None:
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        # Obtener estadísticas de cada modelo
+        usuario_model = Usuario(db_manager.db)
+        membresia_model = Membresia(db_manager.db)
+        plantilla_model = PlantillaBiometrica(db_manager.db)
+        asistencia_model = Asistencia(db_manager.db)
+
+        stats = {
+            'usuarios': usuario_model.get_stats(),
+            'membresias': membresia_model.get_stats(),
+            'plantillas': plantilla_model.get_stats(),
+            'asistencias_hoy': asistencia_model.contar_hoy()
+        }
+
+        return jsonify(stats)
 
+    # Atajos /usuarios, /membresias, ... (solo de las secciones cargadas)
+    for seccion in ('usuarios', 'membresias', 'asistencias', 'biometria'):
+        if seccion in app.blueprints:
+            app.add_url_rule(f'/{seccion}', f'{seccion}_redirect',
+                             lambda seccion=seccion: redirect(url_for(f'{seccion}.index')))
 
-# =====================================
-# MANEJADORES DE ERRORES
-# =====================================
+    @app.route('/reportes')
+    def reportes():
+        """Reportes y estadísticas"""
+        return render_template('reportes.html')
 
-@app.errorhandler(404)
-def not_found(error):
-    """Página no encontrada"""
-    return render_template('404.html'), 404
+    # =====================================
+    # MANEJADORES DE ERRORES
+    # =====================================
+
+    @app.errorhandler(404)
+    def not_found(error):
+        """Página no encontrada"""
+        return render_template('404.html'), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        """Error interno del servidor"""
+        return render_template('500.html'), 500
 
-@app.errorhandler(500)
-def internal_error(error):
-    """Error interno del servidor"""
-    return render_template('500.html'), 500
 
 # =====================================
 # PUNTO DE ENTRADA
 # =====================================
 
 if __name__ == '__main__':
+    env = os.getenv('FLASK_ENV', 'development')
+    app = create_app(env)
     print("\n" + "="*60)
     print("🏋️  VITO'S GYM - Sistema de Gestión de Gimnasio")
     print("="*60)
@@ -138,4 +247,3 @@ if __name__ == '__main__':
         port=app.config['PORT'],
         debug=app.config['DEBUG']
     )
-
@@ -0,0 +1,225 @@
+"""
+Punto de entrada ASGI: API asíncrona para terminales junto a la UI Flask
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+    python asgi.py                      (mismo servidor con la configuración de config.py)
+
+Los endpoints que llaman los torniquetes corren en el event loop con
+AsyncMongoClient, así que miles de conexiones keep-alive no ocupan un hilo
+cada una:
+
+    POST /asistencias/api/registrar
+    GET  /asistencias/api/verificar/<usuario_id>
+    POST /biometria/api/verificar
+
+Todo lo demás (UI, /metrics, resto de la API) lo atiende la app Flask
+montada debajo, en el pool de hilos del servidor. Los nombres de las rutas
+son los endpoints de Flask equivalentes: las métricas gym_http_* las
+cuentan con las mismas etiquetas.
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+from app import create_app, cerrar_recursos
+from models import db_manager, AsistenciaAsync
+from reconocimiento import despachador, PoolSaturado
+from utils.serializacion import bson_default
+
+
+class RespuestaBSON(JSONResponse):
+    """JSON con ObjectId/datetime serializados igual que en la app Flask"""
+
+    def render(self, content):
+        return json.dumps(content, default=bson_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+router = APIRouter(default_response_class=RespuestaBSON)
+
+
+async def leer_json(request):
+    """Cuerpo JSON como dict (None si no es JSON válido, igual que request.get_json en Flask)"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@router.post('/asistencias/api/registrar', name='asistencias.api_registrar')
+async def api_registrar(request: Request):
+    """API: Registrar asistencia (para sistemas biométricos)"""
+    try:
+        data = await leer_json(request)
+        if data is None:
+            return RespuestaBSON({'success': False, 'error': 'JSON requerido'}, status_code=400)
+
+        usuario_id = data.get('usuario_id')
+        metodo = data.get('metodo', 'biometrico')
+
+        if not usuario_id:
+            return RespuestaBSON({'success': False, 'error': 'usuario_id requerido'}, status_code=400)
+
+        asistencia_id = await AsistenciaAsync(request.app.state.db).registrar({
+            'usuario_id': int(usuario_id),
+            'tipo_acceso': metodo,
+            'notas': ''
+        })
+
+        # RespuestaBSON explícita: devolver el dict pasaría por jsonable_encoder, que no conoce ObjectId
+        return RespuestaBSON({
+            'success': True,
+            'asistencia_id': asistencia_id,
+            'mensaje': 'Asistencia registrada'
+        })
+
+    except Exception as e:
+        return RespuestaBSON({'success': False, 'error': str(e)}, status_code=500)
+
+
+@router.get('/asistencias/api/verificar/{usuario_id}', name='asistencias.api_verificar')
+async def api_verificar_asistencia(usuario_id: int, request: Request):
+    """API: Verificar si el usuario ya registró asistencia hoy"""
+    asistencia = await AsistenciaAsync(request.app.state.db).registro_de_hoy(usuario_id)
+
+    if asistencia:
+        return RespuestaBSON({'registrado': True, 'hora': asistencia['fecha'].strftime('%H:%M:%S')})
+    return RespuestaBSON({'registrado': False})
+
+
+@router.post('/biometria/api/verificar', name='biometria.api_verificar')
+async def api_verificar_biometria(request: Request):
+    """API: Verificar identidad biométrica (la puntuación la hace el despachador de lotes)"""
+    try:
+        data = await leer_json(request)
+        if data is None:
+            return RespuestaBSON({'success': False, 'error': 'JSON requerido'}, status_code=400)
+
+        usuario_id = data.get('usuario_id')
+        tipo = data.get('tipo', 'Huella Digital')
+        template_capturado = data.get('template')
+
+        if not usuario_id or not template_capturado:
+            return RespuestaBSON({'success': False, 'error': 'usuario_id y template requeridos'}, status_code=400)
+
+        config = request.app.state.config
+        umbral = float(data.get('umbral', config['BIOMETRIA_UMBRAL']))
+        future = despachador.encolar_verificacion(int(usuario_id), tipo, template_capturado, umbral=umbral)
+        # shield: al vencer el plazo no se cancela el Future que el despachador todavía va a resolver
+        resultado = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), config['BIOMETRIA_TIMEOUT'])
+
+        if resultado is None:
+            return RespuestaBSON({'success': False, 'error': 'No se encontraron plantillas para este usuario'},
+                                 status_code=404)
+
+        return RespuestaBSON({
+            'success': True,
+            'verificado': resultado['verificado'],
+            'confianza': resultado['confianza'],
+            'usuario_id': usuario_id
+        })
+
+    except ValueError as e:
+        return RespuestaBSON({'success': False, 'error': str(e)}, status_code=400)
+    except asyncio.TimeoutError:
+        return RespuestaBSON({'success': False, 'error': 'Tiempo de espera agotado'}, status_code=503)
+    except PoolSaturado as e:
+        return RespuestaBSON({'success': False, 'error': str(e)}, status_code=503)
+    except Exception as e:
+        return RespuestaBSON({'success': False, 'error': str(e)}, status_code=500)
+
+
+class MetricasHTTP:
+    """Middleware ASGI: gym_http_* para las rutas del router asíncrono
+
+    Las rutas de Flask montadas debajo ya se miden con los hooks de
+    routes/metricas.py; aquí solo se cuentan las que atiende FastAPI.
+    """
+
+    def __init__(self, app, rutas):
+        from routes import metricas
+        self.app = app
+        self.rutas = rutas
+        self.metricas = metricas
+
+    def _etiquetas(self, scope):
+        """(blueprint, endpoint) de la ruta del router que atiende la solicitud, o None"""
+        for ruta in self.rutas:
+            if ruta.matches(scope)[0] == Match.FULL:
+                return tuple(ruta.name.split('.', 1))
+        return None
+
+    async def __call__(self, scope, receive, send):
+        etiquetas = self._etiquetas(scope) if scope['type'] == 'http' else None
+        if etiquetas is None:
+            await self.app(scope, receive, send)
+            return
+
+        m = self.metricas
+        status = [500]
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                status[0] = mensaje['status']
+                largo = dict(mensaje.get('headers', ())).get(b'content-length')
+                if largo is not None:
+                    m.TAMANO.observar(int(largo), etiquetas)
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        m.EN_CURSO.sumar(etiquetas[:1])
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            m.DURACION.observar(time.perf_counter() - inicio, etiquetas)
+            m.SOLICITUDES.incrementar(etiquetas + (scope['method'], str(status[0])))
+            m.EN_CURSO.restar(etiquetas[:1])
+
+
+def crear_api(env=None):
+    """App ASGI: endpoints de terminales + la app Flask montada para el resto"""
+    flask_app = create_app(env or os.getenv('FLASK_ENV', 'production'))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # El cliente asíncrono queda ligado a este event loop
+        client = db_manager.cliente_async()
+        app.state.db = client[flask_app.config['DATABASE_NAME']]
+        try:
+            yield
+        finally:
+            await client.close()
+            cerrar_recursos()
+
+    app = FastAPI(title="VITO'S GYM - API de terminales", lifespan=lifespan,
+                  docs_url=None, redoc_url=None, openapi_url=None)
+    app.state.config = flask_app.config
+    app.include_router(router)
+    if 'metricas' in flask_app.blueprints:
+        app.add_middleware(MetricasHTTP, rutas=router.routes)
+    # El resto de las rutas: la app Flask completa
+    app.mount('/', WSGIMiddleware(flask_app))
+    return app
+
+
+if __name__ == '__main__':
+    import uvicorn
+    from config import config
+
+    # Los workers importan 'asgi:app'; este proceso solo los supervisa
+    ajustes = config[os.getenv('FLASK_ENV', 'production')]
+    if ajustes.WEB_WORKERS > 1:
+        # Galería en disco compartida antes de arrancar los workers (ver wsgi.py)
+        from app import preparar_galeria_compartida
+        create_app(os.getenv('FLASK_ENV', 'production'), conectar=False)
+        preparar_galeria_compartida()
+    uvicorn.run('asgi:app', host=ajustes.HOST, port=ajustes.ASGI_PORT, workers=ajustes.WEB_WORKERS,
+                limit_concurrency=ajustes.ASGI_LIMITE_CONEXIONES, backlog=ajustes.ASGI_BACKLOG,
+                timeout_keep_alive=ajustes.ASGI_KEEPALIVE, timeout_graceful_shutdown=ajustes.WEB_GRACEFUL_TIMEOUT)
+else:
+    app = crear_api()
@@ -0,0 +1,344 @@
+"""
+Comandos de línea (flask <comando>) para tareas de mantenimiento
+"""
+import click
+from models import db_manager
+
+
+def register_commands(app):
+    """Registrar los comandos CLI en la aplicación"""
+
+    @app.cli.command('importar-usuarios')
+    @click.argument('ruta', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', default=500, show_default=True, help='Filas por lote de escritura')
+    def importar_usuarios(ruta, lote):
+        """Importar usuarios desde un archivo CSV o XLSX"""
+        from utils.importacion import ImportadorUsuarios, leer_filas
+
+        importador = ImportadorUsuarios(db_manager.db, tamano_lote=lote)
+        with open(ruta, 'rb') as archivo:
+            reporte = importador.importar(leer_filas(archivo, ruta))
+
+        click.echo(f"✓ Filas procesadas: {reporte['total']}")
+        click.echo(f"  Insertados: {reporte['insertados']}")
+        click.echo(f"  Actualizados: {reporte['actualizados']}")
+        if reporte['errores']:
+            click.echo(f"✗ Filas con errores: {len(reporte['errores'])}")
+            for error in reporte['errores']:
+                click.echo(f"  Fila {error['fila']}: {error['error']}")
+
+    @app.cli.command('importar-plantillas')
+    @click.argument('ruta', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', default=1000, show_default=True, help='Registros por lote')
+    @click.option('--procesos', type=int, default=None, help='Workers de normalización (por defecto BIOMETRIA_IMPORTACION_PROCESOS)')
+    @click.option('--dispositivo', default='Importación', show_default=True, help='Dispositivo si el registro no lo indica')
+    def importar_plantillas(ruta, lote, procesos, dispositivo):
+        """Importar plantillas biométricas desde un volcado JSONL o CSV"""
+        from reconocimiento import motor
+        from utils.importacion_biometrica import ImportadorPlantillas, leer_registros
+
+        importador = ImportadorPlantillas(
+            db_manager.db, tamano_lote=lote,
+            procesos=app.config['BIOMETRIA_IMPORTACION_PROCESOS'] if procesos is None else procesos,
+            compresion=app.config['BIOMETRIA_COMPRESION'], dispositivo=dispositivo
+        )
+        with open(ruta, 'rb') as archivo:
+            reporte = importador.importar(leer_registros(archivo, ruta))
+
+        click.echo(f"✓ Registros procesados: {reporte['total']}")
+        click.echo(f"  Plantillas insertadas: {reporte['insertadas']}")
+        click.echo(f"  Usuarios actualizados: {reporte['usuarios']}")
+        if reporte['errores']:
+            click.echo(f"✗ Registros con errores: {len(reporte['errores'])}")
+            for error in reporte['errores']:
+                click.echo(f"  Fila {error['fila']}: {error['error']}")
+
+        if reporte['insertadas']:
+            motor.reconstruir(db_manager.db)
+            click.echo("✓ Galería biométrica regenerada")
+
+    @app.cli.command('normalizar-plantillas')
+    def normalizar_plantillas():
+        """Unificar los campos 'tipo'/'tipo_plantilla' y la marca tiene_template_real"""
+        from models import PlantillaBiometrica
+
+        modificadas = PlantillaBiometrica(db_manager.db).normalizar_tipos()
+        click.echo(f"✓ Plantillas normalizadas: {modificadas}")
+
+    @app.cli.command('migrar-templates')
+    @click.option('--lote', default=500, show_default=True, help='Plantillas por lote')
+    @click.option('--compresion', type=click.Choice(['zlib', 'zstd', 'none']), default=None,
+                  help='Compresión (por defecto BIOMETRIA_COMPRESION)')
+    def migrar_templates(lote, compresion):
+        """Convertir los templates JSON existentes al formato binario compacto"""
+        from reconocimiento import migrar_templates as migrar
+
+        def progreso(convertidas, errores):
+            click.echo(f"  Convertidas: {convertidas} (inválidas: {errores})")
+
+        convertidas, errores = migrar(db_manager.db, tamano_lote=lote,
+                                      compresion=compresion or app.config['BIOMETRIA_COMPRESION'],
+                                      progreso=progreso)
+        click.echo(f"✓ Templates convertidos: {convertidas}")
+        if errores:
+            click.echo(f"✗ Templates inválidos sin convertir: {errores}")
+
+    @app.cli.command('construir-galeria')
+    def construir_galeria():
+        """Exportar las plantillas activas a la galería en disco"""
+        from reconocimiento import AlmacenGaleria
+
+        almacen = AlmacenGaleria(app.config['BIOMETRIA_GALERIA_DIR'])
+        manifiesto = almacen.construir(db_manager.db)
+
+        click.echo(f"✓ Galería generación {manifiesto['generacion']} en {almacen.directorio}")
+        for tipo, info in manifiesto['tipos'].items():
+            click.echo(f"  {tipo}: {info['total']} plantillas x {info['dimension']}")
+        if manifiesto['descartadas']:
+            click.echo(f"  Descartadas (template inválido o de otra dimensión): {manifiesto['descartadas']}")
+
+    @app.cli.command('evaluar-ann')
+    @click.option('--tipo', default='Rostro', show_default=True, help='Tipo de plantilla')
+    @click.option('--consultas', default=200, show_default=True, help='Plantillas de la galería usadas como consulta')
+    @click.option('--top-k', default=5, show_default=True)
+    @click.option('--nprobe', multiple=True, type=int, help='Valores a probar (repetible)')
+    def evaluar_ann(tipo, consultas, top_k, nprobe):
+        """Medir recall y latencia del índice aproximado frente a la búsqueda exacta"""
+        import time
+        import numpy as np
+        from reconocimiento import motor
+
+        galeria = motor.galeria(tipo)
+        if galeria is None or len(galeria) == 0:
+            click.echo(f"✗ No hay galería de {tipo}")
+            return
+
+        motor.ann_tipos.add(tipo)
+        motor.ann_minimo = 1
+        inicio = time.perf_counter()
+        indice = motor.indice(tipo, galeria, esperar=True)
+        click.echo(f"Índice de {tipo}: {len(galeria)} plantillas, "
+                   f"{indice.centroides.shape[0]} listas, {indice.m} subvectores "
+                   f"({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+
+        rng = np.random.default_rng(0)
+        filas = rng.choice(len(galeria), min(consultas, len(galeria)), replace=False)
+        vectores = galeria.filas(filas)
+
+        inicio = time.perf_counter()
+        exactos = [{c['usuario_id'] for c in galeria.candidatos(fila, top_k)} for fila in galeria.puntuar(vectores)]
+        exacta_ms = (time.perf_counter() - inicio) * 1000 / len(filas)
+        click.echo(f"  exacta: {exacta_ms:.2f} ms/consulta")
+
+        for valor in nprobe or (1, 2, 4, 8, 16, 32):
+            inicio = time.perf_counter()
+            aproximados = [{c['usuario_id'] for c in motor.buscar_aproximado(indice, galeria, vector, top_k, valor)}
+                           for vector in vectores]
+            ms = (time.perf_counter() - inicio) * 1000 / len(filas)
+            recall = np.mean([len(a & e) / len(e) if e else 1.0 for a, e in zip(aproximados, exactos)])
+            click.echo(f"  nprobe={valor:<3} recall@{top_k}={recall:.3f}  {ms:.2f} ms/consulta")
+
+    @app.cli.command('auditar-indices')
+    @click.option('--uri', default=None, help='MongoDB del dataset a auditar (por defecto MONGO_URI)')
+    @click.option('--db', 'db_name', default=None, help='Base de datos (por defecto DATABASE_NAME)')
+    @click.option('--aplicar', is_flag=True, help='Crear antes los índices declarados en el dataset')
+    @click.option('--estricto', is_flag=True, help='Terminar con código 1 si hay consultas sin índice')
+    def auditar_indices(uri, db_name, aplicar, estricto):
+        """Revisar con explain() el plan de cada consulta de los modelos"""
+        from pymongo import MongoClient
+        from models.indices import aplicar_indices, auditar
+
+        uri = uri or app.config['MONGO_URI']
+        db_name = db_name or app.config['DATABASE_NAME']
+        if aplicar:
+            client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+            click.echo(f"✓ Índices verificados: {aplicar_indices(client[db_name])}")
+            client.close()
+
+        fallidas = 0
+        for fila in auditar(uri, db_name):
+            detalle = ', '.join(fila['indices']) or '/'.join(dict.fromkeys(fila['etapas']))
+            if not fila['problemas']:
+                click.echo(f"✓ {fila['consulta']} [{fila['coleccion']}] {detalle}")
+            elif fila['permitido']:
+                click.echo(f"~ {fila['consulta']} [{fila['coleccion']}] {', '.join(fila['problemas'])} (permitido)")
+            else:
+                fallidas += 1
+                click.echo(f"✗ {fila['consulta']} [{fila['coleccion']}] {', '.join(fila['problemas'])}")
+
+        if fallidas:
+            click.echo(f"✗ Consultas con problemas: {fallidas}")
+            if estricto:
+                raise SystemExit(1)
+        else:
+            click.echo("✓ Todas las consultas usan índices")
+
+    @app.cli.command('benchmark-modelos')
+    @click.option('--uri', default=None, help='MongoDB del benchmark (por defecto MONGO_URI)')
+    @click.option('--db', 'db_name', default='gimnasio_benchmark', show_default=True, help='Base de datos del benchmark')
+    @click.option('--memoria', is_flag=True, help='Usar mongomock en el proceso en lugar de un MongoDB local')
+    @click.option('--sembrar', is_flag=True, help='Regenerar el dataset antes de medir (borra sus colecciones)')
+    @click.option('--usuarios', default=1500, show_default=True)
+    @click.option('--plantillas', default=12000, show_default=True)
+    @click.option('--asistencias', default=1_000_000, show_default=True)
+    @click.option('--anios', default=3, show_default=True, help='Años de historial de membresías y asistencias')
+    @click.option('--repeticiones', default=30, show_default=True)
+    @click.option('--calentamiento', default=3, show_default=True)
+    @click.option('--max-segundos', default=10.0, show_default=True, help='Tiempo máximo medido por caso')
+    @click.option('--solo', multiple=True, help='Medir solo los casos que contienen el texto (repetible)')
+    @click.option('--baseline', 'ruta_baseline', default='data/benchmark_modelos.json', show_default=True)
+    @click.option('--guardar', is_flag=True, help='Guardar los resultados como nueva baseline')
+    @click.option('--tolerancia', default=0.25, show_default=True, help='Empeoramiento relativo del p50 que cuenta como regresión')
+    @click.option('--estricto', is_flag=True, help='Terminar con código 1 si hay regresiones o casos con error')
+    def benchmark_modelos(uri, db_name, memoria, sembrar, usuarios, plantillas, asistencias, anios,
+                          repeticiones, calentamiento, max_segundos, solo, ruta_baseline, guardar,
+                          tolerancia, estricto):
+        """Medir los métodos de los modelos sobre un dataset sembrado y compararlos con la baseline"""
+        import os
+        from pymongo import MongoClient
+        from utils import benchmark
+
+        if memoria:
+            try:
+                import mongomock
+            except ImportError:
+                raise click.ClickException("--memoria requiere mongomock (pip install mongomock)")
+            client = mongomock.MongoClient()
+            sembrar = True
+        else:
+            client = MongoClient(uri or app.config['MONGO_URI'], serverSelectionTimeoutMS=5000)
+
+        try:
+            db = client[db_name]
+            # Una base sin asistencias también se siembra: los mismos resguardos en ambos casos
+            sembrar = sembrar or db.asistencias.estimated_document_count() == 0
+            if sembrar and not memoria:
+                if db_name == app.config['DATABASE_NAME']:
+                    raise click.ClickException("Sembrar borraría la base de la aplicación; usar otra --db")
+                if not benchmark.se_puede_sembrar(db):
+                    raise click.ClickException(f"{db_name} tiene usuarios que no sembró el benchmark; "
+                                               "sembrar los borraría (usar otra --db)")
+            if sembrar:
+                click.echo(f"Sembrando {db_name}...")
+                conteos = benchmark.sembrar(db, usuarios, plantillas, asistencias, anios,
+                                            progreso=lambda mensaje: click.echo(f"  {mensaje}"))
+                click.echo("✓ Dataset: " + ', '.join(f"{c}={n}" for c, n in conteos.items()))
+
+            def mostrar(nombre, r):
+                if 'error' in r:
+                    click.echo(f"  ✗ {nombre}: {r['error']}")
+                    return
+                click.echo(f"  {nombre:<42} p50 {r['p50']:>9.2f}  p95 {r['p95']:>9.2f}  "
+                           f"p99 {r['p99']:>9.2f} ms  (n={r['n']})")
+
+            # Antes de medir: los casos de escritura agregan documentos
+            info = benchmark.entorno(db)
+            resultados = benchmark.ejecutar(db, repeticiones=repeticiones, calentamiento=calentamiento,
+                                            max_segundos=max_segundos, filtro=solo, progreso=mostrar)
+        finally:
+            client.close()
+
+        regresiones = 0
+        if os.path.exists(ruta_baseline):
+            base = benchmark.cargar_baseline(ruta_baseline)
+            if not benchmark.mismo_dataset(base['entorno'].get('dataset'), info['dataset']):
+                click.echo("~ La baseline se midió con otro dataset; la comparación es orientativa")
+            click.echo(f"Comparación con {ruta_baseline} ({base['entorno'].get('fecha')}):")
+            for fila in benchmark.comparar(resultados, base, tolerancia, filtro=solo):
+                if fila['estado'] == 'nuevo':
+                    click.echo(f"  + {fila['caso']} (sin baseline)")
+                elif fila['estado'] == 'error':
+                    click.echo(f"  ✗ {fila['caso']}: error ({fila['error']})")
+                elif fila['estado'] == 'faltante':
+                    click.echo(f"  ✗ {fila['caso']}: está en la baseline y no se midió")
+                elif fila['estado'] != 'igual':
+                    marca = '✗' if fila['estado'] == 'regresion' else '✓'
+                    click.echo(f"  {marca} {fila['caso']}: {fila['base']:.2f} → {fila['p50']:.2f} ms "
+                               f"({fila['cambio']:+.0%})")
+                regresiones += fila['estado'] in benchmark.FALLAS
+            click.echo(f"{'✗' if regresiones else '✓'} Regresiones: {regresiones}")
+        else:
+            # Sin baseline los errores igual hacen fallar --estricto
+            regresiones = sum('error' in r for r in resultados.values())
+
+        if guardar:
+            os.makedirs(os.path.dirname(ruta_baseline) or '.', exist_ok=True)
+            benchmark.guardar_baseline(ruta_baseline, resultados, info)
+            click.echo(f"✓ Baseline guardada en {ruta_baseline}")
+
+        if regresiones and estricto:
+            raise SystemExit(1)
+
+    @app.cli.command('prueba-carga')
+    @click.option('--url', default=None, help='Servidor en marcha (por defecto llama a la app por WSGI en el proceso)')
+    @click.option('--uri', default=None, help='MongoDB del servidor de --url (por defecto MONGO_URI)')
+    @click.option('--db', 'db_name', default=None, help='Base de datos del servidor de --url (obligatoria con --url)')
+    @click.option('--tasa', default=20.0, show_default=True, help='Solicitudes por segundo (llegadas de Poisson)')
+    @click.option('--duracion', default=30.0, show_default=True, help='Segundos de carga')
+    @click.option('--hilos', default=32, show_default=True, help='Solicitudes simultáneas como máximo')
+    @click.option('--mezcla', default='registrar=40,verificar=20,buscar=15,pagina=25', show_default=True,
+                  help='Peso de cada escenario')
+    @click.option('--semilla', default=0, show_default=True)
+    @click.option('--conservar', is_flag=True, help='No borrar las asistencias creadas por la prueba')
+    @click.option('--json', 'ruta_json', default=None, help='Guardar el resultado completo en un archivo JSON')
+    def prueba_carga(url, uri, db_name, tasa, duracion, hilos, mezcla, semilla, conservar, ruta_json):
+        """Simular la hora pico (check-ins, verificaciones, búsquedas y páginas) y medir latencias"""
+        import json
+        from utils import carga
+
+        try:
+            mezcla = carga.parse_mezcla(mezcla)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--mezcla')
+
+        # Los datos de prueba salen de la base del servidor medido y las
+        # asistencias creadas se borran de esa misma base
+        if url and not db_name:
+            raise click.UsageError("Con --url indicar --db (y --uri si no es MONGO_URI): la base que usa ese servidor")
+        if not url and (uri or db_name):
+            raise click.UsageError("--uri y --db solo se usan con --url")
+        client = None
+        if url:
+            from pymongo import MongoClient
+            client = MongoClient(uri or app.config['MONGO_URI'], serverSelectionTimeoutMS=5000)
+            db = client[db_name]
+        else:
+            db = db_manager.db
+
+        creadas = []
+        try:
+            datos = carga.preparar_datos(db, semilla=semilla)
+            cliente = carga.ClienteHTTP(url) if url else carga.ClienteWSGI(app)
+            click.echo(f"Carga contra {url or 'WSGI en el proceso'}: {tasa:g} sol/s durante {duracion:g} s, "
+                       f"{hilos} hilos, mezcla {mezcla}")
+
+            try:
+                resultado = carga.ejecutar(cliente, datos, mezcla, tasa, duracion, hilos, semilla,
+                                           progreso=lambda t: click.echo(f"  {t:.0f} s..."), creadas=creadas)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+
+            click.echo(f"\n  {'escenario':<10} {'n':>6} {'sol/s':>7} {'error':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'máx':>9}")
+            filas = list(resultado['escenarios'].items()) + [('TOTAL', resultado['total'])]
+            for nombre, r in filas:
+                if not r['n']:
+                    continue
+                click.echo(f"  {nombre:<10} {r['n']:>6} {r['throughput']:>7.1f} {r['tasa_error']:>7.1%} "
+                           f"{r['p50']:>7.1f}ms {r['p95']:>7.1f}ms {r['p99']:>7.1f}ms {r['max']:>7.1f}ms")
+            for nombre, r in resultado['escenarios'].items():
+                if r['errores']:
+                    click.echo(f"  ✗ {nombre}: status {r['status']}")
+            if resultado['total']['atrasadas']:
+                click.echo(f"~ {resultado['total']['atrasadas']} llegadas salieron tarde: "
+                           f"el generador no alcanzó la tasa (subir --hilos o usar --url)")
+
+            if ruta_json:
+                with open(ruta_json, 'w', encoding='utf-8') as f:
+                    json.dump(resultado, f, indent=2, ensure_ascii=False)
+                click.echo(f"✓ Resultado guardado en {ruta_json}")
+        finally:
+            # También si la prueba se interrumpe a mitad
+            if not conservar and creadas:
+                click.echo(f"✓ Asistencias de prueba borradas: {carga.limpiar(db, creadas)}")
+            if client is not None:
+                client.close()
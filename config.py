@@ -2,6 +2,7 @@
 Configuración de la aplicación Flask
 """
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
@@ -14,15 +15,87 @@ class Config:
     # MongoDB
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
     DATABASE_NAME = os.getenv('DATABASE_NAME', 'gimnasio_db')
+    # Pool de conexiones por proceso: al menos WEB_THREADS más los hilos de fondo
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 32))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))  # Espera por una conexión libre
+    # Reportes en secundarios: atraso máximo tolerado (mínimo 90 s; -1 = sin límite)
+    MONGO_REPORTES_MAX_STALENESS = int(os.getenv('MONGO_REPORTES_MAX_STALENESS', 120))
     
     # Flask
     DEBUG = os.getenv('FLASK_DEBUG', 'False') == '1'
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 5000))
     
+    # Servidor de producción (gunicorn.conf.py / waitress): procesos x hilos
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', 0)) or (os.cpu_count() or 1)  # 0 = un proceso por núcleo
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 8))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 60))  # Segundos antes de reiniciar un worker colgado
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))  # Para terminar las solicitudes en curso
+    # API asíncrona de terminales (asgi.py / uvicorn): muchas conexiones keep-alive por proceso
+    ASGI_PORT = int(os.getenv('ASGI_PORT', 8000))
+    ASGI_LIMITE_CONEXIONES = int(os.getenv('ASGI_LIMITE_CONEXIONES', 10000))  # Por worker; luego responde 503
+    ASGI_BACKLOG = int(os.getenv('ASGI_BACKLOG', 4096))
+    ASGI_KEEPALIVE = int(os.getenv('ASGI_KEEPALIVE', 75))  # Segundos que se mantiene abierta una conexión inactiva
+    
     # Paginación
     ITEMS_PER_PAGE = 20
     
+    # Biometría
+    BIOMETRIA_UMBRAL = float(os.getenv('BIOMETRIA_UMBRAL', 0.8))  # Similitud mínima para aceptar
+    BIOMETRIA_TOP_K = int(os.getenv('BIOMETRIA_TOP_K', 5))  # Candidatos devueltos al identificar
+    # Micro-lotes de identificación/verificación
+    BIOMETRIA_LOTE_MAX = int(os.getenv('BIOMETRIA_LOTE_MAX', 32))
+    BIOMETRIA_LOTE_ESPERA_MS = float(os.getenv('BIOMETRIA_LOTE_ESPERA_MS', 2))
+    BIOMETRIA_TIMEOUT = float(os.getenv('BIOMETRIA_TIMEOUT', 5))  # Segundos de espera por resultado
+    # Procesos dedicados a puntuar (0 = en el proceso web); usan la galería en disco
+    BIOMETRIA_PROCESOS = int(os.getenv('BIOMETRIA_PROCESOS', 0))
+    BIOMETRIA_PROCESOS_COLA_MAX = int(os.getenv('BIOMETRIA_PROCESOS_COLA_MAX', 64))  # Lotes pendientes antes de rechazar
+    # Procesos que normalizan templates en las importaciones masivas (0 = en el mismo proceso)
+    BIOMETRIA_IMPORTACION_PROCESOS = int(os.getenv('BIOMETRIA_IMPORTACION_PROCESOS', 4))
+    # Volcados subidos por la API mientras esperan su importación en segundo plano
+    BIOMETRIA_IMPORTACION_DIR = os.getenv('BIOMETRIA_IMPORTACION_DIR', str(Path(__file__).parent / 'data' / 'importaciones'))
+    # Compresión de templates binarios: 'zlib', 'zstd' o 'none'. zstd solo si
+    # todos los hosts tienen zstandard: sin él no se pueden leer esos templates
+    BIOMETRIA_COMPRESION = os.getenv('BIOMETRIA_COMPRESION', 'zlib')
+    # Galería en disco compartida entre procesos (flask construir-galeria)
+    BIOMETRIA_GALERIA_DIR = os.getenv('BIOMETRIA_GALERIA_DIR', str(Path(__file__).parent / 'data' / 'galeria'))
+    # Índice aproximado IVF-PQ (tipos separados por coma; vacío = siempre búsqueda exacta)
+    BIOMETRIA_ANN_TIPOS = [t.strip() for t in os.getenv('BIOMETRIA_ANN_TIPOS', 'Rostro').split(',') if t.strip()]
+    BIOMETRIA_ANN_MINIMO = int(os.getenv('BIOMETRIA_ANN_MINIMO', 5000))  # Plantillas mínimas para usarlo
+    BIOMETRIA_ANN_NLIST = int(os.getenv('BIOMETRIA_ANN_NLIST', 0))  # Listas invertidas (0 = raíz de n)
+    BIOMETRIA_ANN_SUBVECTORES = int(os.getenv('BIOMETRIA_ANN_SUBVECTORES', 16))
+    # Más listas exploradas / más candidatos re-puntuados = más recall y más latencia
+    BIOMETRIA_ANN_NPROBE = int(os.getenv('BIOMETRIA_ANN_NPROBE', 8))
+    BIOMETRIA_ANN_REORDENAR = int(os.getenv('BIOMETRIA_ANN_REORDENAR', 100))
+
+    # Perfilado de comandos MongoDB por solicitud (/debug/perf)
+    PERF_PERFILADO = os.getenv('PERF_PERFILADO', '0') == '1'
+    PERF_LENTO_MS = float(os.getenv('PERF_LENTO_MS', 500))  # Solicitudes más lentas se registran en el log
+    PERF_N_MAS_1 = int(os.getenv('PERF_N_MAS_1', 5))  # Misma consulta repetida en una solicitud = posible N+1
+
+    # Métricas de solicitudes, pool de MongoDB y cachés en /metrics (formato Prometheus)
+    METRICAS = os.getenv('METRICAS', '1') == '1'
+
+    # Secciones cargadas (nombres de app.BLUEPRINTS separados por coma; vacío = todas).
+    # Un subconjunto es solo para workers de API: las páginas enlazan a todas las secciones
+    BLUEPRINTS = [b.strip() for b in os.getenv('BLUEPRINTS', '').split(',') if b.strip()]
+    # Espera máxima del ping a MongoDB en /readyz
+    SALUD_TIMEOUT = float(os.getenv('SALUD_TIMEOUT', 1.0))
+
+    # Compresión de respuestas (gzip; brotli si está instalado)
+    COMPRESION = os.getenv('COMPRESION', '1') == '1'
+    COMPRESION_MINIMO = int(os.getenv('COMPRESION_MINIMO', 500))  # Bytes; menos no compensa
+    COMPRESION_NIVEL_GZIP = int(os.getenv('COMPRESION_NIVEL_GZIP', 6))  # 1-9
+    COMPRESION_NIVEL_BROTLI = int(os.getenv('COMPRESION_NIVEL_BROTLI', 4))  # 0-11
+
+    # Plantillas compiladas en disco, compartidas por workers y reinicios (vacío = sin caché)
+    JINJA_CACHE_DIR = os.getenv('JINJA_CACHE_DIR', str(Path(__file__).parent / 'data' / 'jinja_cache'))
+    # Fragmentos {% cache %} en memoria de cada proceso
+    FRAGMENTOS = os.getenv('FRAGMENTOS', '1') == '1'
+    FRAGMENTOS_MAX_MB = int(os.getenv('FRAGMENTOS_MAX_MB', 64))
+    FRAGMENTOS_TTL = float(os.getenv('FRAGMENTOS_TTL', 300))  # Segundos; cubre cambios hechos fuera de la app
+    
     # Upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -31,6 +104,7 @@ class DevelopmentConfig(Config):
     """Configuración de desarrollo"""
     DEBUG = True
     TESTING = False
+    PERF_PERFILADO = os.getenv('PERF_PERFILADO', '1') == '1'
 
 class ProductionConfig(Config):
     """Configuración de producción"""
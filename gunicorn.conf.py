@@ -0,0 +1,43 @@
+"""
+Configuración de gunicorn (gunicorn -c gunicorn.conf.py wsgi:app)
+
+Los valores salen de config.py; se ajustan con WEB_WORKERS, WEB_THREADS,
+WEB_TIMEOUT y WEB_GRACEFUL_TIMEOUT.
+"""
+import os
+from config import config
+
+_config = config[os.getenv('FLASK_ENV', 'production')]
+
+bind = f"{_config.HOST}:{_config.PORT}"
+# Un proceso por núcleo (el GIL limita cada uno) con hilos para la espera de MongoDB
+workers = _config.WEB_WORKERS
+threads = _config.WEB_THREADS
+worker_class = 'gthread'
+timeout = _config.WEB_TIMEOUT
+graceful_timeout = _config.WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+# Importar la app una vez en el maestro: los workers arrancan rápido y comparten
+# las páginas de código; wsgi.py no deja conexiones abiertas antes del fork
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Conectar a MongoDB en segundo plano (índices incluidos) sin demorar el arranque del worker
+
+    Si el maestro no pudo construir la galería en disco que comparten los
+    workers, la construye el primero que conecta.
+    """
+    from app import asegurar_galeria, iniciar_trabajos
+    from models import db_manager
+    from reconocimiento import despachador
+    tareas = [iniciar_trabajos]
+    if server.cfg.workers > 1 or despachador.pool is not None:
+        tareas.insert(0, asegurar_galeria)
+    db_manager.calentar(tareas=tareas)
+
+
+def worker_exit(server, worker):
+    """Cerrar el pool de procesos biométricos y el cliente de MongoDB del worker"""
+    from app import cerrar_recursos
+    cerrar_recursos()
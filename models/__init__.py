@@ -8,6 +8,8 @@ from .asistencia import Asistencia
 from .plantilla_biometrica import PlantillaBiometrica
 from .plan import Plan
 from .departamento import Departamento
+from .asincrono import AsistenciaAsync
+from .versiones import VersionesDatos
 
 __all__ = [
     'db_manager',
@@ -16,5 +18,7 @@ __all__ = [
     'Asistencia',
     'PlantillaBiometrica',
     'Plan',
-    'Departamento'
+    'Departamento',
+    'AsistenciaAsync',
+    'VersionesDatos'
 ]
@@ -0,0 +1,33 @@
+"""
+Modelos asíncronos para la API ASGI (asgi.py)
+
+Misma semántica que los modelos síncronos, sobre una base de
+AsyncMongoClient: los documentos y filtros salen de los mismos helpers.
+"""
+from .asistencia import Asistencia
+
+
+class AsistenciaAsync:
+    """Registro y consulta de asistencias sin bloquear el event loop"""
+
+    def __init__(self, db):
+        self.collection = db.asistencias
+        self.usuarios_collection = db.usuarios
+
+    async def registrar(self, data):
+        """Registrar asistencia (ver Asistencia.registrar)"""
+        usuario_id = data.get('usuario_id')
+        tipo_acceso = data.get('tipo_acceso', 'Manual')
+        notas = data.get('notas', '')
+
+        usuario = await self.usuarios_collection.find_one({'_id': int(usuario_id)})
+        if not usuario:
+            raise ValueError("Usuario no encontrado")
+
+        result = await self.collection.insert_one(Asistencia.armar_registro(usuario, tipo_acceso, notas))
+        Asistencia.contar_registro(tipo_acceso)
+        return result.inserted_id
+
+    async def registro_de_hoy(self, usuario_id):
+        """Primera asistencia de hoy del usuario, o None"""
+        return await self.collection.find_one(Asistencia.filtro_hoy(usuario_id), {'fecha': 1}, sort=[('fecha', 1)])
@@ -3,20 +3,45 @@ Modelo de Asistencia
 """
 from datetime import datetime, timedelta
 from bson import ObjectId
+from .database import db_manager
+from utils.metricas import ASISTENCIAS
 
 class Asistencia:
     """Modelo para gestionar asistencias"""
     
+    # Métodos de registro con serie propia en /metrics
+    METODOS_METRICAS = {'manual', 'biometrico'}
+
+    # Proyecciones por vista
+    PROYECCIONES = {
+        'lista': {
+            'usuario_id': 1, 'usuario_nombre': 1, 'fecha': 1, 'departamento_nombre': 1,
+            'metodo_registro': 1, 'tipo_acceso': 1
+        },
+        'resumen': {'fecha': 1, 'metodo_registro': 1, 'tipo_acceso': 1},
+        'detalle': None
+    }
+    
+    # Índices usados por las consultas del modelo (se crean en Database.connect)
+    INDICES = [
+        # Asistencias del día / rango de fechas, ordenadas por fecha
+        [('fecha', -1)],
+        # Historial de un usuario (también el $lookup de la ficha)
+        [('usuario_id', 1), ('fecha', -1)]
+    ]
+    
     def __init__(self, db):
         self.collection = db.asistencias
         self.usuarios_collection = db.usuarios
+        # Agregaciones de reportes: secundarios, el primario queda para los registros
+        self.reportes = db_manager.para_reportes(self.collection)
     
-    def find_all(self, page=1, per_page=20, filtros=None):
+    def find_all(self, page=1, per_page=20, filtros=None, vista=None):
         """Obtener todas las asistencias con paginación"""
         skip = (page - 1) * per_page
         query = filtros if filtros else {}
         
-        asistencias = list(self.collection.find(query).skip(skip).limit(per_page).sort('fecha', -1))
+        asistencias = list(self.collection.find(query, self.PROYECCIONES.get(vista)).skip(skip).limit(per_page).sort('fecha', -1))
         total = self.collection.count_documents(query)
         
         return {
@@ -27,16 +52,22 @@ class Asistencia:
             'total_pages': (total + per_page - 1) // per_page
         }
     
-    def find_by_usuario(self, usuario_id, limit=30):
+    def find_by_usuario(self, usuario_id, limit=30, vista=None):
         """Obtener asistencias de un usuario"""
-        return list(self.collection.find({'usuario_id': int(usuario_id)}).sort('fecha', -1).limit(limit))
+        return list(self.collection.find({'usuario_id': int(usuario_id)}, self.PROYECCIONES.get(vista))
+                    .sort('fecha', -1).limit(limit))
     
-    def get_hoy(self):
+    def get_hoy(self, vista=None):
         """Obtener asistencias de hoy"""
         hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        return list(self.collection.find({'fecha': {'$gte': hoy}}).sort('fecha', -1))
+        return list(self.collection.find({'fecha': {'$gte': hoy}}, self.PROYECCIONES.get(vista)).sort('fecha', -1))
+    
+    def contar_hoy(self):
+        """Contar asistencias de hoy"""
+        hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.collection.count_documents({'fecha': {'$gte': hoy}})
     
-    def get_por_fecha(self, fecha):
+    def get_por_fecha(self, fecha, vista=None):
         """Obtener asistencias de una fecha específica"""
         inicio = fecha.replace(hour=0, minute=0, second=0, microsecond=0)
         fin = inicio + timedelta(days=1)
@@ -46,7 +77,14 @@ class Asistencia:
                 '$gte': inicio,
                 '$lt': fin
             }
-        }).sort('fecha', -1))
+        }, self.PROYECCIONES.get(vista)).sort('fecha', -1))
+    
+    def contar_por_fecha(self, fecha):
+        """Contar asistencias de una fecha específica"""
+        inicio = fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+        fin = inicio + timedelta(days=1)
+        
+        return self.collection.count_documents({'fecha': {'$gte': inicio, '$lt': fin}})
     
     def registrar(self, data):
         """Registrar asistencia"""
@@ -65,8 +103,15 @@ class Asistencia:
         if not usuario:
             raise ValueError("Usuario no encontrado")
         
-        asistencia = {
-            'usuario_id': int(usuario_id),
+        result = self.collection.insert_one(self.armar_registro(usuario, tipo_acceso, notas))
+        self.contar_registro(tipo_acceso)
+        return result.inserted_id
+    
+    @staticmethod
+    def armar_registro(usuario, tipo_acceso='Manual', notas=''):
+        """Documento de asistencia para un usuario (compartido con AsistenciaAsync)"""
+        return {
+            'usuario_id': int(usuario['_id']),
             'usuario_nombre': f"{usuario['nombre']} {usuario['apellido']}",
             'fecha': datetime.now(),
             'departamento_id': usuario.get('departamento_id'),
@@ -76,9 +121,23 @@ class Asistencia:
             'notas': notas,
             'created_at': datetime.now()
         }
-        
-        result = self.collection.insert_one(asistencia)
-        return result.inserted_id
+    
+    @classmethod
+    def contar_registro(cls, tipo_acceso):
+        """Sumar el registro en /metrics"""
+        # El método llega libre desde la API: se acota para no crear series sin límite
+        metodo = str(tipo_acceso).lower()
+        ASISTENCIAS.incrementar((metodo if metodo in cls.METODOS_METRICAS else 'otro',))
+    
+    @staticmethod
+    def filtro_hoy(usuario_id):
+        """Asistencias de hoy de un usuario (usa el índice usuario_id + fecha)"""
+        hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return {'usuario_id': int(usuario_id), 'fecha': {'$gte': hoy}}
+    
+    def registro_de_hoy(self, usuario_id):
+        """Primera asistencia de hoy del usuario, o None"""
+        return self.collection.find_one(self.filtro_hoy(usuario_id), {'fecha': 1}, sort=[('fecha', 1)])
     
     def delete(self, asistencia_id):
         """Eliminar asistencia"""
@@ -92,7 +151,7 @@ class Asistencia:
         mes_atras = hoy - timedelta(days=30)
         
         return {
-            'hoy': self.collection.count_documents({'fecha': {'$gte': hoy}}),
+            'hoy': self.contar_hoy(),
             'semana': self.collection.count_documents({'fecha': {'$gte': semana_atras}}),
             'mes': self.collection.count_documents({'fecha': {'$gte': mes_atras}}),
             'total': self.collection.count_documents({})
@@ -110,7 +169,7 @@ class Asistencia:
             {'$limit': limite}
         ]
         
-        return list(self.collection.aggregate(pipeline))
+        return list(self.reportes.aggregate(pipeline))
     
     def get_por_departamento(self):
         """Obtener asistencias agrupadas por departamento"""
@@ -122,7 +181,7 @@ class Asistencia:
             {'$sort': {'total': -1}}
         ]
         
-        return list(self.collection.aggregate(pipeline))
+        return list(self.reportes.aggregate(pipeline))
     
     def get_por_hora(self, fecha=None):
         """Obtener asistencias agrupadas por hora"""
@@ -1,47 +1,195 @@
 """
 Database Connection Manager
 """
+import os
+import threading
+import time
+from datetime import datetime
+import pymongo
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import ConnectionFailure, PyMongoError
+from pymongo.read_preferences import SecondaryPreferred
+from .perfilado import perfilador
+from utils.metricas import monitor_pool
 
 class Database:
-    """Singleton para la conexión a MongoDB"""
+    """Singleton para la conexión a MongoDB
+
+    El MongoClient se crea en el primer uso de cada proceso: un worker
+    creado con fork (gunicorn con preload) no reutiliza los sockets ni los
+    threads de monitoreo del padre, abre su propio cliente.
+
+    calentar() conecta en un thread de fondo, reintentando con espera
+    creciente hasta que MongoDB responde; mientras tanto el proceso ya
+    atiende solicitudes (/readyz responde 503 hasta que haya conexión).
+
+    Las consultas de reportes leen con para_reportes():
+    secondaryPreferred con un límite de atraso, así las agregaciones
+    pesadas no compiten con los registros de asistencia en el primario.
+    """
     _instance = None
     _client = None
     _db = None
-    
+    _pid = None
+    _uri = None
+    _db_name = None
+    _opciones = {}
+    _preferencia_reportes = SecondaryPreferred(max_staleness=120)
+    _lock = threading.Lock()
+    _calentador = None
+    _calentador_pid = None
+    _detener = threading.Event()
+    _estado = {'conectado': False, 'intentos': 0, 'ultimo_error': None, 'desde': None}
+
     def __new__(cls, uri=None, db_name=None):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
         return cls._instance
-    
-    def connect(self, uri, db_name):
-        """Conectar a MongoDB"""
+
+    def configurar(self, uri, db_name, reportes_max_staleness=120, **opciones):
+        """Guardar los datos de conexión sin conectar (opciones del MongoClient: maxPoolSize, ...)
+
+        reportes_max_staleness: segundos de atraso tolerados en un secundario
+        para los reportes (mínimo 90; -1 = sin límite).
+        """
+        if reportes_max_staleness != -1 and reportes_max_staleness < 90:
+            raise ValueError("reportes_max_staleness debe ser -1 o al menos 90 segundos")
+        self._uri = uri
+        self._db_name = db_name
+        self._opciones = opciones
+        self._preferencia_reportes = SecondaryPreferred(max_staleness=reportes_max_staleness)
+
+    def connect(self, uri, db_name, crear_indices=True, reportes_max_staleness=120, **opciones):
+        """Conectar a MongoDB y asegurar los índices declarados por los modelos"""
+        self.configurar(uri, db_name, reportes_max_staleness, **opciones)
+        return self.verificar(crear_indices)
+
+    def verificar(self, crear_indices=True):
+        """Comprobar la conexión configurada y asegurar los índices"""
         try:
-            self._client = MongoClient(uri, serverSelectionTimeoutMS=5000)
-            self._client.server_info()  # Verificar conexión
-            self._db = self._client[db_name]
-            print(f"✓ Conectado a MongoDB: {db_name}")
+            self.client.server_info()  # Verificar conexión
+            print(f"✓ Conectado a MongoDB: {self._db_name}")
+            if crear_indices:
+                from .indices import aplicar_indices
+                print(f"✓ Índices verificados: {aplicar_indices(self._db)}")
             return True
         except ConnectionFailure as e:
             print(f"✗ Error al conectar a MongoDB: {e}")
             return False
-    
+
+    def calentar(self, crear_indices=True, tareas=(), espera_max=30.0):
+        """Conectar en segundo plano (una vez por proceso), reintentando hasta lograrlo
+
+        No bloquea: devuelve el thread. Al conectar asegura los índices y
+        ejecuta cada tarea(db) de 'tareas' (por ejemplo, construir la galería).
+        """
+        with self._lock:
+            if self._calentador is not None and self._calentador_pid == os.getpid() and self._calentador.is_alive():
+                return self._calentador
+            self._detener.clear()
+            self._estado = {'conectado': False, 'intentos': 0, 'ultimo_error': None, 'desde': None}
+            self._calentador_pid = os.getpid()
+            self._calentador = threading.Thread(target=self._calentar, args=(crear_indices, tareas, espera_max),
+                                                name='mongo-calentar', daemon=True)
+            self._calentador.start()
+            return self._calentador
+
+    def _calentar(self, crear_indices, tareas, espera_max):
+        espera = 0.5
+        while not self._detener.is_set():
+            self._estado['intentos'] += 1
+            try:
+                self.client.admin.command('ping')
+            except PyMongoError as e:
+                self._estado['ultimo_error'] = str(e)
+                print(f"✗ MongoDB no disponible (intento {self._estado['intentos']}), reintento en {espera:.1f}s: {e}")
+                self._detener.wait(espera)
+                espera = min(espera * 2, espera_max)
+                continue
+
+            self._estado.update(conectado=True, ultimo_error=None, desde=datetime.now())
+            print(f"✓ Conectado a MongoDB: {self._db_name}")
+            tareas = list(tareas)
+            if crear_indices:
+                from .indices import aplicar_indices
+                tareas.insert(0, lambda db: print(f"✓ Índices verificados: {aplicar_indices(db)}"))
+            for tarea in tareas:
+                try:
+                    tarea(self._db)
+                except Exception as e:
+                    # Una tarea fallida no deja al proceso sin base de datos
+                    print(f"✗ Error al preparar la base de datos: {e}")
+            return
+
+    @property
+    def estado(self):
+        """Estado del calentamiento de este proceso (conectado, intentos, último error)"""
+        return dict(self._estado)
+
+    def ping(self, timeout=1.0):
+        """Comprobar que MongoDB responde en menos de 'timeout' segundos: (True, ms) o (False, error)"""
+        if self.client is None:
+            return False, 'sin configurar'
+        inicio = time.perf_counter()
+        try:
+            with pymongo.timeout(timeout):
+                self.client.admin.command('ping')
+        except PyMongoError as e:
+            return False, str(e)
+        return True, round((time.perf_counter() - inicio) * 1000, 2)
+
+    def _crear_cliente(self):
+        # El perfilador solo registra comandos dentro de solicitudes perfiladas;
+        # el monitor del pool alimenta /metrics
+        client = MongoClient(self._uri, serverSelectionTimeoutMS=5000,
+                             event_listeners=[perfilador, monitor_pool], **self._opciones)
+        self._db = client[self._db_name]
+        self._pid = os.getpid()
+        self._client = client
+
+    def cliente_async(self):
+        """Nuevo AsyncMongoClient con la misma configuración (para la API ASGI)
+
+        Queda ligado al event loop que lo usa primero: se crea dentro del
+        lifespan de la app y se cierra con 'await client.close()'.
+        """
+        from pymongo import AsyncMongoClient
+        return AsyncMongoClient(self._uri, serverSelectionTimeoutMS=5000,
+                                event_listeners=[monitor_pool], **self._opciones)
+
     @property
     def db(self):
         """Obtener instancia de la base de datos"""
-        return self._db
-    
+        return self._db if self.client is not None else None
+
+    def para_reportes(self, coleccion):
+        """La misma colección leyendo con la preferencia de reportes
+
+        Acepta colecciones de cualquier base (benchmarks, auditoría), no
+        solo las del cliente de la aplicación.
+        """
+        return coleccion.with_options(read_preference=self._preferencia_reportes)
+
     @property
     def client(self):
-        """Obtener cliente de MongoDB"""
+        """Obtener cliente de MongoDB (se crea en el primer uso de cada proceso)"""
+        if self._uri is None:
+            return None
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    # El cliente heredado por fork no se cierra: sus sockets son del padre
+                    self._crear_cliente()
         return self._client
-    
+
     def close(self):
-        """Cerrar conexión"""
-        if self._client:
-            self._client.close()
-            print("✓ Conexión a MongoDB cerrada")
+        """Cerrar conexión (el próximo uso abre otra)"""
+        self._detener.set()
+        with self._lock:
+            client, self._client = self._client, None
+            if client is not None and self._pid == os.getpid():
+                client.close()
+                print("✓ Conexión a MongoDB cerrada")
 
 # Instancia global
 db_manager = Database()
@@ -14,6 +14,15 @@ class Departamento:
         """Obtener todos los departamentos"""
         return list(self.collection.find({'activo': True}).sort('nombre', 1))
     
+    def get_mapa(self):
+        """Obtener mapa de departamentos por ID y por nombre (en minúsculas)"""
+        mapa = {}
+        for departamento in self.collection.find({}, {'nombre': 1}):
+            entrada = (str(departamento['_id']), departamento['nombre'])
+            mapa[entrada[0]] = entrada
+            mapa[departamento['nombre'].strip().lower()] = entrada
+        return mapa
+    
     def find_by_id(self, departamento_id):
         """Obtener departamento por ID"""
         return self.collection.find_one({'_id': ObjectId(departamento_id)})
@@ -0,0 +1,177 @@
+"""
+Registro de índices declarados por los modelos y auditor de planes de consulta
+"""
+from datetime import datetime
+from pymongo import MongoClient, monitoring
+from pymongo.errors import OperationFailure
+from .usuario import Usuario
+from .membresia import Membresia
+from .asistencia import Asistencia
+from .plantilla_biometrica import PlantillaBiometrica
+
+# Colección -> índices declarados en el modelo
+REGISTRO = {
+    'usuarios': Usuario.INDICES,
+    'membresias': Membresia.INDICES,
+    'asistencias': Asistencia.INDICES,
+    'plantillas_biometricas': PlantillaBiometrica.INDICES
+}
+
+
+def aplicar_indices(db, registro=REGISTRO):
+    """Crear los índices declarados (idempotente: los existentes no se tocan)
+
+    Devuelve la cantidad de índices asegurados.
+    """
+    asegurados = 0
+    for coleccion, indices in registro.items():
+        for campos in indices:
+            try:
+                db[coleccion].create_index(campos)
+                asegurados += 1
+            except OperationFailure as e:
+                # Por ejemplo, un índice con las mismas claves y otras opciones
+                print(f"✗ Índice {coleccion} {campos}: {e}")
+    return asegurados
+
+
+# =====================================
+# AUDITORÍA DE PLANES
+# =====================================
+
+# Método del modelo -> llamada con datos de ejemplo del contexto
+CONSULTAS = [
+    ('Usuario.find_all', lambda db, ctx: Usuario(db).find_all()),
+    ('Usuario.find_by_id', lambda db, ctx: Usuario(db).find_by_id(ctx['usuario_id'])),
+    ('Usuario.detalle_completo', lambda db, ctx: Usuario(db).detalle_completo(ctx['usuario_id'])),
+    ('Usuario.search', lambda db, ctx: Usuario(db).search(ctx['texto'])),
+    ('Usuario.find_activos', lambda db, ctx: Usuario(db).find_activos()),
+    ('Usuario.get_vigentes', lambda db, ctx: Usuario(db).get_vigentes()),
+    ('Usuario.get_vencidos', lambda db, ctx: Usuario(db).get_vencidos()),
+    ('Usuario.get_sin_membresia', lambda db, ctx: Usuario(db).get_sin_membresia()),
+    ('Usuario.get_proximos_vencer', lambda db, ctx: Usuario(db).get_proximos_vencer()),
+    ('Usuario.get_stats', lambda db, ctx: Usuario(db).get_stats()),
+    ('Asistencia.find_all', lambda db, ctx: Asistencia(db).find_all()),
+    ('Asistencia.find_by_usuario', lambda db, ctx: Asistencia(db).find_by_usuario(ctx['usuario_id'])),
+    ('Asistencia.get_hoy', lambda db, ctx: Asistencia(db).get_hoy()),
+    ('Asistencia.contar_hoy', lambda db, ctx: Asistencia(db).contar_hoy()),
+    ('Asistencia.get_por_fecha', lambda db, ctx: Asistencia(db).get_por_fecha(ctx['fecha'])),
+    ('Asistencia.get_por_hora', lambda db, ctx: Asistencia(db).get_por_hora(ctx['fecha'])),
+    ('Asistencia.get_stats', lambda db, ctx: Asistencia(db).get_stats()),
+    ('Membresia.find_all', lambda db, ctx: Membresia(db).find_all()),
+    ('Membresia.find_by_usuario', lambda db, ctx: Membresia(db).find_by_usuario(ctx['usuario_id'])),
+    ('Membresia.get_vigentes', lambda db, ctx: Membresia(db).get_vigentes()),
+    ('Membresia.get_vencidas', lambda db, ctx: Membresia(db).get_vencidas()),
+    ('Membresia.get_proximas_vencer', lambda db, ctx: Membresia(db).get_proximas_vencer()),
+    ('Membresia.get_ingresos_mes', lambda db, ctx: Membresia(db).get_ingresos_mes()),
+    ('Membresia.get_stats', lambda db, ctx: Membresia(db).get_stats()),
+    ('PlantillaBiometrica.find_by_usuario', lambda db, ctx: PlantillaBiometrica(db).find_by_usuario(ctx['usuario_id'])),
+    ('PlantillaBiometrica.find_by_tipo', lambda db, ctx: PlantillaBiometrica(db).find_by_tipo(ctx['tipo'])),
+    ('PlantillaBiometrica.get_con_template', lambda db, ctx: PlantillaBiometrica(db).get_con_template()),
+    ('PlantillaBiometrica.get_stats', lambda db, ctx: PlantillaBiometrica(db).get_stats()),
+]
+
+# Búsquedas por expresión regular: no pueden usar índices B-tree
+COLLSCAN_PERMITIDO = {'Usuario.search'}
+
+# Campos del comando que no forman parte de la consulta
+_CAMPOS_SESION = {'lsid', 'txnNumber', 'readConcern', 'writeConcern', 'autocommit', 'startTransaction'}
+
+
+class _Grabadora(monitoring.CommandListener):
+    """Guarda los comandos de lectura enviados mientras corre cada método"""
+
+    COMANDOS = {'find', 'aggregate', 'count', 'distinct'}
+
+    def __init__(self):
+        self.comandos = []
+
+    def started(self, event):
+        if event.command_name in self.COMANDOS:
+            self.comandos.append(event.command)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _etapas(plan):
+    """Nombres de las etapas del plan ganador (ignora los planes rechazados)"""
+    if isinstance(plan, dict):
+        if isinstance(plan.get('stage'), str):
+            yield plan['stage'], plan.get('indexName')
+        for clave, valor in plan.items():
+            if clave != 'rejectedPlans':
+                yield from _etapas(valor)
+    elif isinstance(plan, list):
+        for valor in plan:
+            yield from _etapas(valor)
+
+
+def _coleccion_completa(comando):
+    """True si el comando recorre toda la colección a propósito (totales sin filtro)"""
+    if 'find' in comando:
+        return not comando.get('filter')
+    if 'aggregate' in comando:
+        pipeline = comando.get('pipeline') or [{}]
+        return '$match' not in pipeline[0] or not pipeline[0]['$match']
+    return not comando.get('query')
+
+
+def explicar(db, comando):
+    """Ejecutar explain (queryPlanner) de un comando capturado -> [(etapa, índice)]"""
+    limpio = {clave: valor for clave, valor in comando.items()
+              if not clave.startswith('$') and clave not in _CAMPOS_SESION}
+    resultado = db.command('explain', limpio, verbosity='queryPlanner')
+    return list(_etapas(resultado))
+
+
+def auditar(uri, db_name, consultas=CONSULTAS, contexto=None):
+    """Ejecutar cada consulta de los modelos y revisar su plan
+
+    Devuelve una fila por comando: consulta, colección, etapas, índices y
+    problemas (COLLSCAN, SORT en memoria).
+    """
+    grabadora = _Grabadora()
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000, event_listeners=[grabadora])
+    try:
+        db = client[db_name]
+        ctx = {'usuario_id': 0, 'texto': 'a', 'tipo': 'Rostro', 'fecha': datetime.now()}
+        ejemplo = db.usuarios.find_one({}, {'_id': 1})
+        if ejemplo:
+            ctx['usuario_id'] = ejemplo['_id']
+        ctx.update(contexto or {})
+
+        filas = []
+        for nombre, llamada in consultas:
+            grabadora.comandos = []
+            llamada(db, ctx)
+            for comando in grabadora.comandos:
+                coleccion = comando.get('find') or comando.get('aggregate') or \
+                    comando.get('count') or comando.get('distinct')
+                try:
+                    etapas = explicar(db, comando)
+                except OperationFailure as e:
+                    filas.append({'consulta': nombre, 'coleccion': coleccion, 'etapas': [],
+                                  'indices': [], 'problemas': [f"explain falló: {e}"], 'permitido': False})
+                    continue
+
+                nombres = [etapa for etapa, _ in etapas]
+                problemas = []
+                if 'COLLSCAN' in nombres and not _coleccion_completa(comando):
+                    problemas.append('COLLSCAN')
+                if 'SORT' in nombres:
+                    problemas.append('SORT en memoria')
+                filas.append({
+                    'consulta': nombre,
+                    'coleccion': coleccion,
+                    'etapas': nombres,
+                    'indices': sorted({indice for _, indice in etapas if indice}),
+                    'problemas': problemas,
+                    'permitido': nombre in COLLSCAN_PERMITIDO and problemas == ['COLLSCAN']
+                })
+        return filas
+    finally:
+        client.close()
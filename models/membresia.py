@@ -3,21 +3,47 @@ Modelo de Membresía
 """
 from datetime import datetime, timedelta
 from bson import ObjectId
+from .database import db_manager
+from .versiones import VersionesDatos
 
 class Membresia:
     """Modelo para gestionar membresías"""
     
+    # Proyecciones por vista
+    PROYECCIONES = {
+        'lista': {
+            'usuario_id': 1, 'usuario_nombre': 1, 'plan_nombre': 1, 'fecha_inicio': 1,
+            'fecha_fin': 1, 'vigente': 1, 'precio_pagado': 1, 'metodo_pago': 1
+        },
+        'resumen': {'plan_nombre': 1, 'fecha_inicio': 1, 'fecha_fin': 1, 'vigente': 1},
+        'detalle': None
+    }
+    
+    # Índices usados por las consultas del modelo (se crean en Database.connect)
+    INDICES = [
+        # Vigentes/vencidas y próximas a vencer
+        [('vigente', 1), ('fecha_fin', 1)],
+        # Membresías de un usuario (también el $lookup de la ficha)
+        [('usuario_id', 1), ('fecha_inicio', -1)],
+        # Listado general e ingresos del mes
+        [('fecha_inicio', -1)]
+    ]
+    
     def __init__(self, db):
         self.collection = db.membresias
         self.planes_collection = db.planes
         self.usuarios_collection = db.usuarios
+        # Agregaciones de reportes: secundarios, el primario queda para los registros
+        self.reportes = db_manager.para_reportes(self.collection)
+        # Versión de los datos para las claves de {% cache %} (dashboard)
+        self.versiones = VersionesDatos(db)
     
-    def find_all(self, page=1, per_page=20, filtros=None):
+    def find_all(self, page=1, per_page=20, filtros=None, vista=None):
         """Obtener todas las membresías con paginación"""
         skip = (page - 1) * per_page
         query = filtros if filtros else {}
         
-        membresias = list(self.collection.find(query).skip(skip).limit(per_page).sort('fecha_inicio', -1))
+        membresias = list(self.collection.find(query, self.PROYECCIONES.get(vista)).skip(skip).limit(per_page).sort('fecha_inicio', -1))
         total = self.collection.count_documents(query)
         
         return {
@@ -32,28 +58,37 @@ class Membresia:
         """Obtener membresía por ID"""
         return self.collection.find_one({'_id': ObjectId(membresia_id)})
     
-    def find_by_usuario(self, usuario_id):
+    def find_by_usuario(self, usuario_id, vista=None):
         """Obtener membresías de un usuario"""
-        return list(self.collection.find({'usuario_id': int(usuario_id)}).sort('fecha_inicio', -1))
+        return list(self.collection.find({'usuario_id': int(usuario_id)}, self.PROYECCIONES.get(vista))
+                    .sort('fecha_inicio', -1))
     
-    def get_vigentes(self):
+    def get_vigentes(self, vista=None):
         """Obtener membresías vigentes"""
-        return list(self.collection.find({'vigente': True}))
+        return list(self.collection.find({'vigente': True}, self.PROYECCIONES.get(vista)))
     
-    def get_vencidas(self):
+    def get_vencidas(self, vista=None):
         """Obtener membresías vencidas"""
-        return list(self.collection.find({'vigente': False}))
+        return list(self.collection.find({'vigente': False}, self.PROYECCIONES.get(vista)))
     
-    def get_proximas_vencer(self, dias=7):
-        """Obtener membresías próximas a vencer"""
+    def _filtro_proximas_vencer(self, dias):
+        """Filtro de membresías vigentes que vencen dentro de los próximos días"""
         fecha_limite = datetime.now() + timedelta(days=dias)
-        return list(self.collection.find({
+        return {
             'vigente': True,
             'fecha_fin': {
                 '$gte': datetime.now(),
                 '$lte': fecha_limite
             }
-        }))
+        }
+    
+    def get_proximas_vencer(self, dias=7, vista=None):
+        """Obtener membresías próximas a vencer"""
+        return list(self.collection.find(self._filtro_proximas_vencer(dias), self.PROYECCIONES.get(vista)))
+    
+    def contar_proximas_vencer(self, dias=7):
+        """Contar membresías próximas a vencer"""
+        return self.collection.count_documents(self._filtro_proximas_vencer(dias))
     
     def create(self, data):
         """Crear nueva membresía"""
@@ -74,6 +109,8 @@ class Membresia:
         membresia = {
             'usuario_id': int(data['usuario_id']),
             'usuario_nombre': f"{usuario['nombre']} {usuario['apellido']}",
+            'departamento_id': usuario.get('departamento_id'),
+            'departamento_nombre': usuario.get('departamento_nombre'),
             'plan_id': plan['_id'],
             'plan_nombre': plan['nombre'],
             'duracion_dias': plan['duracion_dias'],
@@ -88,6 +125,7 @@ class Membresia:
         }
         
         result = self.collection.insert_one(membresia)
+        self.versiones.incrementar('membresias')
         return result.inserted_id
     
     def update(self, membresia_id, data):
@@ -102,6 +140,8 @@ class Membresia:
             {'_id': ObjectId(membresia_id)},
             {'$set': data}
         )
+        if result.modified_count:
+            self.versiones.incrementar('membresias')
         return result.modified_count > 0
     
     def renovar(self, membresia_id, plan_id):
@@ -128,6 +168,8 @@ class Membresia:
     def delete(self, membresia_id):
         """Eliminar membresía"""
         result = self.collection.delete_one({'_id': ObjectId(membresia_id)})
+        if result.deleted_count:
+            self.versiones.incrementar('membresias')
         return result.deleted_count > 0
     
     def get_stats(self):
@@ -136,7 +178,7 @@ class Membresia:
             'total': self.collection.count_documents({}),
             'vigentes': self.collection.count_documents({'vigente': True}),
             'vencidas': self.collection.count_documents({'vigente': False}),
-            'proximas_vencer': len(self.get_proximas_vencer(7))
+            'proximas_vencer': self.contar_proximas_vencer(7)
         }
     
     def get_ingresos_mes(self):
@@ -153,5 +195,5 @@ class Membresia:
             }}
         ]
         
-        result = list(self.collection.aggregate(pipeline))
+        result = list(self.reportes.aggregate(pipeline))
         return result[0]['total'] if result else 0
@@ -0,0 +1,173 @@
+"""
+Perfilado de comandos MongoDB por solicitud: cantidad, duración y bytes
+devueltos, con detección de consultas repetidas (posible N+1)
+"""
+import contextvars
+import json
+import threading
+import time
+from collections import Counter, deque
+import bson
+from pymongo import monitoring
+
+# Perfil de la solicitud en curso (None fuera de una solicitud perfilada)
+_perfil_actual = contextvars.ContextVar('perfil_mongo', default=None)
+
+# Comandos del driver que no son consultas de la aplicación
+COMANDOS_IGNORADOS = {
+    'hello', 'isMaster', 'ismaster', 'ping', 'buildInfo', 'endSessions',
+    'saslStart', 'saslContinue', 'authenticate', 'getnonce'
+}
+
+# Partes del comando que definen la forma de la consulta
+PARTES_FORMA = ('filter', 'pipeline', 'query', 'key', 'updates', 'deletes', 'sort')
+
+
+def forma_consulta(valor):
+    """Misma estructura de la consulta con los valores reemplazados por '?'"""
+    if isinstance(valor, dict):
+        return {clave: forma_consulta(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        formas = [forma_consulta(v) for v in valor]
+        # Un $in con 1 o con 500 valores tiene la misma forma
+        return formas if any(isinstance(f, (dict, list)) for f in formas) else '?'
+    return '?'
+
+
+def _clave_forma(event):
+    comando = event.command
+    coleccion = comando.get(event.command_name)
+    partes = {parte: forma_consulta(comando[parte]) for parte in PARTES_FORMA if parte in comando}
+    return f"{event.command_name} {coleccion} {json.dumps(partes, sort_keys=True, default=str)}"
+
+
+class PerfilSolicitud:
+    """Comandos MongoDB emitidos durante una solicitud"""
+
+    def __init__(self, endpoint, metodo, ruta):
+        self.endpoint = endpoint
+        self.metodo = metodo
+        self.ruta = ruta
+        self.comandos = 0
+        self.errores = 0
+        self.mongo_ms = 0.0
+        self.bytes = 0
+        self.formas = Counter()
+        self.inicio = time.perf_counter()
+        self.total_ms = None
+        self.status = None
+
+    def repetidas(self, umbral):
+        """Formas de consulta emitidas al menos 'umbral' veces (posible N+1)"""
+        return [(forma, veces) for forma, veces in self.formas.most_common() if veces >= umbral]
+
+    def como_dict(self, umbral):
+        return {
+            'endpoint': self.endpoint,
+            'metodo': self.metodo,
+            'ruta': self.ruta,
+            'status': self.status,
+            'total_ms': round(self.total_ms or 0, 2),
+            'comandos': self.comandos,
+            'errores': self.errores,
+            'mongo_ms': round(self.mongo_ms, 2),
+            'bytes': self.bytes,
+            'repetidas': self.repetidas(umbral)
+        }
+
+
+class PerfiladorComandos(monitoring.CommandListener):
+    """CommandListener que atribuye cada comando al perfil de la solicitud en curso"""
+
+    def __init__(self, recientes=100):
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self.recientes = deque(maxlen=recientes)
+        self.por_endpoint = {}
+
+    # --- Eventos del driver (corren en el thread que emite el comando) ---
+
+    def started(self, event):
+        perfil = _perfil_actual.get()
+        if perfil is None or event.command_name in COMANDOS_IGNORADOS:
+            return
+        self._pendientes[(event.connection_id, event.request_id)] = perfil
+        perfil.comandos += 1
+        if event.command_name != 'getMore':
+            perfil.formas[_clave_forma(event)] += 1
+
+    def succeeded(self, event):
+        perfil = self._pendientes.pop((event.connection_id, event.request_id), None)
+        if perfil is None:
+            return
+        perfil.mongo_ms += event.duration_micros / 1000
+        perfil.bytes += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        perfil = self._pendientes.pop((event.connection_id, event.request_id), None)
+        if perfil is None:
+            return
+        perfil.mongo_ms += event.duration_micros / 1000
+        perfil.errores += 1
+
+    # --- Ciclo de la solicitud ---
+
+    def iniciar(self, endpoint, metodo, ruta):
+        """Empezar a perfilar la solicitud actual; devuelve el token para terminar"""
+        return _perfil_actual.set(PerfilSolicitud(endpoint, metodo, ruta))
+
+    def terminar(self, token, status=None, umbral_repetidas=5):
+        """Cerrar el perfil de la solicitud y acumularlo por endpoint"""
+        perfil = _perfil_actual.get()
+        _perfil_actual.reset(token)
+        if perfil is None:
+            return None
+
+        perfil.total_ms = (time.perf_counter() - perfil.inicio) * 1000
+        perfil.status = status
+        repetidas = bool(perfil.repetidas(umbral_repetidas))
+
+        with self._lock:
+            self.recientes.appendleft(perfil)
+            acumulado = self.por_endpoint.setdefault(perfil.endpoint, {
+                'solicitudes': 0, 'comandos': 0, 'mongo_ms': 0.0, 'bytes': 0,
+                'total_ms': 0.0, 'max_ms': 0.0, 'max_comandos': 0, 'n_mas_1': 0
+            })
+            acumulado['solicitudes'] += 1
+            acumulado['comandos'] += perfil.comandos
+            acumulado['mongo_ms'] += perfil.mongo_ms
+            acumulado['bytes'] += perfil.bytes
+            acumulado['total_ms'] += perfil.total_ms
+            acumulado['max_ms'] = max(acumulado['max_ms'], perfil.total_ms)
+            acumulado['max_comandos'] = max(acumulado['max_comandos'], perfil.comandos)
+            acumulado['n_mas_1'] += repetidas
+        return perfil
+
+    def resumen(self):
+        """Promedios por endpoint, ordenados por tiempo total en MongoDB"""
+        with self._lock:
+            filas = []
+            for endpoint, datos in self.por_endpoint.items():
+                n = datos['solicitudes']
+                filas.append({
+                    'endpoint': endpoint,
+                    'solicitudes': n,
+                    'comandos_promedio': round(datos['comandos'] / n, 1),
+                    'max_comandos': datos['max_comandos'],
+                    'mongo_ms_promedio': round(datos['mongo_ms'] / n, 2),
+                    'bytes_promedio': int(datos['bytes'] / n),
+                    'total_ms_promedio': round(datos['total_ms'] / n, 2),
+                    'max_ms': round(datos['max_ms'], 2),
+                    'n_mas_1': datos['n_mas_1']
+                })
+        return sorted(filas, key=lambda f: f['mongo_ms_promedio'] * f['solicitudes'], reverse=True)
+
+    def reiniciar(self):
+        """Borrar lo acumulado"""
+        with self._lock:
+            self.recientes.clear()
+            self.por_endpoint = {}
+
+
+# Instancia global (registrada en el MongoClient por Database.connect)
+perfilador = PerfiladorComandos()
@@ -3,20 +3,47 @@ Modelo de Plantilla Biométrica
 """
 from datetime import datetime
 from bson import ObjectId
+from .database import db_manager
 
 class PlantillaBiometrica:
     """Modelo para gestionar plantillas biométricas"""
     
+    # Proyecciones por vista (sin el payload 'template' salvo en 'detalle')
+    PROYECCIONES = {
+        'lista': {
+            'usuario_id': 1, 'usuario_nombre': 1, 'tipo_plantilla': 1, 'calidad': 1,
+            'dispositivo': 1, 'fecha_registro': 1, 'activo': 1,
+            'tiene_template': {'$gt': ['$template', None]}
+        },
+        'resumen': {
+            'tipo_plantilla': 1, 'calidad': 1, 'fecha_registro': 1,
+            'tiene_template': {'$gt': ['$template', None]}
+        },
+        'detalle': None
+    }
+    
+    # Índices usados por las consultas del modelo (se crean en Database.connect)
+    INDICES = [
+        [('usuario_id', 1)],
+        # Listados paginados por _id
+        [('tipo', 1), ('_id', 1)],
+        [('tiene_template_real', 1), ('_id', 1)],
+        # Índice de estadísticas: get_stats se resuelve solo con este índice
+        [('tipo', 1), ('dispositivo', 1), ('tiene_template_real', 1), ('calidad', 1), ('activo', 1)]
+    ]
+    
     def __init__(self, db):
         self.collection = db.plantillas_biometricas
         self.usuarios_collection = db.usuarios
+        # Agregaciones de reportes: secundarios, el primario queda para los registros
+        self.reportes = db_manager.para_reportes(self.collection)
     
-    def find_all(self, page=1, per_page=20, filtros=None):
+    def find_all(self, page=1, per_page=20, filtros=None, vista=None):
         """Obtener todas las plantillas con paginación"""
         skip = (page - 1) * per_page
         query = filtros if filtros else {}
         
-        plantillas = list(self.collection.find(query).skip(skip).limit(per_page))
+        plantillas = list(self.collection.find(query, self.PROYECCIONES.get(vista)).skip(skip).limit(per_page))
         total = self.collection.count_documents(query)
         
         return {
@@ -27,50 +54,122 @@ class PlantillaBiometrica:
             'total_pages': (total + per_page - 1) // per_page
         }
     
-    def find_by_usuario(self, usuario_id):
+    def find_by_usuario(self, usuario_id, vista=None):
         """Obtener plantillas de un usuario"""
-        return list(self.collection.find({'usuario_id': int(usuario_id)}))
+        return list(self.collection.find({'usuario_id': int(usuario_id)}, self.PROYECCIONES.get(vista)))
     
-    def find_by_tipo(self, tipo):
-        """Obtener plantillas por tipo"""
-        plantillas = list(self.collection.find({'tipo': tipo}))
+    def _paginar(self, query, page, per_page, vista):
+        """Página de plantillas con el nombre del usuario adjunto"""
+        skip = (page - 1) * per_page
         
-        # Agregar información del usuario
-        for plantilla in plantillas:
-            if plantilla.get('usuario_id'):
-                usuario = self.usuarios_collection.find_one({'_id': plantilla['usuario_id']})
-                if usuario:
-                    plantilla['usuario_nombre'] = f"{usuario['nombre']} {usuario['apellido']}"
+        plantillas = list(self.collection.find(query, self.PROYECCIONES.get(vista))
+                          .sort('_id', 1).skip(skip).limit(per_page))
+        total = self.collection.count_documents(query)
         
-        return plantillas
+        return {
+            'plantillas': self.adjuntar_usuarios(plantillas),
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'total_pages': (total + per_page - 1) // per_page
+        }
     
-    def get_con_template(self):
-        """Obtener plantillas con template real"""
-        plantillas = list(self.collection.find({'tiene_template_real': True}).limit(100))
+    def adjuntar_usuarios(self, plantillas):
+        """Agregar usuario_nombre con una sola consulta $in en lugar de una por plantilla"""
+        ids = {p['usuario_id'] for p in plantillas if p.get('usuario_id') is not None}
+        if not ids:
+            return plantillas
+        
+        nombres = {
+            usuario['_id']: f"{usuario['nombre']} {usuario['apellido']}"
+            for usuario in self.usuarios_collection.find({'_id': {'$in': list(ids)}}, {'nombre': 1, 'apellido': 1})
+        }
         
-        # Agregar información del usuario
         for plantilla in plantillas:
-            if plantilla.get('usuario_id'):
-                usuario = self.usuarios_collection.find_one({'_id': plantilla['usuario_id']})
-                if usuario:
-                    plantilla['usuario_nombre'] = f"{usuario['nombre']} {usuario['apellido']}"
+            nombre = nombres.get(plantilla.get('usuario_id'))
+            if nombre:
+                plantilla['usuario_nombre'] = nombre
         
         return plantillas
     
+    def find_by_tipo(self, tipo, page=1, per_page=50, vista=None):
+        """Obtener plantillas por tipo (paginado)"""
+        return self._paginar({'tipo': tipo}, page, per_page, vista)
+    
+    def get_con_template(self, page=1, per_page=50, vista=None):
+        """Obtener plantillas con template real (paginado)"""
+        return self._paginar({'tiene_template_real': True}, page, per_page, vista)
+    
+    def desactivar(self, plantilla_id):
+        """Desactivar plantilla (soft delete)"""
+        result = self.collection.update_one(
+            {'_id': ObjectId(plantilla_id)},
+            {'$set': {'activo': False, 'updated_at': datetime.now()}}
+        )
+        return result.modified_count > 0
+    
+    def normalizar_tipos(self):
+        """Completar 'tipo' y 'tipo_plantilla' cuando solo existe uno de los dos"""
+        desde_plantilla = self.collection.update_many(
+            {'tipo': {'$exists': False}, 'tipo_plantilla': {'$exists': True}},
+            [{'$set': {'tipo': '$tipo_plantilla'}}]
+        )
+        desde_tipo = self.collection.update_many(
+            {'tipo_plantilla': {'$exists': False}, 'tipo': {'$exists': True}},
+            [{'$set': {'tipo_plantilla': '$tipo'}}]
+        )
+        sin_marca = self.collection.update_many(
+            {'tiene_template_real': {'$exists': False}},
+            [{'$set': {'tiene_template_real': {'$gt': ['$template', None]}}}]
+        )
+        return desde_plantilla.modified_count + desde_tipo.modified_count + sin_marca.modified_count
+    
     def get_stats(self):
-        """Obtener estadísticas de plantillas"""
-        pipeline_tipo = [
+        """Obtener estadísticas de plantillas con una sola agregación
+        
+        Agrupa por tipo y dispositivo usando solo campos del índice de
+        estadísticas, sin leer el payload 'template'.
+        """
+        def contar(condicion):
+            return {'$sum': {'$cond': [condicion, 1, 0]}}
+        
+        pipeline = [
+            {'$sort': {'tipo': 1, 'dispositivo': 1}},
+            {'$group': {
+                '_id': {'tipo': '$tipo', 'dispositivo': '$dispositivo'},
+                'total': {'$sum': 1},
+                'con_template': contar({'$eq': ['$tiene_template_real', True]}),
+                'activas': contar({'$ne': ['$activo', False]}),
+                'calidad_alta': contar({'$gte': ['$calidad', 80]}),
+                'calidad_media': contar({'$and': [{'$gte': ['$calidad', 50]}, {'$lt': ['$calidad', 80]}]})
+            }},
             {'$group': {
-                '_id': '$tipo',
-                'total': {'$sum': 1}
+                '_id': '$_id.tipo',
+                'total': {'$sum': '$total'},
+                'con_template': {'$sum': '$con_template'},
+                'activas': {'$sum': '$activas'},
+                'calidad_alta': {'$sum': '$calidad_alta'},
+                'calidad_media': {'$sum': '$calidad_media'},
+                'por_dispositivo': {'$push': {'dispositivo': '$_id.dispositivo', 'total': '$total'}}
             }},
             {'$sort': {'total': -1}}
         ]
         
+        por_tipo = list(self.reportes.aggregate(pipeline))
+        for fila in por_tipo:
+            fila['sin_template'] = fila['total'] - fila['con_template']
+            fila['calidad_baja'] = fila['total'] - fila['calidad_alta'] - fila['calidad_media']
+        
+        def sumar(campo):
+            return sum(fila[campo] for fila in por_tipo)
+        
         return {
-            'total': self.collection.count_documents({}),
-            'con_template': self.collection.count_documents({'tiene_template_real': True}),
-            'sin_template': self.collection.count_documents({'tiene_template_real': False}),
-            'por_tipo': list(self.collection.aggregate(pipeline_tipo)),
-            'activas': self.collection.count_documents({'activo': True})
+            'total': sumar('total'),
+            'con_template': sumar('con_template'),
+            'sin_template': sumar('sin_template'),
+            'activas': sumar('activas'),
+            'calidad_alta': sumar('calidad_alta'),
+            'calidad_media': sumar('calidad_media'),
+            'calidad_baja': sumar('calidad_baja'),
+            'por_tipo': por_tipo
         }
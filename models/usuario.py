@@ -1,21 +1,68 @@
 """
 Modelo de Usuario
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from .asistencia import Asistencia
+from .database import db_manager
+from .membresia import Membresia
+from .plantilla_biometrica import PlantillaBiometrica
+from .versiones import VersionesDatos
+
+# Campos de perfil que se pueden actualizar en una importación masiva
+CAMPOS_PERFIL = [
+    'nombre', 'apellido', 'codigo', 'departamento_id', 'departamento_nombre',
+    'genero', 'fecha_nacimiento', 'fecha_inicio', 'fecha_fin', 'celular',
+    'email', 'tipo_documento', 'numero_documento'
+]
+
+# Pool compartido para el modo de consultas concurrentes de detalle_completo
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='usuario-detalle')
 
 class Usuario:
     """Modelo para gestionar usuarios"""
     
+    # Proyecciones por vista: 'lista' para filas de tablas, 'resumen' para
+    # el estado de membresía y 'detalle' para la ficha del usuario
+    PROYECCIONES = {
+        'lista': {
+            'nombre': 1, 'apellido': 1, 'codigo': 1, 'numero_documento': 1,
+            'departamento_nombre': 1, 'fecha_nacimiento': 1, 'activo': 1
+        },
+        'resumen': {
+            'nombre': 1, 'apellido': 1, 'codigo': 1, 'departamento_nombre': 1,
+            'fecha_inicio': 1, 'fecha_fin': 1, 'activo': 1
+        },
+        'detalle': {'plantillas_biometricas': 0}
+    }
+    
+    # Índices usados por las consultas del modelo (se crean en Database.connect)
+    INDICES = [
+        # Vigentes, vencidos y próximos a vencer ordenados por fecha_fin
+        [('activo', 1), ('fecha_fin', 1)],
+        # Activos y sin membresía ordenados por nombre
+        [('activo', 1), ('nombre', 1)]
+    ]
+    
     def __init__(self, db):
         self.collection = db.usuarios
+        self.membresias_collection = db.membresias
+        self.asistencias_collection = db.asistencias
+        self.plantillas_collection = db.plantillas_biometricas
+        # Invalida los fragmentos de plantillas que muestran usuarios
+        self.versiones = VersionesDatos(db)
+        # Listados y agregaciones de reportes: secundarios, el primario queda para los registros
+        self.reportes = db_manager.para_reportes(self.collection)
     
-    def find_all(self, page=1, per_page=20, filtros=None):
+    def find_all(self, page=1, per_page=20, filtros=None, vista=None):
         """Obtener todos los usuarios con paginación"""
         skip = (page - 1) * per_page
         query = filtros if filtros else {}
         
-        usuarios = list(self.collection.find(query).skip(skip).limit(per_page))
+        usuarios = list(self.collection.find(query, self.PROYECCIONES.get(vista)).skip(skip).limit(per_page))
         total = self.collection.count_documents(query)
         
         return {
@@ -26,14 +73,97 @@ class Usuario:
             'total_pages': (total + per_page - 1) // per_page
         }
     
-    def find_by_id(self, usuario_id):
+    def find_by_id(self, usuario_id, vista=None):
         """Obtener usuario por ID"""
         try:
-            return self.collection.find_one({'_id': int(usuario_id)})
+            return self.collection.find_one({'_id': int(usuario_id)}, self.PROYECCIONES.get(vista))
         except:
             return None
     
-    def search(self, query):
+    def detalle_completo(self, usuario_id, limite_asistencias=10):
+        """Obtener usuario con sus membresías, asistencias recientes y plantillas
+        
+        Usa una sola agregación con $lookup; si el servidor no la soporta
+        (MongoDB < 5.0) hace las cuatro consultas en paralelo.
+        Devuelve None si el usuario no existe.
+        """
+        try:
+            usuario_id = int(usuario_id)
+        except (TypeError, ValueError):
+            return None
+        
+        pipeline = [
+            {'$match': {'_id': usuario_id}},
+            {'$project': self.PROYECCIONES['detalle']},
+            {'$lookup': {
+                'from': 'membresias',
+                'localField': '_id',
+                'foreignField': 'usuario_id',
+                'pipeline': [
+                    {'$sort': {'fecha_inicio': -1}},
+                    {'$project': Membresia.PROYECCIONES['resumen']}
+                ],
+                'as': 'membresias'
+            }},
+            {'$lookup': {
+                'from': 'asistencias',
+                'localField': '_id',
+                'foreignField': 'usuario_id',
+                'pipeline': [
+                    {'$sort': {'fecha': -1}},
+                    {'$limit': limite_asistencias},
+                    {'$project': Asistencia.PROYECCIONES['resumen']}
+                ],
+                'as': 'asistencias'
+            }},
+            {'$lookup': {
+                'from': 'plantillas_biometricas',
+                'localField': '_id',
+                'foreignField': 'usuario_id',
+                'pipeline': [{'$project': PlantillaBiometrica.PROYECCIONES['resumen']}],
+                'as': 'plantillas'
+            }}
+        ]
+        
+        try:
+            resultado = next(self.collection.aggregate(pipeline), None)
+        except OperationFailure:
+            return self._detalle_concurrente(usuario_id, limite_asistencias)
+        
+        if not resultado:
+            return None
+        
+        return {
+            'membresias': resultado.pop('membresias'),
+            'asistencias': resultado.pop('asistencias'),
+            'plantillas': resultado.pop('plantillas'),
+            'usuario': resultado
+        }
+    
+    def _detalle_concurrente(self, usuario_id, limite_asistencias):
+        """Modo alternativo de detalle_completo: cuatro consultas en paralelo"""
+        filtro = {'usuario_id': usuario_id}
+        usuario = _executor.submit(self.find_by_id, usuario_id, 'detalle')
+        membresias = _executor.submit(
+            lambda: list(self.membresias_collection.find(filtro, Membresia.PROYECCIONES['resumen'])
+                         .sort('fecha_inicio', -1)))
+        asistencias = _executor.submit(
+            lambda: list(self.asistencias_collection.find(filtro, Asistencia.PROYECCIONES['resumen'])
+                         .sort('fecha', -1).limit(limite_asistencias)))
+        plantillas = _executor.submit(
+            lambda: list(self.plantillas_collection.find(filtro, PlantillaBiometrica.PROYECCIONES['resumen'])))
+        
+        if not usuario.result():
+            return None
+        
+        return {
+            'usuario': usuario.result(),
+            'membresias': membresias.result(),
+            'asistencias': asistencias.result(),
+            'plantillas': plantillas.result()
+        }
+    
+    def search(self, query, vista=None):
         """Buscar usuarios por nombre, apellido, código, documento o email"""
         filtro = {
             '$or': [
@@ -44,7 +174,7 @@ class Usuario:
                 {'email': {'$regex': query, '$options': 'i'}}
             ]
         }
-        return list(self.collection.find(filtro).limit(50))
+        return list(self.collection.find(filtro, self.PROYECCIONES.get(vista)).limit(50))
     
     def create(self, data):
         """Crear nuevo usuario"""
@@ -74,8 +204,84 @@ class Usuario:
         }
         
         result = self.collection.insert_one(usuario)
+        self.versiones.incrementar('usuarios')
         return result.inserted_id
     
+    def importar_lote(self, usuarios):
+        """Crear o actualizar un lote de usuarios con un solo bulk_write
+        
+        Devuelve insertados, actualizados y la lista de (indice, error)
+        de las operaciones que fallaron dentro del lote.
+        """
+        if not usuarios:
+            return {'insertados': 0, 'actualizados': 0, 'errores': []}
+        
+        ahora = datetime.now()
+        operaciones = []
+        for data in usuarios:
+            campos = {campo: data.get(campo) for campo in CAMPOS_PERFIL if campo in data}
+            campos['updated_at'] = ahora
+            operaciones.append(UpdateOne(
+                {'_id': int(data['id'])},
+                {
+                    '$set': campos,
+                    '$setOnInsert': {
+                        'plantillas_biometricas': [],
+                        'tiene_foto': False,
+                        'foto_path': None,
+                        'tiene_biometria': False,
+                        'total_plantillas': 0,
+                        'activo': True,
+                        'created_at': ahora
+                    }
+                },
+                upsert=True
+            ))
+        
+        errores = []
+        try:
+            result = self.collection.bulk_write(operaciones, ordered=False)
+            detalle = result.bulk_api_result
+        except BulkWriteError as e:
+            detalle = e.details
+            errores = [(err['index'], err.get('errmsg', 'Error de escritura'))
+                       for err in detalle.get('writeErrors', [])]
+        self.versiones.incrementar('usuarios')
+        
+        return {
+            'insertados': detalle.get('nUpserted', 0),
+            'actualizados': detalle.get('nModified', 0),
+            'errores': errores
+        }
+
+    def get_ids(self):
+        """Conjunto de IDs de todos los usuarios (para validar importaciones)"""
+        return {usuario['_id'] for usuario in self.collection.find({}, {'_id': 1})}
+
+    def actualizar_resumen_biometria(self, usuario_ids):
+        """Recalcular tiene_biometria/total_plantillas de varios usuarios con un solo bulk_write"""
+        usuario_ids = list(usuario_ids)
+        if not usuario_ids:
+            return 0
+
+        conteos = {fila['_id']: fila['total'] for fila in self.plantillas_collection.aggregate([
+            {'$match': {'usuario_id': {'$in': usuario_ids}, 'activo': {'$ne': False}}},
+            {'$group': {'_id': '$usuario_id', 'total': {'$sum': 1}}}
+        ])}
+
+        ahora = datetime.now()
+        operaciones = [
+            UpdateOne({'_id': usuario_id}, {'$set': {
+                'tiene_biometria': conteos.get(usuario_id, 0) > 0,
+                'total_plantillas': conteos.get(usuario_id, 0),
+                'updated_at': ahora
+            }})
+            for usuario_id in usuario_ids
+        ]
+        modificados = self.collection.bulk_write(operaciones, ordered=False).modified_count
+        self.versiones.incrementar('usuarios')
+        return modificados
+
     def update(self, usuario_id, data):
         """Actualizar usuario"""
         data['updated_at'] = datetime.now()
@@ -84,21 +290,44 @@ class Usuario:
             {'_id': int(usuario_id)},
             {'$set': data}
         )
+        self.versiones.incrementar('usuarios')
         return result.modified_count > 0
     
+    @staticmethod
+    def campos_denormalizados(usuario):
+        """Campos del usuario que se copian en asistencias, membresías y plantillas"""
+        return {
+            'usuario_nombre': f"{usuario.get('nombre')} {usuario.get('apellido')}",
+            'departamento_id': usuario.get('departamento_id'),
+            'departamento_nombre': usuario.get('departamento_nombre')
+        }
+    
     def delete(self, usuario_id):
         """Eliminar usuario (soft delete)"""
         return self.update(usuario_id, {'activo': False})
     
     def get_stats(self):
-        """Obtener estadísticas de usuarios"""
-        return {
-            'total': self.collection.count_documents({}),
-            'activos': self.collection.count_documents({'activo': True}),
-            'inactivos': self.collection.count_documents({'activo': False}),
-            'con_foto': self.collection.count_documents({'tiene_foto': True}),
-            'con_biometria': self.collection.count_documents({'tiene_biometria': True}),
-            'con_email': self.collection.count_documents({'email': {'$ne': ''}}),
+        """Obtener estadísticas de usuarios (una sola pasada por la colección)"""
+        def contar(condicion):
+            return {'$sum': {'$cond': [condicion, 1, 0]}}
+        
+        pipeline = [
+            {'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'activos': contar({'$eq': ['$activo', True]}),
+                'inactivos': contar({'$eq': ['$activo', False]}),
+                'con_foto': contar({'$eq': ['$tiene_foto', True]}),
+                'con_biometria': contar({'$eq': ['$tiene_biometria', True]}),
+                'con_email': contar({'$ne': ['$email', '']})
+            }},
+            {'$project': {'_id': 0}}
+        ]
+        
+        resultado = next(self.collection.aggregate(pipeline), None)
+        return resultado or {
+            'total': 0, 'activos': 0, 'inactivos': 0,
+            'con_foto': 0, 'con_biometria': 0, 'con_email': 0
         }
     
     def get_by_departamento(self):
@@ -110,7 +339,15 @@ class Usuario:
             }},
             {'$sort': {'total': -1}}
         ]
-        return list(self.collection.aggregate(pipeline))
+        return list(self.reportes.aggregate(pipeline))
+    
+    def find_activos(self, vista=None):
+        """Obtener usuarios activos ordenados por nombre (recorrido de /membresias)
+
+        Lee del primario, igual que version_datos: la tabla se guarda en
+        caché con esa versión y un secundario atrasado la dejaría vieja.
+        """
+        return list(self.collection.find({'activo': True}, self.PROYECCIONES.get(vista)).sort('nombre', 1))
     
     def get_vigentes(self):
         """Obtener usuarios con membresía vigente"""
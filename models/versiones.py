@@ -0,0 +1,29 @@
+"""
+Versiones de datos por colección (para invalidar fragmentos de plantillas)
+"""
+from pymongo import UpdateOne
+
+
+class VersionesDatos:
+    """Contador por colección en 'versiones', compartido por todos los procesos
+
+    Los modelos lo incrementan al escribir; las plantillas lo usan como
+    parte de la clave de {% cache %}, así un cambio invalida los
+    fragmentos de cualquier worker sin avisarles.
+    """
+
+    def __init__(self, db):
+        self.collection = db.versiones
+
+    def incrementar(self, *nombres):
+        """Marcar que cambiaron los datos de las colecciones indicadas"""
+        if nombres:
+            self.collection.bulk_write(
+                [UpdateOne({'_id': nombre}, {'$inc': {'version': 1}}, upsert=True) for nombre in nombres],
+                ordered=False
+            )
+
+    def leer(self, *nombres):
+        """Versiones actuales, en el mismo orden (0 si la colección nunca cambió)"""
+        versiones = {doc['_id']: doc['version'] for doc in self.collection.find({'_id': {'$in': list(nombres)}})}
+        return tuple(versiones.get(nombre, 0) for nombre in nombres)
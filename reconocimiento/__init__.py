@@ -0,0 +1,29 @@
+"""
+Reconocimiento biométrico: decodificación de templates y comparación 1:N
+"""
+from .codec import codificar_template, decodificar_binario, migrar_templates, template_json
+from .plantillas import decodificar_template, tipo_de
+from .ann import IndiceIVFPQ
+from .galeria import Galeria, AlmacenGaleria, leer_galerias
+from .motor import MotorIdentificacion, motor
+from .lotes import DespachadorLotes, despachador
+from .procesos import PoolPuntuacion, PoolSaturado
+
+__all__ = [
+    'codificar_template',
+    'decodificar_binario',
+    'migrar_templates',
+    'template_json',
+    'decodificar_template',
+    'tipo_de',
+    'IndiceIVFPQ',
+    'Galeria',
+    'AlmacenGaleria',
+    'leer_galerias',
+    'MotorIdentificacion',
+    'motor',
+    'DespachadorLotes',
+    'despachador',
+    'PoolPuntuacion',
+    'PoolSaturado'
+]
@@ -0,0 +1,141 @@
+"""
+Índice aproximado (IVF + cuantización por producto) para identificación
+sobre galerías grandes, con re-ranking exacto de los mejores candidatos
+"""
+import numpy as np
+
+# Filas máximas usadas para entrenar los centroides gruesos y los codebooks PQ
+MAX_ENTRENAMIENTO = 20000
+MAX_ENTRENAMIENTO_PQ = 256 * 32
+
+
+def _kmeans(datos, k, iteraciones, rng, esferico=False):
+    """K-means simple en NumPy -> (centroides, asignacion)
+
+    Con esferico=True los centroides se normalizan y se asigna por coseno.
+    """
+    n = datos.shape[0]
+    k = max(1, min(k, n))
+    centroides = datos[rng.choice(n, k, replace=False)].astype(np.float32)
+
+    for _ in range(iteraciones):
+        asignacion = _asignar(datos, centroides, esferico)
+        conteos = np.bincount(asignacion, minlength=k).astype(np.float32)
+        sumas = np.zeros_like(centroides)
+        orden = np.argsort(asignacion, kind='stable')
+        usados = np.flatnonzero(conteos)
+        inicios = np.concatenate([[0], np.cumsum(conteos[usados])[:-1]]).astype(np.intp)
+        sumas[usados] = np.add.reduceat(datos[orden], inicios, axis=0)
+
+        vacios = conteos == 0
+        sumas[vacios] = centroides[vacios]
+        conteos[vacios] = 1
+        if esferico:
+            normas = np.linalg.norm(sumas, axis=1, keepdims=True)
+            normas[normas == 0] = 1
+            centroides = sumas / normas
+        else:
+            centroides = sumas / conteos[:, np.newaxis]
+
+    return centroides.astype(np.float32), _asignar(datos, centroides, esferico)
+
+
+def _asignar(datos, centroides, esferico=False):
+    """Centroide más cercano de cada fila"""
+    productos = datos @ centroides.T
+    if not esferico:
+        # argmin ||x - c||^2 == argmax (x·c - ||c||^2 / 2)
+        productos -= 0.5 * np.einsum('ij,ij->i', centroides, centroides)
+    return np.argmax(productos, axis=1)
+
+
+def _divisor(dimension, maximo):
+    """Mayor divisor de la dimensión que no supera 'maximo'"""
+    for m in range(min(maximo, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+class IndiceIVFPQ:
+    """Listas invertidas sobre centroides gruesos con códigos PQ por fila
+
+    Búsqueda: se exploran las 'nprobe' listas más cercanas, se estiman los
+    scores con tablas PQ y los 'reordenar' mejores se puntúan de forma exacta.
+    """
+
+    def __init__(self, nlist=None, subvectores=16, iteraciones=10, semilla=0):
+        self.nlist = nlist
+        self.subvectores = subvectores
+        self.iteraciones = iteraciones
+        self.semilla = semilla
+        self.total = 0
+
+    def entrenar(self, vectores):
+        """Entrenar centroides/codebooks e indexar todas las filas"""
+        rng = np.random.default_rng(self.semilla)
+        n, dimension = vectores.shape
+        muestra = vectores if n <= MAX_ENTRENAMIENTO else vectores[rng.choice(n, MAX_ENTRENAMIENTO, replace=False)]
+
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        self.centroides, _ = _kmeans(muestra, nlist, self.iteraciones, rng, esferico=True)
+
+        self.m = _divisor(dimension, self.subvectores)
+        self.dsub = dimension // self.m
+        muestra = muestra[:MAX_ENTRENAMIENTO_PQ]
+        subespacios = muestra.reshape(muestra.shape[0], self.m, self.dsub)
+        ks = min(256, muestra.shape[0])
+        self.codebooks = np.stack([
+            _kmeans(np.ascontiguousarray(subespacios[:, j, :]), ks, self.iteraciones, rng)[0]
+            for j in range(self.m)
+        ])
+
+        self.asignacion = np.empty(0, dtype=np.int32)
+        self.codigos = np.empty((0, self.m), dtype=np.uint8)
+        self.total = 0
+        self.agregar(vectores)
+        return self
+
+    def _codificar(self, vectores):
+        subespacios = vectores.reshape(vectores.shape[0], self.m, self.dsub)
+        return np.stack([
+            _asignar(np.ascontiguousarray(subespacios[:, j, :]), self.codebooks[j])
+            for j in range(self.m)
+        ], axis=1).astype(np.uint8)
+
+    def agregar(self, vectores):
+        """Indexar filas nuevas (se numeran a continuación de las existentes)"""
+        vectores = np.asarray(vectores, dtype=np.float32).reshape(-1, self.centroides.shape[1])
+        if vectores.shape[0] == 0:
+            return
+        self.asignacion = np.concatenate([self.asignacion, _asignar(vectores, self.centroides, True).astype(np.int32)])
+        self.codigos = np.vstack([self.codigos, self._codificar(vectores)])
+        self.total = self.asignacion.shape[0]
+
+        orden = np.argsort(self.asignacion, kind='stable')
+        limites = np.searchsorted(self.asignacion[orden], np.arange(self.centroides.shape[0] + 1))
+        self._listas = [orden[limites[i]:limites[i + 1]] for i in range(self.centroides.shape[0])]
+
+    def buscar(self, vector, galeria, top_k=5, nprobe=8, reordenar=100):
+        """Candidatos aproximados re-puntuados de forma exacta contra la galería"""
+        nprobe = max(1, min(nprobe, self.centroides.shape[0]))
+        gruesos = self.centroides @ vector
+        listas = np.argpartition(-gruesos, nprobe - 1)[:nprobe]
+        filas = np.concatenate([self._listas[i] for i in listas])
+        # El índice puede ir por delante de una galería anterior a la última alta
+        filas = filas[filas < len(galeria)]
+        if filas.size == 0:
+            return []
+
+        # Scores aproximados con tablas de distancias por subespacio (ADC)
+        tabla = np.einsum('mkd,md->mk', self.codebooks, vector.reshape(self.m, self.dsub))
+        aproximados = tabla[np.arange(self.m), self.codigos[filas]].sum(axis=1)
+
+        r = min(reordenar, filas.size)
+        mejores = filas[np.argpartition(-aproximados, r - 1)[:r]]
+
+        scores = np.full(len(galeria), -np.inf, dtype=np.float32)
+        scores[mejores] = galeria.filas(mejores) @ vector
+        if galeria.activos is not None:
+            scores[~galeria.activos] = -np.inf
+        return galeria.candidatos(scores, top_k)
@@ -0,0 +1,163 @@
+"""
+Formato binario compacto para templates biométricos
+
+Cabecera fija little-endian de 8 bytes seguida de los valores:
+
+    magic   2 bytes  b'GT'
+    version 1 byte   FORMATO_VERSION
+    compr   1 byte   0 = sin comprimir, 1 = zlib, 2 = zstd
+    dtype   1 byte   1 = uint8, 2 = float32 ('<f4')
+    -       1 byte   reservado
+    n       2 bytes  cantidad de valores (uint16)
+
+Se guarda como BSON Binary de subtipo 0x80 (definido por el usuario) para
+distinguirlo de bytes crudos antiguos.
+"""
+import base64
+import binascii
+import struct
+import zlib
+import numpy as np
+from bson.binary import Binary
+from pymongo import UpdateOne
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstd es opcional
+    zstandard = None
+
+MAGIC = b'GT'
+FORMATO_VERSION = 1
+SUBTIPO = 0x80
+CABECERA = struct.Struct('<2sBBBBH')
+
+SIN_COMPRESION, ZLIB, ZSTD = 0, 1, 2
+COMPRESIONES = {'none': SIN_COMPRESION, 'zlib': ZLIB, 'zstd': ZSTD}
+DTYPES = {1: np.dtype('<u1'), 2: np.dtype('<f4')}
+
+
+def es_binario(valor):
+    """True si el valor ya está en el formato binario compacto"""
+    return isinstance(valor, Binary) and valor.subtype == SUBTIPO
+
+
+def _valores(template):
+    """Valores crudos de un template en formato JSON (base64, bytes o lista de números)"""
+    if isinstance(template, str):
+        try:
+            template = base64.b64decode(template, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("Template base64 inválido")
+    if isinstance(template, (bytes, bytearray, memoryview)):
+        return np.frombuffer(template, dtype=np.uint8)
+    if isinstance(template, (list, tuple, np.ndarray)):
+        try:
+            valores = np.asarray(template).ravel()
+        except (TypeError, ValueError):
+            raise ValueError("Template numérico inválido")
+        # Listas de enteros 0-255 se guardan como bytes
+        if valores.size and np.issubdtype(valores.dtype, np.integer) and valores.min() >= 0 and valores.max() <= 255:
+            return valores.astype(np.uint8)
+        return valores.astype('<f4')
+    raise ValueError("Formato de template no soportado")
+
+
+def codificar_template(template, compresion='zlib'):
+    """Convertir un template a BSON Binary con cabecera y compresión opcional"""
+    if es_binario(template):
+        return template
+
+    valores = _valores(template)
+    if valores.size == 0 or valores.size > 0xFFFF:
+        raise ValueError("Template vacío o demasiado grande")
+
+    dtype = 1 if valores.dtype == np.uint8 else 2
+    datos = np.ascontiguousarray(valores, dtype=DTYPES[dtype]).tobytes()
+
+    codigo = COMPRESIONES.get(compresion, SIN_COMPRESION)
+    if codigo == ZSTD and zstandard is None:
+        codigo = ZLIB
+    if codigo != SIN_COMPRESION:
+        comprimido = (zstandard.ZstdCompressor(level=3).compress(datos) if codigo == ZSTD
+                      else zlib.compress(datos, 6))
+        # Solo comprimir si realmente ahorra espacio
+        if len(comprimido) < len(datos):
+            datos = comprimido
+        else:
+            codigo = SIN_COMPRESION
+
+    cabecera = CABECERA.pack(MAGIC, FORMATO_VERSION, codigo, dtype, 0, valores.size)
+    return Binary(cabecera + datos, SUBTIPO)
+
+
+def decodificar_binario(binario):
+    """Valores de un template binario como arreglo NumPy (sin copia si no está comprimido)"""
+    magic, version, codigo, dtype, _, n = CABECERA.unpack_from(binario)
+    if magic != MAGIC or version != FORMATO_VERSION or dtype not in DTYPES:
+        raise ValueError("Template binario inválido")
+
+    if codigo == SIN_COMPRESION:
+        return np.frombuffer(binario, dtype=DTYPES[dtype], count=n, offset=CABECERA.size)
+
+    datos = memoryview(binario)[CABECERA.size:]
+    if codigo == ZLIB:
+        datos = zlib.decompress(datos)
+    elif codigo == ZSTD:
+        if zstandard is None:
+            raise ValueError("Template comprimido con zstd y el módulo zstandard no está instalado")
+        datos = zstandard.ZstdDecompressor().decompress(datos, max_output_size=n * DTYPES[dtype].itemsize)
+    else:
+        raise ValueError("Compresión de template desconocida")
+    return np.frombuffer(datos, dtype=DTYPES[dtype], count=n)
+
+
+def template_json(valor):
+    """Template almacenado en el formato que recibe la API (lista de números)
+
+    Las respuestas JSON no exponen el binario interno: los templates
+    binarios se decodifican y los bytes crudos antiguos pasan a lista de 0-255.
+    """
+    if es_binario(valor):
+        return decodificar_binario(valor).tolist()
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return list(bytes(valor))
+    return valor
+
+
+def migrar_templates(db, tamano_lote=500, compresion='zlib', progreso=None):
+    """Convertir en lotes los templates JSON existentes al formato binario
+
+    Devuelve (convertidas, errores).
+    """
+    collection = db.plantillas_biometricas
+    filtro = {'$or': [{'template': {'$type': 'string'}}, {'template': {'$type': 'array'}}]}
+    ultimo_id = None
+    convertidas = errores = 0
+
+    while True:
+        query = dict(filtro)
+        if ultimo_id is not None:
+            query['_id'] = {'$gt': ultimo_id}
+        lote = list(collection.find(query, {'template': 1}).sort('_id', 1).limit(tamano_lote))
+        if not lote:
+            break
+        ultimo_id = lote[-1]['_id']
+
+        operaciones = []
+        for plantilla in lote:
+            try:
+                binario = codificar_template(plantilla['template'], compresion)
+            except ValueError:
+                errores += 1
+                continue
+            operaciones.append(UpdateOne(
+                {'_id': plantilla['_id']},
+                {'$set': {'template': binario, 'template_formato': FORMATO_VERSION}}
+            ))
+
+        if operaciones:
+            convertidas += collection.bulk_write(operaciones, ordered=False).modified_count
+        if progreso:
+            progreso(convertidas, errores)
+
+    return convertidas, errores
@@ -0,0 +1,374 @@
+"""
+Galería de templates por tipo: matrices en disco mapeadas en memoria
+(compartidas entre procesos) más un log de deltas de altas y bajas
+"""
+import base64
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime
+import numpy as np
+from .plantillas import decodificar_template, tipo_de
+
+FORMATO = 1
+MANIFIESTO = 'manifest.json'
+# Un bloqueo más viejo que esto quedó de un proceso que murió construyendo
+BLOQUEO_VENCIMIENTO = 600
+
+# Margen de candidatos extra para usuarios con varias plantillas del mismo tipo
+FACTOR_CANDIDATOS = 4
+
+
+class Galeria:
+    """Matriz contigua de características de un tipo de plantilla
+
+    La matriz base puede estar mapeada desde disco (solo lectura); las altas
+    posteriores se guardan en 'extra' y las bajas en la máscara 'activos'.
+    """
+
+    def __init__(self, tipo, matriz, usuario_ids, plantilla_ids, extra=None, activos=None):
+        self.tipo = tipo
+        self.matriz = matriz if isinstance(matriz, np.memmap) else np.ascontiguousarray(matriz, dtype=np.float32)
+        self.usuario_ids = np.asarray(usuario_ids, dtype=np.int64)
+        self.plantilla_ids = np.asarray(plantilla_ids)
+        self.extra = extra if extra is not None else np.empty((0, self.matriz.shape[1]), dtype=np.float32)
+        self.activos = activos
+
+    def __len__(self):
+        return self.usuario_ids.shape[0]
+
+    @property
+    def dimension(self):
+        return self.matriz.shape[1]
+
+    def puntuar(self, consultas):
+        """Similitud coseno de una matriz de consultas (q, d) contra la galería -> (q, n)"""
+        if consultas.shape[-1] != self.dimension:
+            raise ValueError(f"El template tiene {consultas.shape[-1]} características, "
+                             f"la galería de {self.tipo} usa {self.dimension}")
+        scores = consultas @ self.matriz.T
+        if self.extra.shape[0]:
+            scores = np.hstack([scores, consultas @ self.extra.T])
+        if self.activos is not None:
+            scores[:, ~self.activos] = -np.inf
+        return scores
+
+    def vectores(self, mascara):
+        """Vectores de las filas seleccionadas (solo filas activas)"""
+        if self.activos is not None:
+            mascara = mascara & self.activos
+        base = self.matriz.shape[0]
+        return np.vstack([self.matriz[mascara[:base]], self.extra[mascara[base:]]])
+
+    def filas(self, indices):
+        """Vectores de las filas indicadas por posición (base + extra)"""
+        indices = np.asarray(indices)
+        base = self.matriz.shape[0]
+        en_base = indices < base
+        if en_base.all():
+            return self.matriz[indices]
+        resultado = np.empty((indices.shape[0], self.dimension), dtype=np.float32)
+        resultado[en_base] = self.matriz[indices[en_base]]
+        resultado[~en_base] = self.extra[indices[~en_base] - base]
+        return resultado
+
+    def candidatos(self, scores, top_k):
+        """Mejores top_k usuarios distintos para un vector de scores"""
+        n = scores.shape[0]
+        if n == 0:
+            return []
+        k = min(n, top_k * FACTOR_CANDIDATOS)
+        indices = np.argpartition(-scores, k - 1)[:k]
+        indices = indices[np.argsort(-scores[indices])]
+
+        resultado = []
+        vistos = set()
+        for i in indices:
+            if not np.isfinite(scores[i]):
+                break
+            usuario_id = int(self.usuario_ids[i])
+            if usuario_id in vistos:
+                continue
+            vistos.add(usuario_id)
+            resultado.append({
+                'usuario_id': usuario_id,
+                'plantilla_id': _id_texto(self.plantilla_ids[i]),
+                'score': round(float(scores[i]), 4)
+            })
+            if len(resultado) == top_k:
+                break
+        return resultado
+
+    def agregar(self, usuario_id, plantilla_id, vector):
+        """Nueva galería con una plantilla añadida al final"""
+        activos = None if self.activos is None else np.append(self.activos, True)
+        return Galeria(
+            self.tipo,
+            self.matriz,
+            np.append(self.usuario_ids, usuario_id),
+            np.append(self.plantilla_ids.astype(str), str(plantilla_id)),
+            extra=np.vstack([self.extra, vector[np.newaxis, :]]),
+            activos=activos
+        )
+
+    def eliminar(self, plantilla_ids):
+        """Nueva galería con las plantillas indicadas marcadas como inactivas"""
+        bajas = np.isin(self.plantilla_ids.astype(str), [str(p) for p in plantilla_ids])
+        if not bajas.any():
+            return self
+        activos = np.ones(len(self), dtype=bool) if self.activos is None else self.activos.copy()
+        activos &= ~bajas
+        return Galeria(self.tipo, self.matriz, self.usuario_ids, self.plantilla_ids,
+                       extra=self.extra, activos=activos)
+
+
+def _id_texto(plantilla_id):
+    """ID de plantilla como texto (los arreglos en disco guardan bytes)"""
+    if isinstance(plantilla_id, bytes):
+        return plantilla_id.decode()
+    return str(plantilla_id)
+
+
+def leer_galerias(db):
+    """Construir las galerías activas desde plantillas_biometricas
+
+    Devuelve ({tipo: Galeria}, descartadas).
+    """
+    cursor = db.plantillas_biometricas.find(
+        {'activo': {'$ne': False}, 'template': {'$exists': True, '$ne': None}},
+        {'usuario_id': 1, 'tipo': 1, 'tipo_plantilla': 1, 'template': 1}
+    )
+
+    por_tipo = defaultdict(list)
+    descartadas = 0
+    for plantilla in cursor:
+        try:
+            # Sin usuario (o con uno que no es numérico) no hay a quién identificar
+            usuario_id = int(plantilla['usuario_id'])
+            vector = decodificar_template(plantilla['template'])
+        except (KeyError, TypeError, ValueError):
+            descartadas += 1
+            continue
+        por_tipo[tipo_de(plantilla)].append((usuario_id, str(plantilla['_id']), vector))
+
+    galerias = {}
+    for tipo, filas in por_tipo.items():
+        # Solo se compara contra la dimensión predominante del tipo
+        dimension = Counter(vector.size for _, _, vector in filas).most_common(1)[0][0]
+        validas = [fila for fila in filas if fila[2].size == dimension]
+        descartadas += len(filas) - len(validas)
+        galerias[tipo] = Galeria(
+            tipo,
+            np.stack([vector for _, _, vector in validas]),
+            [usuario_id for usuario_id, _, _ in validas],
+            [plantilla_id for _, plantilla_id, _ in validas]
+        )
+
+    return galerias, descartadas
+
+
+def _slug(tipo):
+    """Nombre de archivo para un tipo de plantilla"""
+    texto = unicodedata.normalize('NFKD', str(tipo)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', texto.lower()).strip('_') or 'tipo'
+
+
+class AlmacenGaleria:
+    """Snapshot en disco de las galerías y log de deltas por generación"""
+
+    def __init__(self, directorio):
+        self.directorio = str(directorio)
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def ruta_deltas(self, generacion):
+        return self._ruta(f'deltas-{generacion}.log')
+
+    def ruta_manifiesto(self):
+        return self._ruta(MANIFIESTO)
+
+    def manifiesto(self):
+        """Leer el manifiesto actual; None si no hay galería construida"""
+        try:
+            with open(self.ruta_manifiesto(), encoding='utf-8') as f:
+                manifiesto = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifiesto if manifiesto.get('formato') == FORMATO else None
+
+    def construir(self, db):
+        """Exportar las plantillas activas a una nueva generación en disco"""
+        os.makedirs(self.directorio, exist_ok=True)
+        anterior = self.manifiesto()
+        generacion = (anterior['generacion'] + 1) if anterior else 1
+
+        # Lo anotado en el log antes de leer MongoDB ya queda en el snapshot
+        desde = self._tamano_deltas(anterior['generacion']) if anterior else 0
+        galerias, descartadas = leer_galerias(db)
+        tipos = {}
+        for tipo, galeria in galerias.items():
+            prefijo = f'galeria-{generacion}-{_slug(tipo)}'
+            np.save(self._ruta(f'{prefijo}-matriz.npy'), galeria.matriz)
+            np.save(self._ruta(f'{prefijo}-usuarios.npy'), galeria.usuario_ids)
+            np.save(self._ruta(f'{prefijo}-ids.npy'), galeria.plantilla_ids.astype('S24'))
+            tipos[tipo] = {'prefijo': prefijo, 'total': len(galeria), 'dimension': galeria.dimension}
+
+        # El log nuevo empieza solo con las altas/bajas anotadas durante la
+        # exportación (las altas que la lectura ya incluyó se omiten)
+        exportadas = set()
+        for galeria in galerias.values():
+            exportadas.update(galeria.plantilla_ids.tolist())
+        with open(self.ruta_deltas(generacion), 'wb') as nuevo:
+            if anterior:
+                desde = self._copiar_deltas(anterior['generacion'], desde, nuevo, exportadas)
+
+        manifiesto = {
+            'formato': FORMATO,
+            'generacion': generacion,
+            'creado': datetime.now().isoformat(),
+            'descartadas': descartadas,
+            'tipos': tipos
+        }
+        temporal = self._ruta(MANIFIESTO + '.tmp')
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta_manifiesto())
+
+        if anterior:
+            # Lo que otros procesos anotaron en el log viejo antes de ver el manifiesto
+            with open(self.ruta_deltas(generacion), 'ab') as nuevo:
+                self._copiar_deltas(anterior['generacion'], desde, nuevo, exportadas)
+            self._limpiar(anterior['generacion'])
+        return manifiesto
+
+    def construir_si_falta(self, db):
+        """Construir la primera generación si no hay manifiesto -> manifiesto o None
+
+        Varios workers pueden intentarlo a la vez al arrancar: un archivo de
+        bloqueo deja construir a uno solo (los demás ven el manifiesto al
+        sincronizar).
+        """
+        if self.manifiesto() is not None:
+            return None
+        os.makedirs(self.directorio, exist_ok=True)
+        bloqueo = self._ruta(MANIFIESTO + '.lock')
+        try:
+            if time.time() - os.stat(bloqueo).st_mtime > BLOQUEO_VENCIMIENTO:
+                os.remove(bloqueo)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(bloqueo, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return None
+        try:
+            return self.construir(db) if self.manifiesto() is None else None
+        finally:
+            os.remove(bloqueo)
+
+    def _tamano_deltas(self, generacion):
+        try:
+            return os.stat(self.ruta_deltas(generacion)).st_size
+        except OSError:
+            return 0
+
+    def _copiar_deltas(self, generacion, desde, destino, exportadas):
+        """Copiar a 'destino' los deltas completos del log desde un offset -> nuevo offset
+
+        Se omiten las altas de plantillas que ya están en 'exportadas':
+        Galeria.agregar no deduplica y quedarían dos veces.
+        """
+        try:
+            with open(self.ruta_deltas(generacion), 'rb') as f:
+                f.seek(desde)
+                datos = f.read()
+        except OSError:
+            return desde
+
+        completo = datos[:datos.rfind(b'\n') + 1]
+        for linea in completo.splitlines(keepends=True):
+            delta = json.loads(linea)
+            if delta['op'] == 'alta' and delta['plantilla_id'] in exportadas:
+                continue
+            destino.write(linea)
+        return desde + len(completo)
+
+    def _limpiar(self, generacion):
+        """Borrar archivos de una generación anterior (si ningún proceso los tiene abiertos)"""
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith(f'galeria-{generacion}-') or nombre == f'deltas-{generacion}.log':
+                try:
+                    os.remove(self._ruta(nombre))
+                except OSError:
+                    pass
+
+    def abrir(self, manifiesto):
+        """Mapear en memoria (solo lectura) las galerías de un manifiesto"""
+        galerias = {}
+        for tipo, info in manifiesto['tipos'].items():
+            prefijo = info['prefijo']
+            galerias[tipo] = Galeria(
+                tipo,
+                np.load(self._ruta(f'{prefijo}-matriz.npy'), mmap_mode='r'),
+                np.load(self._ruta(f'{prefijo}-usuarios.npy'), mmap_mode='r'),
+                np.load(self._ruta(f'{prefijo}-ids.npy'), mmap_mode='r')
+            )
+        return galerias
+
+    def _anotar(self, generacion, delta):
+        """Agregar un delta al log (una sola escritura en modo append)"""
+        linea = (json.dumps(delta) + '\n').encode()
+        with open(self.ruta_deltas(generacion), 'ab') as f:
+            f.write(linea)
+
+    def registrar_alta(self, generacion, tipo, usuario_id, plantilla_id, vector):
+        self._anotar(generacion, {
+            'op': 'alta',
+            'tipo': tipo,
+            'usuario_id': int(usuario_id),
+            'plantilla_id': str(plantilla_id),
+            'vector': base64.b64encode(np.asarray(vector, dtype='<f4').tobytes()).decode()
+        })
+
+    def registrar_baja(self, generacion, plantilla_id):
+        self._anotar(generacion, {'op': 'baja', 'plantilla_id': str(plantilla_id)})
+
+    def leer_deltas(self, generacion, desde=0):
+        """Leer los deltas completos a partir de un offset -> (deltas, nuevo_offset)"""
+        try:
+            with open(self.ruta_deltas(generacion), 'rb') as f:
+                f.seek(desde)
+                datos = f.read()
+        except OSError:
+            return [], desde
+
+        # Ignorar una última línea a medio escribir
+        completo = datos[:datos.rfind(b'\n') + 1]
+        deltas = []
+        for linea in completo.splitlines():
+            delta = json.loads(linea)
+            if delta['op'] == 'alta':
+                delta['vector'] = np.frombuffer(base64.b64decode(delta['vector']), dtype='<f4').astype(np.float32)
+            deltas.append(delta)
+        return deltas, desde + len(completo)
+
+
+def aplicar_deltas(galerias, deltas):
+    """Aplicar altas y bajas a un diccionario de galerías (devuelve uno nuevo)"""
+    galerias = dict(galerias)
+    for delta in deltas:
+        if delta['op'] == 'alta':
+            tipo, vector = delta['tipo'], delta['vector']
+            galeria = galerias.get(tipo)
+            if galeria is None:
+                galerias[tipo] = Galeria(tipo, vector[np.newaxis, :], [delta['usuario_id']], [delta['plantilla_id']])
+            elif galeria.dimension == vector.size:
+                galerias[tipo] = galeria.agregar(delta['usuario_id'], delta['plantilla_id'], vector)
+        elif delta['op'] == 'baja':
+            for tipo, galeria in galerias.items():
+                galerias[tipo] = galeria.eliminar([delta['plantilla_id']])
+    return galerias
@@ -0,0 +1,179 @@
+"""
+Despachador de micro-lotes: agrupa las solicitudes concurrentes de
+identificación/verificación y las puntúa juntas con un solo producto de matrices
+"""
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+import numpy as np
+from .motor import motor
+from .plantillas import decodificar_template
+
+
+class _Solicitud:
+    """Solicitud pendiente de puntuar"""
+    __slots__ = ('tipo', 'vector', 'usuario_id', 'top_k', 'umbral', 'nprobe', 'future')
+
+    def __init__(self, tipo, vector, usuario_id=None, top_k=5, umbral=0.8, nprobe=None):
+        self.tipo = tipo
+        self.vector = vector
+        self.usuario_id = usuario_id
+        self.top_k = top_k
+        self.umbral = umbral
+        self.nprobe = nprobe
+        self.future = Future()
+
+    def tarea(self):
+        """Datos de la solicitud para enviarla a otro proceso"""
+        return (self.tipo, self.vector, self.usuario_id, self.top_k, self.umbral, self.nprobe)
+
+
+class DespachadorLotes:
+    """Junta solicitudes durante unos milisegundos (o hasta llenar el lote) y las puntúa en bloque"""
+
+    def __init__(self, motor, tamano_lote=32, espera_ms=2.0, pool=None):
+        self.motor = motor
+        self.tamano_lote = tamano_lote
+        self.espera_ms = espera_ms
+        # Pool de procesos opcional (PoolPuntuacion); sin él se puntúa en este proceso
+        self.pool = pool
+        self._cola = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Métricas
+        self.lotes = 0
+        self.solicitudes = 0
+
+    def configurar(self, tamano_lote=None, espera_ms=None, pool=None):
+        """Ajustar tamaño máximo de lote, espera de agrupación y pool de procesos"""
+        if tamano_lote is not None:
+            self.tamano_lote = max(1, int(tamano_lote))
+        if espera_ms is not None:
+            self.espera_ms = max(0.0, float(espera_ms))
+        if pool is not None:
+            self.pool = pool
+
+    @property
+    def tamano_medio(self):
+        return self.solicitudes / self.lotes if self.lotes else 0.0
+
+    @property
+    def en_cola(self):
+        """Solicitudes esperando a formar lote"""
+        return self._cola.qsize()
+
+    def identificar(self, template, tipo, top_k=5, umbral=0.8, timeout=5.0, nprobe=None):
+        """Identificación 1:N a través del lote"""
+        solicitud = _Solicitud(tipo, decodificar_template(template), top_k=top_k, umbral=umbral, nprobe=nprobe)
+        return self._enviar(solicitud, timeout)
+
+    def verificar(self, usuario_id, tipo, template, umbral=0.8, timeout=5.0):
+        """Verificación 1:1 a través del lote; None si el usuario no tiene plantillas del tipo"""
+        return self.encolar_verificacion(usuario_id, tipo, template, umbral).result(timeout=timeout)
+
+    def encolar_verificacion(self, usuario_id, tipo, template, umbral=0.8):
+        """Como verificar, sin esperar: devuelve el Future (la API ASGI lo espera con asyncio.wrap_future)"""
+        solicitud = _Solicitud(tipo, decodificar_template(template), usuario_id=int(usuario_id), umbral=umbral)
+        return self._encolar(solicitud)
+
+    def _enviar(self, solicitud, timeout):
+        return self._encolar(solicitud).result(timeout=timeout)
+
+    def _encolar(self, solicitud):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='despachador-lotes', daemon=True)
+                    self._thread.start()
+        self._cola.put(solicitud)
+        return solicitud.future
+
+    def _run(self):
+        """Bucle del worker: armar un lote y procesarlo"""
+        while True:
+            lote = [self._cola.get()]
+            limite = time.perf_counter() + self.espera_ms / 1000
+            while len(lote) < self.tamano_lote:
+                restante = limite - time.perf_counter()
+                try:
+                    if restante > 0:
+                        lote.append(self._cola.get(timeout=restante))
+                    else:
+                        lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                if self.pool is not None:
+                    # No bloquea: el pool resuelve los futures al terminar
+                    self.pool.enviar(lote)
+                else:
+                    self.procesar(lote)
+            except Exception as e:
+                for solicitud in lote:
+                    if not solicitud.future.done():
+                        solicitud.future.set_exception(e)
+            self.lotes += 1
+            self.solicitudes += len(lote)
+
+    def procesar(self, lote):
+        """Puntuar un lote: un producto de matrices por tipo de plantilla"""
+        por_tipo = defaultdict(list)
+        for solicitud in lote:
+            por_tipo[solicitud.tipo].append(solicitud)
+
+        for tipo, solicitudes in por_tipo.items():
+            galeria = self.motor.galeria(tipo)
+
+            validas = []
+            for solicitud in solicitudes:
+                if solicitud.usuario_id is not None:
+                    # Verificación 1:1: solo las filas del usuario, como motor.verificar
+                    self._verificar(galeria, solicitud)
+                elif galeria is None or len(galeria) == 0:
+                    solicitud.future.set_result(self.motor.armar_resultado([], solicitud.umbral))
+                elif solicitud.vector.size != galeria.dimension:
+                    solicitud.future.set_exception(self._error_dimension(solicitud, galeria))
+                else:
+                    validas.append(solicitud)
+
+            if not validas:
+                continue
+
+            # Con índice aproximado las identificaciones no recorren toda la galería
+            indice = self.motor.indice(tipo, galeria)
+            if indice is not None:
+                for solicitud in validas:
+                    solicitud.future.set_result(self.motor.armar_resultado(
+                        self.motor.buscar_aproximado(indice, galeria, solicitud.vector,
+                                                     solicitud.top_k, solicitud.nprobe),
+                        solicitud.umbral))
+                continue
+
+            scores = galeria.puntuar(np.stack([solicitud.vector for solicitud in validas]))
+            for fila, solicitud in zip(scores, validas):
+                solicitud.future.set_result(self.motor.armar_resultado(
+                    galeria.candidatos(fila, solicitud.top_k), solicitud.umbral))
+
+    def _verificar(self, galeria, solicitud):
+        """Puntuar una verificación contra las plantillas del usuario; None si no tiene"""
+        vectores = (galeria.vectores(galeria.usuario_ids == solicitud.usuario_id)
+                    if galeria is not None else None)
+        if vectores is None or vectores.shape[0] == 0:
+            solicitud.future.set_result(None)
+        elif solicitud.vector.size != galeria.dimension:
+            solicitud.future.set_exception(self._error_dimension(solicitud, galeria))
+        else:
+            solicitud.future.set_result(self.motor.armar_verificacion(
+                float((vectores @ solicitud.vector).max()), solicitud.umbral))
+
+    @staticmethod
+    def _error_dimension(solicitud, galeria):
+        return ValueError(f"El template tiene {solicitud.vector.size} características, "
+                          f"la galería de {galeria.tipo} usa {galeria.dimension}")
+
+
+# Instancia global
+despachador = DespachadorLotes(motor)
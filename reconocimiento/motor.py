@@ -0,0 +1,279 @@
+"""
+Motor de identificación biométrica 1:N vectorizado con NumPy
+"""
+import os
+import threading
+import numpy as np
+from models import db_manager
+from utils.metricas import cache_acierto, cache_fallo
+from .ann import IndiceIVFPQ
+from .galeria import AlmacenGaleria, aplicar_deltas, leer_galerias
+from .plantillas import decodificar_template
+
+
+class MotorIdentificacion:
+    """Carga las galerías activas por tipo y compara templates capturados contra ellas
+
+    Si hay un almacén configurado y una galería construida en disco, las
+    matrices se mapean en memoria y se aplican los deltas del log; si no,
+    se leen desde MongoDB.
+    """
+
+    def __init__(self, almacen=None):
+        self.almacen = almacen
+        self._galerias = None
+        self._generacion = None
+        self._offset = 0
+        self._mtime_manifiesto = None
+        self._lock = threading.Lock()
+        self._carga_lock = threading.Lock()
+        self.descartadas = 0
+        # Índices aproximados por tipo: {tipo: (matriz base, IndiceIVFPQ)}
+        self.ann_tipos = set()
+        self.ann_minimo = 5000
+        self.ann_nprobe = 8
+        self.ann_reordenar = 100
+        self._ann_opciones = {}
+        self._indices = {}
+        self._entrenando = set()
+        self._indice_lock = threading.Lock()
+
+    def configurar(self, directorio):
+        """Usar la galería en disco del directorio indicado"""
+        self.almacen = AlmacenGaleria(directorio) if directorio else None
+        self.invalidar()
+
+    def configurar_ann(self, tipos=(), minimo=5000, nlist=0, subvectores=16, nprobe=8, reordenar=100):
+        """Activar el índice aproximado para los tipos indicados"""
+        self.ann_tipos = set(tipos or ())
+        self.ann_minimo = max(1, int(minimo))
+        self.ann_nprobe = max(1, int(nprobe))
+        self.ann_reordenar = max(1, int(reordenar))
+        self._ann_opciones = {'nlist': int(nlist) or None, 'subvectores': int(subvectores)}
+        with self._indice_lock:
+            self._indices = {}
+
+    def indice(self, tipo, galeria=None, esperar=False):
+        """Índice aproximado del tipo al día con las altas, o None si se usa búsqueda exacta
+
+        El entrenamiento corre en segundo plano; mientras tanto se responde
+        con búsqueda exacta (salvo esperar=True).
+        """
+        if tipo not in self.ann_tipos:
+            return None
+        if galeria is None:
+            galeria = self.galeria(tipo)
+        if galeria is None or len(galeria) < self.ann_minimo:
+            return None
+
+        actual = self._indices.get(tipo)
+        if actual is None or actual[0] is not galeria.matriz:
+            # Galería nueva (o regenerada): entrenar sobre todas sus filas
+            if esperar:
+                self._entrenar(tipo, galeria)
+            else:
+                cache_fallo('ann')
+                self._entrenar_en_fondo(tipo, galeria)
+                return None
+            actual = self._indices[tipo]
+        else:
+            cache_acierto('ann')
+
+        indice = actual[1]
+        if indice.total < len(galeria):
+            with self._indice_lock:
+                if indice.total < len(galeria):
+                    # Altas posteriores: se codifican con los centroides existentes
+                    indice.agregar(galeria.filas(np.arange(indice.total, len(galeria))))
+        return indice
+
+    def _entrenar(self, tipo, galeria):
+        indice = IndiceIVFPQ(**self._ann_opciones).entrenar(galeria.filas(np.arange(len(galeria))))
+        with self._indice_lock:
+            self._indices[tipo] = (galeria.matriz, indice)
+
+    def _entrenar_en_fondo(self, tipo, galeria):
+        with self._indice_lock:
+            if tipo in self._entrenando:
+                return
+            self._entrenando.add(tipo)
+
+        def entrenar():
+            try:
+                self._entrenar(tipo, galeria)
+            finally:
+                with self._indice_lock:
+                    self._entrenando.discard(tipo)
+
+        threading.Thread(target=entrenar, name=f'ann-{tipo}', daemon=True).start()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.almacen.ruta_manifiesto()).st_mtime_ns
+        except OSError:
+            return None
+
+    def cargar(self, db=None):
+        """Construir las galerías desde disco (si existen) o desde plantillas_biometricas"""
+        manifiesto = self.almacen.manifiesto() if self.almacen else None
+
+        if manifiesto:
+            mtime = self._mtime()
+            galerias = self.almacen.abrir(manifiesto)
+            deltas, offset = self.almacen.leer_deltas(manifiesto['generacion'])
+            galerias = aplicar_deltas(galerias, deltas)
+            generacion = manifiesto['generacion']
+            descartadas = manifiesto.get('descartadas', 0)
+        else:
+            mtime = None
+            galerias, descartadas = leer_galerias(db if db is not None else db_manager.db)
+            generacion, offset = None, 0
+
+        with self._lock:
+            self._galerias = galerias
+            self._generacion = generacion
+            self._offset = offset
+            self._mtime_manifiesto = mtime
+            self.descartadas = descartadas
+        return galerias
+
+    def _sincronizar(self):
+        """Aplicar los deltas nuevos del log o remapear si cambió la generación"""
+        if self.almacen is None or self._galerias is None:
+            return
+
+        if self._mtime() != self._mtime_manifiesto:
+            with self._carga_lock:
+                if self._mtime() != self._mtime_manifiesto:
+                    self.cargar()
+            return
+
+        if self._generacion is None:
+            return
+
+        try:
+            tamano = os.stat(self.almacen.ruta_deltas(self._generacion)).st_size
+        except OSError:
+            return
+        if tamano <= self._offset:
+            return
+
+        with self._lock:
+            deltas, offset = self.almacen.leer_deltas(self._generacion, self._offset)
+            if deltas:
+                self._galerias = aplicar_deltas(self._galerias, deltas)
+            self._offset = offset
+
+    def galerias(self):
+        """Obtener todas las galerías, cargándolas la primera vez"""
+        if self._galerias is None:
+            cache_fallo('galeria')
+            with self._carga_lock:
+                if self._galerias is None:
+                    self.cargar()
+        else:
+            cache_acierto('galeria')
+            self._sincronizar()
+        return self._galerias or {}
+
+    def galeria(self, tipo):
+        """Obtener la galería de un tipo"""
+        return self.galerias().get(tipo)
+
+    def reconstruir(self, db=None):
+        """Regenerar las galerías tras cambios masivos (nueva generación en disco si hay almacén)"""
+        db = db if db is not None else db_manager.db
+        if self.almacen is not None and self.almacen.manifiesto():
+            # Los demás procesos ven el manifiesto nuevo y remapean
+            self.almacen.construir(db)
+        return self.cargar(db)
+
+    def invalidar(self):
+        """Forzar recarga de las galerías en el próximo uso"""
+        with self._lock:
+            self._galerias = None
+
+    def _preparar_log(self):
+        """Mapear la galería en disco antes de anotar un delta (es inmediato)"""
+        if self._galerias is None and self.almacen and self.almacen.manifiesto():
+            self.galerias()
+
+    def agregar(self, tipo, usuario_id, plantilla_id, template):
+        """Añadir una plantilla recién registrada sin recargar toda la galería"""
+        vector = decodificar_template(template)
+        self._preparar_log()
+        if self._generacion is not None:
+            # Queda en el log para el resto de los procesos
+            self.almacen.registrar_alta(self._generacion, tipo, usuario_id, plantilla_id, vector)
+            self._sincronizar()
+        elif self._galerias is not None:
+            with self._lock:
+                self._galerias = aplicar_deltas(self._galerias, [{
+                    'op': 'alta', 'tipo': tipo, 'usuario_id': int(usuario_id),
+                    'plantilla_id': str(plantilla_id), 'vector': vector
+                }])
+
+    def eliminar(self, plantilla_id):
+        """Quitar una plantilla desactivada de la galería (tombstone)"""
+        self._preparar_log()
+        if self._generacion is not None:
+            self.almacen.registrar_baja(self._generacion, plantilla_id)
+            self._sincronizar()
+        elif self._galerias is not None:
+            with self._lock:
+                self._galerias = aplicar_deltas(self._galerias, [{'op': 'baja', 'plantilla_id': str(plantilla_id)}])
+
+    def identificar(self, template, tipo, top_k=5, umbral=0.8, nprobe=None):
+        """Identificación 1:N: mejores candidatos de toda la galería del tipo"""
+        vector = decodificar_template(template)
+        galeria = self.galeria(tipo)
+        if galeria is None or len(galeria) == 0:
+            return self.armar_resultado([], umbral)
+
+        indice = self.indice(tipo, galeria)
+        if indice is not None and vector.size == galeria.dimension:
+            return self.armar_resultado(self.buscar_aproximado(indice, galeria, vector, top_k, nprobe), umbral)
+
+        scores = galeria.puntuar(vector[np.newaxis, :])[0]
+        return self.armar_resultado(galeria.candidatos(scores, top_k), umbral)
+
+    def verificar(self, usuario_id, tipo, template, umbral=0.8):
+        """Verificación 1:1 contra las plantillas del usuario; None si no tiene plantillas del tipo"""
+        vector = decodificar_template(template)
+        galeria = self.galeria(tipo)
+        if galeria is None:
+            return None
+
+        vectores = galeria.vectores(galeria.usuario_ids == int(usuario_id))
+        if vectores.shape[0] == 0:
+            return None
+
+        if vector.size != galeria.dimension:
+            raise ValueError(f"El template tiene {vector.size} características, "
+                             f"la galería de {tipo} usa {galeria.dimension}")
+        return self.armar_verificacion(float((vectores @ vector).max()), umbral)
+
+    def buscar_aproximado(self, indice, galeria, vector, top_k=5, nprobe=None):
+        """Candidatos del índice aproximado con re-ranking exacto"""
+        return indice.buscar(vector, galeria, top_k, nprobe or self.ann_nprobe, self.ann_reordenar)
+
+    @staticmethod
+    def armar_verificacion(score, umbral):
+        """Armar la respuesta de verificación a partir del mejor score del usuario"""
+        return {'verificado': score >= umbral, 'confianza': round(score, 4)}
+
+    @staticmethod
+    def armar_resultado(candidatos, umbral):
+        """Armar la respuesta de identificación a partir de los candidatos ordenados"""
+        mejor = candidatos[0] if candidatos else None
+        identificado = mejor is not None and mejor['score'] >= umbral
+        return {
+            'identificado': identificado,
+            'usuario_id': mejor['usuario_id'] if identificado else None,
+            'score': mejor['score'] if mejor else None,
+            'candidatos': candidatos
+        }
+
+
+# Instancia global
+motor = MotorIdentificacion()
@@ -0,0 +1,44 @@
+"""
+Decodificación de templates biométricos a vectores de características
+"""
+import base64
+import binascii
+import numpy as np
+from .codec import decodificar_binario, es_binario
+
+
+def decodificar_template(valor):
+    """Convertir un template (binario, lista de números, base64 o bytes) en un vector float32 centrado y normalizado"""
+    if es_binario(valor):
+        valor = decodificar_binario(valor)
+
+    if isinstance(valor, str):
+        try:
+            valor = base64.b64decode(valor, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("Template base64 inválido")
+
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        vector = np.frombuffer(valor, dtype=np.uint8).astype(np.float32)
+    elif isinstance(valor, (list, tuple, np.ndarray)):
+        try:
+            vector = np.asarray(valor, dtype=np.float32).ravel()
+        except (TypeError, ValueError):
+            raise ValueError("Template numérico inválido")
+    else:
+        raise ValueError("Formato de template no soportado")
+
+    # Centrar para que el coseno sea una correlación: sin centrar, dos
+    # templates de bytes sin relación ya puntúan ~0.75
+    if vector.size:
+        vector = vector - vector.mean()
+    norma = float(np.linalg.norm(vector))
+    if vector.size == 0 or norma == 0 or not np.isfinite(norma):
+        raise ValueError("Template vacío")
+
+    return vector / norma
+
+
+def tipo_de(plantilla):
+    """Tipo de una plantilla (los datos precargados usan 'tipo', la API 'tipo_plantilla')"""
+    return plantilla.get('tipo_plantilla') or plantilla.get('tipo')
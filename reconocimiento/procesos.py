@@ -0,0 +1,197 @@
+"""
+Pool de procesos para puntuar lotes biométricos fuera de los threads de Flask
+
+Cada worker mapea la misma galería en disco (solo lectura, compartida a
+través de la caché de páginas del sistema operativo) y sigue el log de deltas,
+así que las altas y bajas hechas por el proceso web le llegan sin recargar.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from models import db_manager
+from .galeria import AlmacenGaleria
+from .lotes import DespachadorLotes, _Solicitud
+from .motor import MotorIdentificacion
+
+
+class PoolSaturado(RuntimeError):
+    """Demasiados lotes pendientes en el pool de puntuación"""
+
+
+# Estado de cada proceso worker
+_despachador = None
+
+
+def _inicializar(directorio, ann, mongo):
+    """Preparar el motor del worker con la galería en disco"""
+    global _despachador
+    # Ctrl+C lo maneja el proceso principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    motor = MotorIdentificacion()
+    motor.configurar(directorio)
+    if ann:
+        motor.configurar_ann(**ann)
+    if mongo and (motor.almacen is None or motor.almacen.manifiesto() is None):
+        # Sin galería en disco el worker la lee desde MongoDB
+        db_manager.connect(*mongo)
+    _despachador = DespachadorLotes(motor)
+
+
+def _puntuar(tareas, limite):
+    """Puntuar un lote en el worker -> [(error, resultado), ...]"""
+    if time.time() > limite:
+        # Esperó en la cola más que el timeout: el cliente ya no espera la respuesta
+        raise TimeoutError("La tarea superó el tiempo de espera antes de ejecutarse")
+
+    lote = [_Solicitud(tipo, vector, usuario_id, top_k, umbral, nprobe)
+            for tipo, vector, usuario_id, top_k, umbral, nprobe in tareas]
+    _despachador.procesar(lote)
+
+    resultados = []
+    for solicitud in lote:
+        error = solicitud.future.exception()
+        resultados.append((error, None if error else solicitud.future.result()))
+    return resultados
+
+
+class PoolPuntuacion:
+    """Ejecuta los lotes del despachador en un ProcessPoolExecutor"""
+
+    def __init__(self, procesos=2, directorio=None, ann=None, mongo=None, cola_max=64, timeout=5.0):
+        self.procesos = max(1, int(procesos))
+        self.directorio = directorio
+        self.ann = ann
+        self.mongo = mongo
+        self.cola_max = max(1, int(cola_max))
+        self.timeout = float(timeout)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Métricas
+        self.pendientes = 0
+        self.max_pendientes = 0
+        self.enviados = 0
+        self.completados = 0
+        self.expirados = 0
+        self.rechazados = 0
+        self.errores = 0
+        self._segundos = 0.0
+
+    def iniciar(self, db=None, crear=True):
+        """Construir la galería en disco si falta y crear el executor
+
+        Con crear=False (proceso maestro de un servidor con preload) el
+        executor se crea en cada worker con el primer lote.
+        """
+        if db is not None and self.falta_galeria():
+            AlmacenGaleria(self.directorio).construir_si_falta(db)
+        if crear:
+            self._ejecutor()
+        return self
+
+    def falta_galeria(self):
+        """La galería en disco todavía no se construyó"""
+        return bool(self.directorio) and AlmacenGaleria(self.directorio).manifiesto() is None
+
+    def _ejecutor(self):
+        # Un executor heredado por fork (servidor con preload) comparte las colas
+        # con el padre y los demás workers: cada proceso web crea el suyo
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    # spawn: no heredar threads ni sockets de MongoDB del proceso web
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.procesos,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_inicializar,
+                        initargs=(self.directorio, self.ann, self.mongo)
+                    )
+        return self._executor
+
+    def _reiniciar(self):
+        """Descartar un executor roto (un worker murió); el próximo lote crea otro"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def enviar(self, lote):
+        """Enviar un lote sin bloquear; los futures de las solicitudes se resuelven al terminar"""
+        with self._lock:
+            if self.pendientes >= self.cola_max:
+                self.rechazados += 1
+                raise PoolSaturado(f"Pool de puntuación saturado ({self.pendientes} lotes pendientes)")
+            self.pendientes += 1
+            self.enviados += 1
+            self.max_pendientes = max(self.max_pendientes, self.pendientes)
+
+        inicio = time.perf_counter()
+        try:
+            future = self._ejecutor().submit(_puntuar, [solicitud.tarea() for solicitud in lote],
+                                             time.time() + self.timeout)
+        except BrokenProcessPool:
+            self._reiniciar()
+            with self._lock:
+                self.pendientes -= 1
+                self.errores += 1
+            raise
+        future.add_done_callback(lambda f: self._completar(f, lote, inicio))
+
+    def _completar(self, future, lote, inicio):
+        error = None
+        try:
+            resultados = future.result()
+        except TimeoutError as e:
+            error, contador = e, 'expirados'
+        except BrokenProcessPool as e:
+            error, contador = e, 'errores'
+            self._reiniciar()
+        except Exception as e:
+            error, contador = e, 'errores'
+        else:
+            contador = 'completados'
+
+        with self._lock:
+            self.pendientes -= 1
+            setattr(self, contador, getattr(self, contador) + 1)
+            self._segundos += time.perf_counter() - inicio
+
+        for i, solicitud in enumerate(lote):
+            if solicitud.future.done():
+                continue
+            if error is not None:
+                solicitud.future.set_exception(error)
+            elif resultados[i][0] is not None:
+                solicitud.future.set_exception(resultados[i][0])
+            else:
+                solicitud.future.set_result(resultados[i][1])
+
+    def metricas(self):
+        """Profundidad de cola y contadores del pool"""
+        with self._lock:
+            terminados = self.completados + self.expirados + self.errores
+            return {
+                'procesos': self.procesos,
+                'pendientes': self.pendientes,
+                'max_pendientes': self.max_pendientes,
+                'cola_max': self.cola_max,
+                'enviados': self.enviados,
+                'completados': self.completados,
+                'expirados': self.expirados,
+                'rechazados': self.rechazados,
+                'errores': self.errores,
+                'latencia_media_ms': round(self._segundos * 1000 / terminados, 2) if terminados else 0.0
+            }
+
+    def cerrar(self):
+        """Detener los workers (solo los de este proceso)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -1,16 +1,26 @@
 """
 Paquete de rutas
+
+Los blueprints se importan al pedirlos (from routes import usuarios_bp, o
+app.BLUEPRINTS): un punto de entrada solo carga las secciones que usa.
 """
-from .usuarios import usuarios_bp
-from .membresias import membresias_bp
-from .asistencias import asistencias_bp
-from .biometria import biometria_bp
-from .fotos import fotos_bp
+from importlib import import_module
+
+_MODULOS = {
+    'usuarios_bp': '.usuarios',
+    'membresias_bp': '.membresias',
+    'asistencias_bp': '.asistencias',
+    'biometria_bp': '.biometria',
+    'fotos_bp': '.fotos',
+    'debug_bp': '.debug',
+    'metricas_bp': '.metricas',
+    'salud_bp': '.salud'
+}
+
+__all__ = list(_MODULOS)
+
 
-__all__ = [
-    'usuarios_bp',
-    'membresias_bp',
-    'asistencias_bp',
-    'biometria_bp',
-    'fotos_bp'
-]
+def __getattr__(nombre):
+    if nombre not in _MODULOS:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    return getattr(import_module(_MODULOS[nombre], __name__), nombre)
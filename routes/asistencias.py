@@ -17,10 +17,10 @@ def index():
     
     if fecha_str:
         fecha = datetime.strptime(fecha_str, '%Y-%m-%d')
-        asistencias = asistencia_model.get_por_fecha(fecha)
+        asistencias = asistencia_model.get_por_fecha(fecha, vista='lista')
         titulo = f"Asistencias del {format_date(fecha)}"
     else:
-        asistencias = asistencia_model.get_hoy()
+        asistencias = asistencia_model.get_hoy(vista='lista')
         titulo = "Asistencias de Hoy"
     
     return render_template('asistencias/index.html',
@@ -79,7 +79,7 @@ def estadisticas():
     asistencias_semana = []
     for i in range(6, -1, -1):
         fecha = datetime.now() - timedelta(days=i)
-        count = len(asistencia_model.get_por_fecha(fecha))
+        count = asistencia_model.contar_por_fecha(fecha)
         asistencias_semana.append({
             'fecha': format_date(fecha),
             'count': count
@@ -103,7 +103,7 @@ def historial(usuario_id):
         flash('Usuario no encontrado', 'error')
         return redirect(url_for('asistencias.index'))
     
-    asistencias = asistencia_model.find_by_usuario(usuario_id, limit=50)
+    asistencias = asistencia_model.find_by_usuario(usuario_id, limit=50, vista='lista')
     
     return render_template('asistencias/historial.html',
                          usuario=usuario,
@@ -147,21 +147,12 @@ def api_registrar():
 @asistencias_bp.route('/api/verificar/<int:usuario_id>')
 def api_verificar(usuario_id):
     """API: Verificar si el usuario ya registró asistencia hoy"""
-    asistencia_model = Asistencia(db_manager.db)
-    
-    hoy_inicio = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    hoy_fin = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
-    
-    asistencia = db_manager.db.asistencias.find_one({
-        'usuario_id': usuario_id,
-        'fecha_hora': {'$gte': hoy_inicio, '$lte': hoy_fin},
-        'activo': True
-    })
+    asistencia = Asistencia(db_manager.db).registro_de_hoy(usuario_id)
     
     if asistencia:
         return jsonify({
             'registrado': True,
-            'hora': asistencia['fecha_hora'].strftime('%H:%M:%S')
+            'hora': asistencia['fecha'].strftime('%H:%M:%S')
         })
     else:
         return jsonify({'registrado': False})
@@ -172,12 +163,6 @@ def api_hoy():
     asistencia_model = Asistencia(db_manager.db)
     asistencias = asistencia_model.get_hoy()
     
-    # Convertir datetime a string
-    for a in asistencias:
-        a['_id'] = str(a['_id'])
-        if a.get('fecha_hora'):
-            a['fecha_hora'] = a['fecha_hora'].isoformat()
-    
     return jsonify({
         'total': len(asistencias),
         'asistencias': asistencias
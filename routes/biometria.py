@@ -1,8 +1,12 @@
 """
 Rutas para gestión de biometría
 """
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app
 from models import PlantillaBiometrica, Usuario, db_manager
+from reconocimiento import motor, despachador, codificar_template, template_json, PoolSaturado
+from reconocimiento.codec import FORMATO_VERSION
+from utils.importacion_biometrica import EXTENSIONES_JSONL, importaciones
+from concurrent.futures import TimeoutError
 from datetime import datetime
 
 biometria_bp = Blueprint('biometria', __name__, url_prefix='/biometria')
@@ -11,18 +15,20 @@ biometria_bp = Blueprint('biometria', __name__, url_prefix='/biometria')
 def index():
     """Lista de plantillas biométricas"""
     tipo = request.args.get('tipo', '')
+    page = request.args.get('page', 1, type=int)
     
     plantilla_model = PlantillaBiometrica(db_manager.db)
     
     if tipo:
-        plantillas = plantilla_model.find_by_tipo(tipo)
+        plantillas_data = plantilla_model.find_by_tipo(tipo, page=page, vista='lista')
         titulo = f"Plantillas de {tipo}"
     else:
-        plantillas = plantilla_model.get_con_template()
+        plantillas_data = plantilla_model.get_con_template(page=page, vista='lista')
         titulo = "Todas las Plantillas Biométricas"
     
     return render_template('biometria/index.html',
-                         plantillas=plantillas,
+                         plantillas=plantillas_data['plantillas'],
+                         pagination=plantillas_data,
                          titulo=titulo,
                          tipo=tipo)
 
@@ -37,7 +43,7 @@ def por_usuario(usuario_id):
         flash('Usuario no encontrado', 'error')
         return redirect(url_for('biometria.index'))
     
-    plantillas = plantilla_model.find_by_usuario(usuario_id)
+    plantillas = plantilla_model.find_by_usuario(usuario_id, vista='resumen')
     
     return render_template('biometria/usuario.html',
                          usuario=usuario,
@@ -51,17 +57,20 @@ def estadisticas():
     # Obtener estadísticas
     stats = plantilla_model.get_stats()
     
-    # Estadísticas por tipo
+    # Estadísticas por tipo (ya calculadas en get_stats)
+    por_tipo = {fila['_id']: fila for fila in stats['por_tipo']}
     stats_tipo = []
     for tipo in ['Huella Digital', 'Rostro', 'Iris', 'Voz']:
-        plantillas = plantilla_model.find_by_tipo(tipo)
-        con_template = [p for p in plantillas if p.get('template')]
-        
+        fila = por_tipo.get(tipo, {})
         stats_tipo.append({
             'tipo': tipo,
-            'total': len(plantillas),
-            'con_template': len(con_template),
-            'sin_template': len(plantillas) - len(con_template)
+            'total': fila.get('total', 0),
+            'con_template': fila.get('con_template', 0),
+            'sin_template': fila.get('sin_template', 0),
+            'calidad_alta': fila.get('calidad_alta', 0),
+            'calidad_media': fila.get('calidad_media', 0),
+            'calidad_baja': fila.get('calidad_baja', 0),
+            'por_dispositivo': fila.get('por_dispositivo', [])
         })
     
     return render_template('biometria/estadisticas.html',
@@ -74,14 +83,9 @@ def api_por_usuario(usuario_id):
     """API: Obtener plantillas de un usuario"""
     plantilla_model = PlantillaBiometrica(db_manager.db)
     plantillas = plantilla_model.find_by_usuario(usuario_id)
-    
-    # Convertir ObjectId y datetime a string
-    for p in plantillas:
-        p['_id'] = str(p['_id'])
-        if p.get('fecha_registro'):
-            p['fecha_registro'] = p['fecha_registro'].isoformat()
-        if p.get('created_at'):
-            p['created_at'] = p['created_at'].isoformat()
+    for plantilla in plantillas:
+        if 'template' in plantilla:
+            plantilla['template'] = template_json(plantilla['template'])
     
     return jsonify(plantillas)
 
@@ -101,30 +105,60 @@ def api_verificar():
                 'error': 'usuario_id y template requeridos'
             }), 400
         
-        plantilla_model = PlantillaBiometrica(db_manager.db)
-        plantillas = plantilla_model.find_by_usuario(int(usuario_id))
-        
-        # Filtrar por tipo
-        plantillas_tipo = [p for p in plantillas if p.get('tipo_plantilla') == tipo]
+        umbral = float(data.get('umbral', current_app.config['BIOMETRIA_UMBRAL']))
+        resultado = despachador.verificar(int(usuario_id), tipo, template_capturado, umbral=umbral,
+                                          timeout=current_app.config['BIOMETRIA_TIMEOUT'])
         
-        if not plantillas_tipo:
+        if resultado is None:
             return jsonify({
                 'success': False,
                 'error': 'No se encontraron plantillas para este usuario'
             }), 404
         
-        # En un sistema real, aquí se haría la comparación biométrica
-        # Por ahora solo verificamos que exista
-        verificado = True
-        confianza = 0.95  # Simulado
-        
         return jsonify({
             'success': True,
-            'verificado': verificado,
-            'confianza': confianza,
+            'verificado': resultado['verificado'],
+            'confianza': resultado['confianza'],
             'usuario_id': usuario_id
         })
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except TimeoutError:
+        return jsonify({'success': False, 'error': 'Tiempo de espera agotado'}), 503
+    except PoolSaturado as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@biometria_bp.route('/api/identificar', methods=['POST'])
+def api_identificar():
+    """API: Identificar a un usuario comparando contra toda la galería (1:N)"""
+    try:
+        data = request.get_json()
+        
+        tipo = data.get('tipo', 'Huella Digital')
+        template_capturado = data.get('template')
+        
+        if not template_capturado:
+            return jsonify({'success': False, 'error': 'template requerido'}), 400
+        
+        top_k = int(data.get('top_k', current_app.config['BIOMETRIA_TOP_K']))
+        umbral = float(data.get('umbral', current_app.config['BIOMETRIA_UMBRAL']))
+        # Listas exploradas del índice aproximado (más = más recall, más latencia)
+        nprobe = int(data['nprobe']) if data.get('nprobe') else None
+        
+        resultado = despachador.identificar(template_capturado, tipo, top_k=top_k, umbral=umbral,
+                                            timeout=current_app.config['BIOMETRIA_TIMEOUT'], nprobe=nprobe)
+        
+        return jsonify({'success': True, 'tipo': tipo, **resultado})
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except TimeoutError:
+        return jsonify({'success': False, 'error': 'Tiempo de espera agotado'}), 503
+    except PoolSaturado as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -151,11 +185,19 @@ def api_registrar():
                 'error': 'Usuario no encontrado'
             }), 404
         
-        # Insertar plantilla
+        # Insertar plantilla (template en formato binario compacto)
+        try:
+            template = codificar_template(data['template'], current_app.config['BIOMETRIA_COMPRESION'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         plantilla = {
             'usuario_id': int(data['usuario_id']),
+            'tipo': data['tipo_plantilla'],
             'tipo_plantilla': data['tipo_plantilla'],
-            'template': data['template'],
+            'template': template,
+            'template_formato': FORMATO_VERSION,
+            'tiene_template_real': True,
             'calidad': data.get('calidad', 0.0),
             'dispositivo': data.get('dispositivo', 'API'),
             'fecha_registro': datetime.now(),
@@ -165,15 +207,69 @@ def api_registrar():
         
         result = db_manager.db.plantillas_biometricas.insert_one(plantilla)
         
+        # Mantener la galería de identificación al día
+        try:
+            motor.agregar(plantilla['tipo_plantilla'], plantilla['usuario_id'], result.inserted_id, plantilla['template'])
+        except ValueError as e:
+            current_app.logger.warning(f"Plantilla {result.inserted_id} no añadida a la galería: {e}")
+        
         return jsonify({
             'success': True,
-            'plantilla_id': str(result.inserted_id),
+            'plantilla_id': result.inserted_id,
             'mensaje': 'Plantilla registrada exitosamente'
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@biometria_bp.route('/api/importar', methods=['POST'])
+def api_importar():
+    """API: Importar plantillas desde un volcado de terminal (JSONL o CSV con templates en base64)"""
+    archivo = request.files.get('archivo')
+    
+    if not archivo or not archivo.filename:
+        return jsonify({'success': False, 'error': 'archivo requerido'}), 400
+    
+    if not archivo.filename.lower().endswith(EXTENSIONES_JSONL + ('.csv',)):
+        return jsonify({'success': False, 'error': 'Formato no soportado (use JSONL o CSV)'}), 400
+    
+    try:
+        # La importación corre en segundo plano; el progreso se consulta con el id
+        trabajo_id = importaciones.encolar(archivo.stream, archivo.filename,
+                                           dispositivo=request.form.get('dispositivo', 'Importación'))
+        url = url_for('biometria.api_importacion', trabajo_id=trabajo_id)
+        
+        return jsonify({'success': True, 'trabajo_id': trabajo_id, 'estado': url}), 202, {'Location': url}
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@biometria_bp.route('/api/importar/<trabajo_id>')
+def api_importacion(trabajo_id):
+    """API: Progreso y reporte de una importación"""
+    trabajo = importaciones.estado(trabajo_id)
+    
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    
+    return jsonify(trabajo)
+
+@biometria_bp.route('/api/desactivar/<plantilla_id>', methods=['POST'])
+def api_desactivar(plantilla_id):
+    """API: Desactivar una plantilla biométrica"""
+    try:
+        plantilla_model = PlantillaBiometrica(db_manager.db)
+        
+        if not plantilla_model.desactivar(plantilla_id):
+            return jsonify({'success': False, 'error': 'Plantilla no encontrada o ya inactiva'}), 404
+        
+        motor.eliminar(plantilla_id)
+        
+        return jsonify({'success': True, 'mensaje': 'Plantilla desactivada'})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @biometria_bp.route('/api/stats')
 def api_stats():
     """API: Obtener estadísticas de biometría"""
@@ -181,3 +277,15 @@ def api_stats():
     stats = plantilla_model.get_stats()
     
     return jsonify(stats)
+
+@biometria_bp.route('/api/motor')
+def api_motor():
+    """API: Métricas del motor de identificación (lotes y pool de procesos)"""
+    pool = despachador.pool
+    return jsonify({
+        'lotes': despachador.lotes,
+        'solicitudes': despachador.solicitudes,
+        'tamano_medio_lote': round(despachador.tamano_medio, 2),
+        'en_cola': despachador.en_cola,
+        'pool': pool.metricas() if pool is not None else None
+    })
@@ -0,0 +1,72 @@
+"""
+Perfilado de solicitudes: comandos MongoDB por endpoint y página /debug/perf
+(solo se registra con PERF_PERFILADO activado)
+"""
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, current_app, g
+from models.perfilado import perfilador
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+# Endpoints que no se perfilan
+EXCLUIDOS = {'static', 'debug.perf', 'debug.api_perf', 'debug.reiniciar', 'salud.healthz', 'salud.readyz'}
+
+
+@debug_bp.before_app_request
+def iniciar_perfil():
+    """Empezar a contar los comandos MongoDB de la solicitud"""
+    if request.endpoint not in EXCLUIDOS:
+        g.perfil_token = perfilador.iniciar(request.endpoint, request.method, request.path)
+
+
+@debug_bp.after_app_request
+def guardar_status(response):
+    g.perfil_status = response.status_code
+    return response
+
+
+@debug_bp.teardown_app_request
+def terminar_perfil(error=None):
+    """Cerrar el perfil y avisar de solicitudes lentas o consultas repetidas"""
+    token = g.pop('perfil_token', None)
+    if token is None:
+        return
+
+    umbral = current_app.config['PERF_N_MAS_1']
+    perfil = perfilador.terminar(token, g.pop('perfil_status', 500 if error else None), umbral)
+    if perfil is None:
+        return
+
+    if perfil.total_ms >= current_app.config['PERF_LENTO_MS']:
+        current_app.logger.warning(
+            f"Solicitud lenta {perfil.metodo} {perfil.ruta} ({perfil.endpoint}): "
+            f"{perfil.total_ms:.0f} ms, {perfil.comandos} comandos MongoDB "
+            f"({perfil.mongo_ms:.0f} ms, {perfil.bytes} bytes)")
+    for forma, veces in perfil.repetidas(umbral):
+        current_app.logger.warning(f"Posible N+1 en {perfil.endpoint}: {veces} veces {forma}")
+
+
+@debug_bp.route('/perf')
+def perf():
+    """Resumen de comandos MongoDB por endpoint y últimas solicitudes"""
+    umbral = current_app.config['PERF_N_MAS_1']
+    return render_template('debug/perf.html',
+                           resumen=perfilador.resumen(),
+                           recientes=[p.como_dict(umbral) for p in list(perfilador.recientes)],
+                           lento_ms=current_app.config['PERF_LENTO_MS'])
+
+
+@debug_bp.route('/perf.json')
+def api_perf():
+    """API: Resumen del perfilado"""
+    umbral = current_app.config['PERF_N_MAS_1']
+    return jsonify({
+        'endpoints': perfilador.resumen(),
+        'recientes': [p.como_dict(umbral) for p in list(perfilador.recientes)]
+    })
+
+
+@debug_bp.route('/perf/reiniciar', methods=['POST'])
+def reiniciar():
+    """Borrar lo acumulado"""
+    perfilador.reiniciar()
+    return redirect(url_for('debug.perf'))
@@ -17,7 +17,7 @@ def index():
     fecha_actual = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     
     # Obtener todos los usuarios activos
-    usuarios = list(db_manager.db.usuarios.find({'activo': True}).sort('nombre', 1))
+    usuarios = Usuario(db_manager.db).find_activos(vista='resumen')
     
     # Procesar cada usuario para determinar su estado de membresía
     usuarios_procesados = []
@@ -0,0 +1,109 @@
+"""
+Métricas de solicitudes HTTP y endpoint /metrics para Prometheus
+(solo se registra con METRICAS activado)
+"""
+import time
+from flask import Blueprint, Response, request, g
+from models import db_manager
+from reconocimiento import motor, despachador
+from utils.metricas import metricas, BUCKETS_BYTES
+
+metricas_bp = Blueprint('metricas', __name__)
+
+SOLICITUDES = metricas.contador(
+    'gym_http_solicitudes_total', 'Solicitudes HTTP por blueprint, endpoint, método y status',
+    ('blueprint', 'endpoint', 'metodo', 'status'))
+DURACION = metricas.histograma(
+    'gym_http_duracion_segundos', 'Duración de las solicitudes HTTP', ('blueprint', 'endpoint'))
+TAMANO = metricas.histograma(
+    'gym_http_respuesta_bytes', 'Tamaño del cuerpo de las respuestas', ('blueprint', 'endpoint'),
+    buckets=BUCKETS_BYTES)
+EN_CURSO = metricas.medidor(
+    'gym_http_solicitudes_en_curso', 'Solicitudes HTTP en curso por blueprint', ('blueprint',))
+
+
+def _etiquetas():
+    # Las rutas inexistentes no tienen endpoint: se agrupan para no crear una serie por URL
+    return (request.blueprint or 'app', request.endpoint or 'sin_ruta')
+
+
+@metricas_bp.before_app_request
+def iniciar_medicion():
+    g.metricas_inicio = time.perf_counter()
+    g.metricas_etiquetas = _etiquetas()
+    EN_CURSO.sumar(g.metricas_etiquetas[:1])
+
+
+@metricas_bp.after_app_request
+def medir_respuesta(response):
+    etiquetas = g.get('metricas_etiquetas')
+    if etiquetas is not None:
+        g.metricas_status = response.status_code
+        # Las respuestas en streaming sin Content-Length no se miden
+        if response.content_length is not None:
+            TAMANO.observar(response.content_length, etiquetas)
+    return response
+
+
+@metricas_bp.teardown_app_request
+def terminar_medicion(error=None):
+    etiquetas = g.pop('metricas_etiquetas', None)
+    if etiquetas is None:
+        return
+    status = g.pop('metricas_status', 500 if error else 200)
+    DURACION.observar(time.perf_counter() - g.pop('metricas_inicio'), etiquetas)
+    SOLICITUDES.incrementar(etiquetas + (request.method, str(status)))
+    EN_CURSO.restar(etiquetas[:1])
+
+
+@metricas.recolector
+def _mongo():
+    """Configuración del pool del cliente (las conexiones abiertas vienen del listener)"""
+    client = db_manager.client
+    if client is None:
+        return []
+    opciones = client.options.pool_options
+    return [
+        ('gym_mongo_pool_max', 'gauge', 'Conexiones máximas por servidor (maxPoolSize)',
+         {(): opciones.max_pool_size}),
+        ('gym_mongo_pool_min', 'gauge', 'Conexiones mínimas por servidor (minPoolSize)',
+         {(): opciones.min_pool_size}),
+    ]
+
+
+@metricas.recolector
+def _biometria():
+    """Despachador de micro-lotes, pool de procesos y tamaño de las galerías cargadas"""
+    series = [
+        ('gym_biometria_lotes_total', 'counter', 'Lotes de identificación procesados',
+         {(): despachador.lotes}),
+        ('gym_biometria_solicitudes_total', 'counter', 'Solicitudes biométricas procesadas en lotes',
+         {(): despachador.solicitudes}),
+        ('gym_biometria_en_cola', 'gauge', 'Solicitudes esperando a formar lote',
+         {(): despachador.en_cola}),
+    ]
+    # Sin cargar la galería: /metrics no debe disparar la lectura desde MongoDB
+    galerias = motor._galerias or {}
+    series.append(('gym_biometria_galeria_plantillas', 'gauge', 'Plantillas activas en la galería',
+                   {(('tipo', tipo),): len(galeria) if galeria.activos is None else int(galeria.activos.sum())
+                    for tipo, galeria in galerias.items()}))
+
+    pool = despachador.pool
+    if pool is not None:
+        datos = pool.metricas()
+        series.extend([
+            ('gym_biometria_pool_procesos', 'gauge', 'Procesos del pool de puntuación',
+             {(): datos['procesos']}),
+            ('gym_biometria_pool_pendientes', 'gauge', 'Lotes enviados al pool sin terminar',
+             {(): datos['pendientes']}),
+            ('gym_biometria_pool_lotes_total', 'counter', 'Lotes del pool por resultado',
+             {(('resultado', resultado),): datos[resultado]
+              for resultado in ('enviados', 'completados', 'expirados', 'rechazados', 'errores')}),
+        ])
+    return series
+
+
+@metricas_bp.route('/metrics')
+def exportar():
+    """Métricas en el formato de texto de Prometheus"""
+    return Response(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,29 @@
+"""
+Sondas de salud para el orquestador / balanceador
+
+    /healthz  el proceso responde (no consulta MongoDB): reiniciar si falla
+    /readyz   MongoDB responde: sacar del balanceo mientras falle
+"""
+import os
+from flask import Blueprint, jsonify, current_app
+from models import db_manager
+
+salud_bp = Blueprint('salud', __name__)
+
+
+@salud_bp.route('/healthz')
+def healthz():
+    """Vivo: siempre 200 mientras el proceso atienda"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+
+@salud_bp.route('/readyz')
+def readyz():
+    """Listo: 200 si MongoDB contesta un ping dentro de SALUD_TIMEOUT, 503 si no"""
+    ok, detalle = db_manager.ping(current_app.config['SALUD_TIMEOUT'])
+    cuerpo = {
+        'status': 'ok' if ok else 'no_disponible',
+        'mongo': {'ok': ok, ('ms' if ok else 'error'): detalle},
+        'calentamiento': db_manager.estado
+    }
+    return jsonify(cuerpo), 200 if ok else 503
@@ -5,6 +5,8 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from models import Usuario, Departamento, db_manager
 from utils.fotos import get_foto_path, get_foto_url, tiene_foto
 from utils.helpers import format_date, calcular_edad
+from utils.importacion import ImportadorUsuarios, leer_filas
+from utils.propagacion import propagador
 from datetime import datetime
 from bson import ObjectId
 
@@ -19,15 +21,16 @@ def index():
     usuario_model = Usuario(db_manager.db)
     
     if search:
+        usuarios = usuario_model.search(search, vista='lista')
         usuarios_data = {
-            'usuarios': usuario_model.search(search),
-            'total': len(usuario_model.search(search)),
+            'usuarios': usuarios,
+            'total': len(usuarios),
             'page': 1,
             'per_page': 50,
             'total_pages': 1
         }
     else:
-        usuarios_data = usuario_model.find_all(page=page, per_page=20)
+        usuarios_data = usuario_model.find_all(page=page, per_page=20, vista='lista')
     
     # Agregar información de fotos
     for usuario in usuarios_data['usuarios']:
@@ -45,12 +48,14 @@ def index():
 def detalle(usuario_id):
     """Detalle de un usuario"""
     usuario_model = Usuario(db_manager.db)
-    usuario = usuario_model.find_by_id(usuario_id)
+    detalle_data = usuario_model.detalle_completo(usuario_id, limite_asistencias=10)
     
-    if not usuario:
+    if not detalle_data:
         flash('Usuario no encontrado', 'error')
         return redirect(url_for('usuarios.index'))
     
+    usuario = detalle_data['usuario']
+    
     # Agregar información adicional
     usuario['foto_url'] = get_foto_url(usuario_id)
     usuario['tiene_foto'] = tiene_foto(usuario_id)
@@ -58,26 +63,11 @@ def detalle(usuario_id):
     if usuario.get('fecha_nacimiento'):
         usuario['edad'] = calcular_edad(usuario['fecha_nacimiento'])
     
-    # Obtener membresías del usuario
-    from models.membresia import Membresia
-    membresia_model = Membresia(db_manager.db)
-    membresias = membresia_model.find_by_usuario(usuario_id)
-    
-    # Obtener asistencias recientes
-    from models.asistencia import Asistencia
-    asistencia_model = Asistencia(db_manager.db)
-    asistencias = asistencia_model.find_by_usuario(usuario_id, limit=10)
-    
-    # Obtener plantillas biométricas
-    from models.plantilla_biometrica import PlantillaBiometrica
-    plantilla_model = PlantillaBiometrica(db_manager.db)
-    plantillas = plantilla_model.find_by_usuario(usuario_id)
-    
     return render_template('usuarios/detalle.html',
                          usuario=usuario,
-                         membresias=membresias,
-                         asistencias=asistencias,
-                         plantillas=plantillas)
+                         membresias=detalle_data['membresias'],
+                         asistencias=detalle_data['asistencias'],
+                         plantillas=detalle_data['plantillas'])
 
 @usuarios_bp.route('/nuevo', methods=['GET', 'POST'])
 def nuevo():
@@ -157,6 +147,14 @@ def editar(usuario_id):
             
             usuario_model.update(usuario_id, data)
             
+            # Propagar nombre/departamento a los documentos denormalizados
+            anteriores = Usuario.campos_denormalizados(usuario)
+            nuevos = Usuario.campos_denormalizados({**usuario, **data})
+            cambios = {k: v for k, v in nuevos.items() if anteriores.get(k) != v}
+            if cambios:
+                trabajo_id = propagador.encolar(usuario_id, nuevos)
+                flash(f'Actualizando asistencias y membresías en segundo plano (trabajo {trabajo_id})', 'info')
+            
             flash('Usuario actualizado exitosamente', 'success')
             return redirect(url_for('usuarios.detalle', usuario_id=usuario_id))
             
@@ -186,7 +184,7 @@ def api_search():
     """API: Buscar usuarios"""
     query = request.args.get('q', '')
     usuario_model = Usuario(db_manager.db)
-    usuarios = usuario_model.search(query)
+    usuarios = usuario_model.search(query, vista='lista')
     
     # Formato simple para autocomplete
     results = [{
@@ -198,6 +196,36 @@ def api_search():
     
     return jsonify(results)
 
+@usuarios_bp.route('/api/importar', methods=['POST'])
+def api_importar():
+    """API: Importar usuarios desde un archivo CSV o XLSX"""
+    archivo = request.files.get('archivo')
+    
+    if not archivo or not archivo.filename:
+        return jsonify({'success': False, 'error': 'archivo requerido'}), 400
+    
+    if not archivo.filename.lower().endswith(('.csv', '.xlsx')):
+        return jsonify({'success': False, 'error': 'Formato no soportado (use CSV o XLSX)'}), 400
+    
+    try:
+        importador = ImportadorUsuarios(db_manager.db)
+        reporte = importador.importar(leer_filas(archivo.stream, archivo.filename))
+        
+        return jsonify({'success': True, **reporte})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@usuarios_bp.route('/api/propagacion/<trabajo_id>')
+def api_propagacion(trabajo_id):
+    """API: Progreso de la propagación de cambios de un usuario"""
+    trabajo = propagador.estado(trabajo_id)
+    
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    
+    return jsonify(trabajo)
+
 @usuarios_bp.route('/api/<int:usuario_id>')
 def api_detalle(usuario_id):
     """API: Obtener datos de un usuario"""
@@ -207,13 +235,4 @@ def api_detalle(usuario_id):
     if not usuario:
         return jsonify({'error': 'Usuario no encontrado'}), 404
     
-    # Convertir ObjectId y datetime a string
-    usuario['_id'] = str(usuario['_id'])
-    if usuario.get('fecha_nacimiento'):
-        usuario['fecha_nacimiento'] = usuario['fecha_nacimiento'].isoformat()
-    if usuario.get('created_at'):
-        usuario['created_at'] = usuario['created_at'].isoformat()
-    if usuario.get('updated_at'):
-        usuario['updated_at'] = usuario['updated_at'].isoformat()
-    
     return jsonify(usuario)
@@ -0,0 +1,85 @@
+"""
+API asíncrona de terminales: las respuestas con ObjectId/datetime se serializan
+
+La base asíncrona se reemplaza por colecciones en memoria y el despachador
+por un Future ya resuelto: no hace falta MongoDB ni galería.
+"""
+from concurrent.futures import Future
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+
+pytest.importorskip('fastapi')
+from fastapi.testclient import TestClient
+import asgi
+from models import db_manager
+
+
+class Coleccion:
+    """Lo que usa AsistenciaAsync de una colección de AsyncMongoClient"""
+
+    def __init__(self, documentos=()):
+        self.documentos = list(documentos)
+
+    @staticmethod
+    def _cumple(documento, filtro):
+        for campo, condicion in filtro.items():
+            valor = documento.get(campo)
+            if isinstance(condicion, dict):
+                if '$gte' in condicion and not (valor is not None and valor >= condicion['$gte']):
+                    return False
+            elif valor != condicion:
+                return False
+        return True
+
+    async def find_one(self, filtro, proyeccion=None, sort=None):
+        return next((d for d in self.documentos if self._cumple(d, filtro)), None)
+
+    async def insert_one(self, documento):
+        documento['_id'] = ObjectId()
+        self.documentos.append(documento)
+        return SimpleNamespace(inserted_id=documento['_id'])
+
+
+@pytest.fixture
+def cliente():
+    app = asgi.crear_api('testing')
+    app.state.db = SimpleNamespace(
+        usuarios=Coleccion([{'_id': 1, 'nombre': 'Ana', 'apellido': 'Pérez', 'departamento': 'Ventas'}]),
+        asistencias=Coleccion()
+    )
+    # Sin 'with': no corre el lifespan (crearía el cliente asíncrono real)
+    yield TestClient(app), app.state.db
+    # Detener la conexión en segundo plano que inició create_app
+    db_manager.close()
+
+
+def test_registrar_devuelve_el_id_como_texto(cliente):
+    cliente, db = cliente
+    respuesta = cliente.post('/asistencias/api/registrar', json={'usuario_id': 1})
+
+    assert respuesta.status_code == 200
+    assert respuesta.json()['asistencia_id'] == str(db.asistencias.documentos[0]['_id'])
+
+
+def test_verificar_asistencia_de_hoy(cliente):
+    cliente, db = cliente
+    assert cliente.get('/asistencias/api/verificar/1').json() == {'registrado': False}
+
+    db.asistencias.documentos.append({'_id': ObjectId(), 'usuario_id': 1, 'fecha': datetime.now()})
+    respuesta = cliente.get('/asistencias/api/verificar/1')
+    assert respuesta.status_code == 200
+    assert respuesta.json()['registrado'] is True
+
+
+def test_verificar_biometria(cliente, monkeypatch):
+    cliente, _ = cliente
+    future = Future()
+    future.set_result({'verificado': True, 'confianza': 0.93})
+    monkeypatch.setattr(asgi.despachador, 'encolar_verificacion', lambda *args, **kwargs: future)
+
+    respuesta = cliente.post('/biometria/api/verificar', json={'usuario_id': 1, 'template': [1, 2, 3]})
+
+    assert respuesta.status_code == 200
+    assert respuesta.json() == {'success': True, 'verificado': True, 'confianza': 0.93, 'usuario_id': 1}
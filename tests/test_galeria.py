@@ -0,0 +1,96 @@
+"""
+Galería en disco: reconstruir no duplica plantillas ni arrastra el log viejo
+"""
+import numpy as np
+from bson import ObjectId
+from reconocimiento import AlmacenGaleria, MotorIdentificacion
+
+DIMENSION = 64
+
+
+class Plantillas:
+    """plantillas_biometricas en memoria (solo lo que usa leer_galerias)
+
+    'durante_lectura' se llama mientras se recorre el cursor, como una
+    alta que llega a mitad de la exportación.
+    """
+
+    def __init__(self):
+        self.documentos = []
+        self.durante_lectura = None
+
+    def find(self, filtro, proyeccion):
+        for i, documento in enumerate([d for d in self.documentos if d.get('activo', True)]):
+            if i == 0 and self.durante_lectura:
+                self.durante_lectura()
+                self.durante_lectura = None
+            yield documento
+
+
+class BaseDatos:
+    def __init__(self):
+        self.plantillas_biometricas = Plantillas()
+
+
+def _alta(db, motor, usuario_id, rng):
+    """Registrar una plantilla como api_registrar: MongoDB primero, luego el log"""
+    documento = {
+        '_id': ObjectId(),
+        'usuario_id': usuario_id,
+        'tipo_plantilla': 'Rostro',
+        'template': rng.standard_normal(DIMENSION).tolist()
+    }
+    db.plantillas_biometricas.documentos.append(documento)
+    motor.agregar('Rostro', usuario_id, documento['_id'], documento['template'])
+    return documento
+
+
+def _activas(db):
+    return sum(1 for d in db.plantillas_biometricas.documentos if d.get('activo', True))
+
+
+def test_reconstruir_dos_veces_no_duplica(tmp_path):
+    rng = np.random.default_rng(7)
+    db = BaseDatos()
+    motor = MotorIdentificacion(AlmacenGaleria(tmp_path))
+    for usuario_id in range(1, 6):
+        _alta(db, motor, usuario_id, rng)
+    motor.almacen.construir(db)
+
+    # Altas y una baja anotadas en el log de la primera generación
+    for usuario_id in range(6, 9):
+        _alta(db, motor, usuario_id, rng)
+    baja = db.plantillas_biometricas.documentos[0]
+    baja['activo'] = False
+    motor.eliminar(baja['_id'])
+    assert int(motor.galeria('Rostro').activos.sum()) == _activas(db)
+
+    motor.reconstruir(db)
+    motor.reconstruir(db)
+
+    galeria = motor.galeria('Rostro')
+    assert len(galeria) == _activas(db)
+    assert galeria.extra.shape[0] == 0
+    # El log de la generación nueva arranca vacío
+    generacion = motor.almacen.manifiesto()['generacion']
+    assert motor.almacen.leer_deltas(generacion) == ([], 0)
+
+
+def test_alta_durante_la_exportacion_se_conserva(tmp_path):
+    rng = np.random.default_rng(11)
+    db = BaseDatos()
+    motor = MotorIdentificacion(AlmacenGaleria(tmp_path))
+    for usuario_id in range(1, 4):
+        _alta(db, motor, usuario_id, rng)
+    motor.almacen.construir(db)
+    motor.galerias()
+
+    # Llega después de que el cursor la dejó atrás: solo está en el log
+    tardia = {}
+    db.plantillas_biometricas.durante_lectura = lambda: tardia.update(_alta(BaseDatos(), motor, 99, rng))
+    motor.reconstruir(db)
+    db.plantillas_biometricas.documentos.append(tardia)
+
+    galeria = MotorIdentificacion(AlmacenGaleria(tmp_path)).galeria('Rostro')
+    assert len(galeria) == _activas(db)
+    assert 99 in galeria.usuario_ids.tolist()
@@ -0,0 +1,76 @@
+"""
+Reportes en secundarios: preferencia de lectura por modelo
+
+Las pruebas de preferencia no necesitan servidor (el MongoClient no
+conecta hasta la primera operación). La de integración corre contra un
+replica set local si MONGO_REPLICA_URI está definida, por ejemplo
+mongodb://localhost:27017/?replicaSet=rs0 (ver EJECUTAR.md).
+"""
+import os
+import pytest
+from pymongo import MongoClient, monitoring
+from pymongo.read_preferences import ReadPreference, SecondaryPreferred
+from models import Asistencia, Membresia, PlantillaBiometrica, Usuario, db_manager
+
+MODELOS = [Asistencia, Membresia, PlantillaBiometrica, Usuario]
+
+
+@pytest.fixture
+def db():
+    db_manager.configurar('mongodb://localhost:27017', 'gym_pruebas', reportes_max_staleness=150)
+    yield db_manager.db
+    db_manager.close()
+
+
+@pytest.mark.parametrize('modelo', MODELOS, ids=lambda m: m.__name__)
+def test_reportes_leen_de_secundarios(db, modelo):
+    preferencia = modelo(db).reportes.read_preference
+    assert isinstance(preferencia, SecondaryPreferred)
+    assert preferencia.max_staleness == 150
+
+
+@pytest.mark.parametrize('modelo', MODELOS, ids=lambda m: m.__name__)
+def test_escrituras_en_el_primario(db, modelo):
+    assert modelo(db).collection.read_preference == ReadPreference.PRIMARY
+
+
+def test_atraso_menor_al_minimo_se_rechaza():
+    with pytest.raises(ValueError):
+        db_manager.configurar('mongodb://localhost:27017', 'gym_pruebas', reportes_max_staleness=30)
+
+
+class _Comandos(monitoring.CommandListener):
+    def __init__(self):
+        self.enviados = []
+
+    def started(self, event):
+        self.enviados.append(event.command)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.mark.skipif(not os.getenv('MONGO_REPLICA_URI'), reason='MONGO_REPLICA_URI no definida')
+def test_replica_set_local():
+    comandos = _Comandos()
+    client = MongoClient(os.environ['MONGO_REPLICA_URI'], serverSelectionTimeoutMS=5000, event_listeners=[comandos])
+    db = client.gym_pruebas_reportes
+    try:
+        db_manager.configurar(os.environ['MONGO_REPLICA_URI'], 'gym_pruebas_reportes', reportes_max_staleness=150)
+        db.usuarios.insert_one({'_id': 1, 'nombre': 'Ana', 'apellido': 'Pérez', 'activo': True})
+        asistencia = Asistencia(db)
+        asistencia.registrar({'usuario_id': 1})
+        asistencia.get_por_departamento()
+
+        insert = next(c for c in comandos.enviados if 'insert' in c)
+        aggregate = next(c for c in comandos.enviados if 'aggregate' in c)
+        # Con un solo nodo el primario responde, pero el comando pide secondaryPreferred
+        assert '$readPreference' not in insert
+        assert aggregate['$readPreference'] == {'mode': 'secondaryPreferred', 'maxStalenessSeconds': 150}
+    finally:
+        client.drop_database('gym_pruebas_reportes')
+        client.close()
+        db_manager.close()
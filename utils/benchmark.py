@@ -0,0 +1,432 @@
+"""
+Micro-benchmarks de los métodos públicos de los modelos sobre un dataset
+sembrado con volúmenes reales (flask benchmark-modelos)
+"""
+import json
+import platform
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from pymongo import UpdateOne, version as pymongo_version
+from models import Usuario, Membresia, Asistencia, PlantillaBiometrica, Plan, Departamento
+from models.indices import aplicar_indices
+from reconocimiento.codec import FORMATO_VERSION, codificar_template
+
+# Volúmenes por defecto (similares a la base en producción)
+USUARIOS = 1500
+PLANTILLAS = 12000
+ASISTENCIAS = 1_000_000
+ANIOS = 3
+
+COLECCIONES = ['usuarios', 'membresias', 'asistencias', 'plantillas_biometricas', 'planes', 'departamentos']
+# Marca que deja sembrar(): solo se vuelve a sembrar una base vacía o ya sembrada por el benchmark
+MARCA = 'benchmark_dataset'
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carmen', 'Jorge', 'Rosa', 'Carlos', 'Lucía', 'Miguel',
+           'Elena', 'Pedro', 'Sofía', 'Diego', 'Valeria', 'Andrés', 'Paula', 'Raúl', 'Julia', 'Hugo']
+APELLIDOS = ['García', 'Rodríguez', 'López', 'Martínez', 'Sánchez', 'Pérez', 'Gómez', 'Flores',
+             'Torres', 'Ramírez', 'Vargas', 'Castro', 'Rojas', 'Mendoza', 'Quispe', 'Huamán']
+DEPARTAMENTOS = ['Administración', 'Ventas', 'Sistemas', 'Logística', 'Producción',
+                 'Recursos Humanos', 'Contabilidad', 'Externo']
+PLANES = [('Mensual', 30, 120.0), ('Trimestral', 90, 330.0), ('Semestral', 180, 600.0), ('Anual', 365, 1100.0)]
+TIPOS = [('Huella Digital', 'uint8', 512), ('Rostro', 'float32', 128)]
+DISPOSITIVOS = ['ZKTeco F18', 'ZKTeco SpeedFace', 'Hikvision DS-K1T']
+
+# Distribución horaria de las entradas (pico a las 18 h)
+_HORAS = np.array([0, 0, 0, 0, 0, 1, 4, 6, 5, 3, 2, 2, 3, 2, 2, 3, 5, 9, 12, 10, 7, 4, 1, 0], dtype=float)
+
+
+def sembrar(db, usuarios=USUARIOS, plantillas=PLANTILLAS, asistencias=ASISTENCIAS, anios=ANIOS,
+            semilla=0, lote=10000, progreso=None):
+    """Borrar las colecciones del dataset y generar uno nuevo
+
+    Devuelve la cantidad de documentos por colección.
+    """
+    rng = np.random.default_rng(semilla)
+    ahora = datetime.now()
+    desde = ahora - timedelta(days=365 * anios)
+    avisar = progreso or (lambda mensaje: None)
+
+    if not se_puede_sembrar(db):
+        raise ValueError(f"{db.name} tiene usuarios que no sembró el benchmark; usar otra base")
+    for coleccion in COLECCIONES:
+        db[coleccion].drop()
+    db[MARCA].replace_one({'_id': 'dataset'}, {'_id': 'dataset', 'fecha': ahora, 'semilla': semilla}, upsert=True)
+
+    # insert_many completa el _id (ObjectId) de cada documento
+    departamentos = [{'nombre': nombre, 'descripcion': '', 'activo': True, 'created_at': desde}
+                     for nombre in DEPARTAMENTOS]
+    db.departamentos.insert_many(departamentos)
+
+    planes = [{'nombre': nombre, 'duracion_dias': dias, 'precio': precio, 'descripcion': '',
+               'activo': True, 'created_at': desde} for nombre, dias, precio in PLANES]
+    db.planes.insert_many(planes)
+
+    # Usuarios y su historial de membresías encadenadas
+    docs_usuarios, docs_membresias = [], []
+    for usuario_id in range(1, usuarios + 1):
+        nombre = NOMBRES[rng.integers(len(NOMBRES))]
+        apellido = f"{APELLIDOS[rng.integers(len(APELLIDOS))]} {APELLIDOS[rng.integers(len(APELLIDOS))]}"
+        departamento = departamentos[rng.integers(len(departamentos))]
+
+        fecha_inicio = fecha_fin = None
+        inicio = desde + timedelta(days=int(rng.integers(0, 365 * anios)))
+        # Un 5% nunca tuvo membresía
+        while rng.random() > 0.05 and inicio < ahora:
+            plan = planes[rng.integers(len(planes))]
+            fin = inicio + timedelta(days=plan['duracion_dias'])
+            docs_membresias.append({
+                'usuario_id': usuario_id,
+                'usuario_nombre': f"{nombre} {apellido}",
+                'departamento_id': departamento['_id'],
+                'departamento_nombre': departamento['nombre'],
+                'plan_id': plan['_id'],
+                'plan_nombre': plan['nombre'],
+                'duracion_dias': plan['duracion_dias'],
+                'fecha_inicio': inicio,
+                'fecha_fin': fin,
+                'vigente': fin >= ahora,
+                'precio_pagado': plan['precio'],
+                'metodo_pago': 'Efectivo',
+                'notas': '',
+                'created_at': inicio,
+                'updated_at': inicio
+            })
+            fecha_inicio, fecha_fin = inicio, fin
+            # Renovación inmediata o tras una pausa
+            inicio = fin + timedelta(days=int(rng.choice([0, 0, 0, 15, 60])))
+
+        docs_usuarios.append({
+            '_id': usuario_id,
+            'nombre': nombre,
+            'apellido': apellido,
+            'codigo': f"G{usuario_id:05d}",
+            'departamento_id': departamento['_id'],
+            'departamento_nombre': departamento['nombre'],
+            'genero': 'F' if rng.random() < 0.5 else 'M',
+            'fecha_nacimiento': datetime(1960, 1, 1) + timedelta(days=int(rng.integers(0, 365 * 45))),
+            'fecha_inicio': fecha_inicio,
+            'fecha_fin': fecha_fin,
+            'celular': f"9{rng.integers(10**7, 10**8)}",
+            'email': f"{nombre.lower()}.{usuario_id}@correo.com" if rng.random() < 0.8 else '',
+            'tipo_documento': 'DNI',
+            'numero_documento': f"{rng.integers(10**7, 10**8)}",
+            'plantillas_biometricas': [],
+            'tiene_foto': bool(rng.random() < 0.6),
+            'foto_path': None,
+            'tiene_biometria': False,
+            'total_plantillas': 0,
+            'activo': bool(rng.random() < 0.95),
+            'created_at': desde,
+            'updated_at': desde
+        })
+    db.usuarios.insert_many(docs_usuarios)
+    for i in range(0, len(docs_membresias), lote):
+        db.membresias.insert_many(docs_membresias[i:i + lote], ordered=False)
+    avisar(f"usuarios: {len(docs_usuarios)}, membresías: {len(docs_membresias)}")
+
+    # Plantillas repartidas entre los usuarios (varios dedos y rostro)
+    nombres = {u['_id']: f"{u['nombre']} {u['apellido']}" for u in docs_usuarios}
+    duenos = rng.integers(1, usuarios + 1, plantillas)
+    conteo = np.bincount(duenos, minlength=usuarios + 1)
+    docs = []
+    for dueno in duenos:
+        tipo, dtype, dimension = TIPOS[0] if rng.random() < 0.75 else TIPOS[1]
+        if dtype == 'uint8':
+            valores = rng.integers(0, 256, dimension, dtype=np.uint8)
+        else:
+            valores = rng.standard_normal(dimension).astype(np.float32)
+        registro = desde + timedelta(days=int(rng.integers(0, 365 * anios)))
+        docs.append({
+            'usuario_id': int(dueno),
+            'usuario_nombre': nombres[int(dueno)],
+            'tipo': tipo,
+            'tipo_plantilla': tipo,
+            'template': codificar_template(valores, 'zlib'),
+            'template_formato': FORMATO_VERSION,
+            'tiene_template_real': True,
+            'calidad': float(rng.integers(30, 100)),
+            'dispositivo': DISPOSITIVOS[rng.integers(len(DISPOSITIVOS))],
+            'fecha_registro': registro,
+            'activo': bool(rng.random() < 0.97),
+            'created_at': registro
+        })
+        if len(docs) >= lote:
+            db.plantillas_biometricas.insert_many(docs, ordered=False)
+            docs = []
+    if docs:
+        db.plantillas_biometricas.insert_many(docs, ordered=False)
+    db.usuarios.bulk_write([
+        UpdateOne({'_id': usuario_id}, {'$set': {'tiene_biometria': True, 'total_plantillas': int(total)}})
+        for usuario_id, total in enumerate(conteo) if total
+    ])
+    avisar(f"plantillas: {plantillas}")
+
+    # Asistencias: pocos usuarios frecuentes concentran muchas entradas
+    pesos = rng.pareto(1.5, usuarios) + 1
+    pesos /= pesos.sum()
+    horas = _HORAS / _HORAS.sum()
+    segundos = 365 * anios * 86400
+    for inicio in range(0, asistencias, lote):
+        n = min(lote, asistencias - inicio)
+        ids = rng.choice(usuarios, n, p=pesos) + 1
+        dias = rng.integers(0, 365 * anios, n)
+        hora = rng.choice(24, n, p=horas)
+        desplazamiento = dias * 86400 + hora * 3600 + rng.integers(0, 3600, n)
+        # Las horas de hoy que aún no pasaron se mueven a ayer
+        desplazamiento = np.where(desplazamiento >= segundos, desplazamiento - 86400, desplazamiento)
+        metodos = rng.random(n) < 0.7
+        docs = []
+        for usuario_id, segundo, biometrico in zip(ids.tolist(), desplazamiento.tolist(), metodos.tolist()):
+            fecha = desde + timedelta(seconds=segundo)
+            usuario = docs_usuarios[usuario_id - 1]
+            metodo = 'biometrico' if biometrico else 'Manual'
+            docs.append({
+                'usuario_id': usuario_id,
+                'usuario_nombre': nombres[usuario_id],
+                'fecha': fecha,
+                'departamento_id': usuario['departamento_id'],
+                'departamento_nombre': usuario['departamento_nombre'],
+                'tipo_acceso': metodo,
+                'metodo_registro': metodo,
+                'notas': '',
+                'created_at': fecha
+            })
+        db.asistencias.insert_many(docs, ordered=False)
+        avisar(f"asistencias: {inicio + n}/{asistencias}")
+
+    aplicar_indices(db)
+    return {coleccion: db[coleccion].estimated_document_count() for coleccion in COLECCIONES}
+
+
+def se_puede_sembrar(db):
+    """True si la base no tiene usuarios o los generó sembrar() (nunca borrar datos reales)"""
+    return db.usuarios.estimated_document_count() == 0 or db[MARCA].find_one({'_id': 'dataset'}) is not None
+
+
+# =====================================
+# CASOS
+# =====================================
+
+def _ultima_pagina(resultado):
+    return max(resultado['total_pages'], 1)
+
+
+def contexto(db):
+    """Datos de ejemplo para los casos: un usuario con historial, la fecha más
+    cargada y la última página de cada listado"""
+    ctx = {'texto': 'ram', 'tipo': 'Huella Digital', 'fecha': datetime.now()}
+    frecuentes = Asistencia(db).get_top_usuarios(1)
+    ctx['usuario_id'] = frecuentes[0]['_id'] if frecuentes else 1
+    membresia = db.membresias.find_one({'usuario_id': ctx['usuario_id']}, {'_id': 1})
+    ctx['membresia_id'] = membresia['_id'] if membresia else None
+    ctx['plan_id'] = (db.planes.find_one({}, {'_id': 1}) or {}).get('_id')
+    ctx['departamento_id'] = (db.departamentos.find_one({}, {'_id': 1}) or {}).get('_id')
+    ctx['paginas'] = {
+        'usuarios': _ultima_pagina(Usuario(db).find_all(per_page=20)),
+        'membresias': _ultima_pagina(Membresia(db).find_all(per_page=20)),
+        'asistencias': _ultima_pagina(Asistencia(db).find_all(per_page=20)),
+        'plantillas': _ultima_pagina(PlantillaBiometrica(db).find_all(per_page=20)),
+        'tipo': _ultima_pagina(PlantillaBiometrica(db).find_by_tipo(ctx['tipo'], per_page=50))
+    }
+    return ctx
+
+
+# Método del modelo -> llamada con los datos del contexto (m = modelos instanciados)
+#
+# Quedan fuera a propósito:
+# - las escrituras que borran o cambian el dataset entre corridas (create,
+#   delete, renovar, desactivar, importar_lote, normalizar_tipos,
+#   actualizar_resumen_biometria);
+# - PlantillaBiometrica.adjuntar_usuarios, que se mide dentro de find_all/find_by_tipo;
+# - los helpers estáticos sin consultas (armar_registro, filtro_hoy, campos_denormalizados, ...).
+CASOS = [
+    ('Usuario.find_all', lambda m, ctx: m['usuario'].find_all(vista='lista')),
+    ('Usuario.find_all[ultima]', lambda m, ctx: m['usuario'].find_all(ctx['paginas']['usuarios'], vista='lista')),
+    ('Usuario.find_by_id', lambda m, ctx: m['usuario'].find_by_id(ctx['usuario_id'])),
+    ('Usuario.detalle_completo', lambda m, ctx: m['usuario'].detalle_completo(ctx['usuario_id'])),
+    ('Usuario.search', lambda m, ctx: m['usuario'].search(ctx['texto'], vista='lista')),
+    ('Usuario.get_stats', lambda m, ctx: m['usuario'].get_stats()),
+    ('Usuario.get_by_departamento', lambda m, ctx: m['usuario'].get_by_departamento()),
+    ('Usuario.find_activos', lambda m, ctx: m['usuario'].find_activos(vista='resumen')),
+    ('Usuario.get_vigentes', lambda m, ctx: m['usuario'].get_vigentes()),
+    ('Usuario.get_vencidos', lambda m, ctx: m['usuario'].get_vencidos()),
+    ('Usuario.get_sin_membresia', lambda m, ctx: m['usuario'].get_sin_membresia()),
+    ('Usuario.get_proximos_vencer', lambda m, ctx: m['usuario'].get_proximos_vencer()),
+    ('Usuario.get_ids', lambda m, ctx: m['usuario'].get_ids()),
+    ('Membresia.find_all', lambda m, ctx: m['membresia'].find_all(vista='lista')),
+    ('Membresia.find_all[ultima]', lambda m, ctx: m['membresia'].find_all(ctx['paginas']['membresias'], vista='lista')),
+    ('Membresia.find_by_id', lambda m, ctx: m['membresia'].find_by_id(ctx['membresia_id'])),
+    ('Membresia.find_by_usuario', lambda m, ctx: m['membresia'].find_by_usuario(ctx['usuario_id'])),
+    ('Membresia.get_vigentes', lambda m, ctx: m['membresia'].get_vigentes(vista='lista')),
+    ('Membresia.get_vencidas', lambda m, ctx: m['membresia'].get_vencidas(vista='lista')),
+    ('Membresia.get_proximas_vencer', lambda m, ctx: m['membresia'].get_proximas_vencer(vista='lista')),
+    ('Membresia.contar_proximas_vencer', lambda m, ctx: m['membresia'].contar_proximas_vencer()),
+    ('Membresia.get_stats', lambda m, ctx: m['membresia'].get_stats()),
+    ('Membresia.get_ingresos_mes', lambda m, ctx: m['membresia'].get_ingresos_mes()),
+    ('Asistencia.find_all', lambda m, ctx: m['asistencia'].find_all(vista='lista')),
+    ('Asistencia.find_all[ultima]', lambda m, ctx: m['asistencia'].find_all(ctx['paginas']['asistencias'], vista='lista')),
+    ('Asistencia.find_by_usuario', lambda m, ctx: m['asistencia'].find_by_usuario(ctx['usuario_id'])),
+    ('Asistencia.get_hoy', lambda m, ctx: m['asistencia'].get_hoy(vista='lista')),
+    ('Asistencia.contar_hoy', lambda m, ctx: m['asistencia'].contar_hoy()),
+    ('Asistencia.get_por_fecha', lambda m, ctx: m['asistencia'].get_por_fecha(ctx['fecha'], vista='lista')),
+    ('Asistencia.contar_por_fecha', lambda m, ctx: m['asistencia'].contar_por_fecha(ctx['fecha'])),
+    ('Asistencia.registro_de_hoy', lambda m, ctx: m['asistencia'].registro_de_hoy(ctx['usuario_id'])),
+    ('Asistencia.get_stats', lambda m, ctx: m['asistencia'].get_stats()),
+    ('Asistencia.get_top_usuarios', lambda m, ctx: m['asistencia'].get_top_usuarios()),
+    ('Asistencia.get_por_departamento', lambda m, ctx: m['asistencia'].get_por_departamento()),
+    ('Asistencia.get_por_hora', lambda m, ctx: m['asistencia'].get_por_hora(ctx['fecha'])),
+    ('PlantillaBiometrica.find_all', lambda m, ctx: m['plantilla'].find_all(vista='lista')),
+    ('PlantillaBiometrica.find_all[ultima]', lambda m, ctx: m['plantilla'].find_all(ctx['paginas']['plantillas'], vista='lista')),
+    ('PlantillaBiometrica.find_by_usuario', lambda m, ctx: m['plantilla'].find_by_usuario(ctx['usuario_id'], vista='resumen')),
+    ('PlantillaBiometrica.find_by_tipo', lambda m, ctx: m['plantilla'].find_by_tipo(ctx['tipo'], vista='lista')),
+    ('PlantillaBiometrica.find_by_tipo[ultima]', lambda m, ctx: m['plantilla'].find_by_tipo(ctx['tipo'], ctx['paginas']['tipo'], vista='lista')),
+    ('PlantillaBiometrica.get_con_template', lambda m, ctx: m['plantilla'].get_con_template(vista='lista')),
+    ('PlantillaBiometrica.get_stats', lambda m, ctx: m['plantilla'].get_stats()),
+    ('Plan.find_all', lambda m, ctx: m['plan'].find_all()),
+    ('Plan.find_by_id', lambda m, ctx: m['plan'].find_by_id(ctx['plan_id'])),
+    ('Departamento.find_all', lambda m, ctx: m['departamento'].find_all()),
+    ('Departamento.get_mapa', lambda m, ctx: m['departamento'].get_mapa()),
+    ('Departamento.find_by_id', lambda m, ctx: m['departamento'].find_by_id(ctx['departamento_id'])),
+    # Escrituras (agregan asistencias al dataset del benchmark)
+    ('Asistencia.registrar', lambda m, ctx: m['asistencia'].registrar({'usuario_id': ctx['usuario_id'], 'tipo_acceso': 'biometrico'})),
+    ('Usuario.update', lambda m, ctx: m['usuario'].update(ctx['usuario_id'], {'celular': '999999999'})),
+]
+
+
+def medir(funcion, repeticiones=30, calentamiento=3, max_segundos=10.0):
+    """Tiempos en ms de cada repetición (se corta al pasar max_segundos)"""
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    limite = time.perf_counter() + max_segundos
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        if inicio > limite:
+            break
+    return tiempos
+
+
+def resumir(tiempos):
+    """Percentiles de una serie de tiempos en ms"""
+    valores = np.asarray(tiempos)
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {
+        'n': len(tiempos),
+        'min': round(float(valores.min()), 3),
+        'media': round(float(valores.mean()), 3),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3)
+    }
+
+
+def incluido(nombre, filtro):
+    """True si el caso entra en el filtro de --solo (sin filtro, todos)"""
+    return not filtro or any(parte.lower() in nombre.lower() for parte in filtro)
+
+
+def ejecutar(db, casos=CASOS, repeticiones=30, calentamiento=3, max_segundos=10.0, filtro=None, progreso=None):
+    """Medir cada caso -> {nombre: resumen}; un caso que falla queda como {'error': mensaje}"""
+    modelos = {
+        'usuario': Usuario(db),
+        'membresia': Membresia(db),
+        'asistencia': Asistencia(db),
+        'plantilla': PlantillaBiometrica(db),
+        'plan': Plan(db),
+        'departamento': Departamento(db)
+    }
+    ctx = contexto(db)
+    resultados = {}
+    for nombre, llamada in casos:
+        if not incluido(nombre, filtro):
+            continue
+        try:
+            tiempos = medir(lambda: llamada(modelos, ctx), repeticiones, calentamiento, max_segundos)
+            resultados[nombre] = resumir(tiempos)
+        except Exception as e:
+            # Por ejemplo, operadores que mongomock no implementa: se informa y se sigue
+            resultados[nombre] = {'error': str(e).strip() or type(e).__name__}
+        if progreso:
+            progreso(nombre, resultados[nombre])
+    return resultados
+
+
+# =====================================
+# BASELINE
+# =====================================
+
+def entorno(db):
+    """Versiones y dataset con los que se midió (para no comparar peras con manzanas)"""
+    try:
+        servidor = db.client.server_info().get('version')
+    except Exception:
+        servidor = None
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pymongo': pymongo_version,
+        'mongodb': servidor,
+        'dataset': {coleccion: db[coleccion].estimated_document_count() for coleccion in COLECCIONES}
+    }
+
+
+def mismo_dataset(a, b, tolerancia=0.01):
+    """True si los conteos por colección coinciden (las escrituras medidas agregan unas pocas filas)"""
+    if not a or not b or set(a) != set(b):
+        return False
+    return all(abs(a[c] - b[c]) <= max(a[c], b[c]) * tolerancia for c in a)
+
+
+def guardar_baseline(ruta, resultados, info):
+    # Los casos con error no son referencia: quedan sin baseline
+    medidos = {nombre: r for nombre, r in resultados.items() if 'error' not in r}
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({'entorno': info, 'resultados': medidos}, f, indent=2, ensure_ascii=False)
+
+
+def cargar_baseline(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def comparar(resultados, baseline, tolerancia=0.25, minimo_ms=0.5, filtro=None):
+    """Comparar el p50 de cada caso con el de la baseline
+
+    Es regresión si empeora más que la tolerancia relativa y más que
+    minimo_ms en absoluto (el ruido de los casos de microsegundos no cuenta).
+    Un caso que falló queda como 'error' y uno de la baseline que ya no se
+    midió (dentro de filtro) como 'faltante'; ambos cuentan igual que una regresión.
+    """
+    anteriores = baseline.get('resultados', {})
+    filas = []
+    for nombre, actual in resultados.items():
+        anterior = anteriores.get(nombre)
+        if 'error' in actual:
+            filas.append({'caso': nombre, 'estado': 'error', 'p50': None,
+                          'base': anterior['p50'] if anterior else None, 'cambio': None, 'error': actual['error']})
+            continue
+        if anterior is None:
+            filas.append({'caso': nombre, 'estado': 'nuevo', 'p50': actual['p50'], 'base': None, 'cambio': None})
+            continue
+        diferencia = actual['p50'] - anterior['p50']
+        cambio = diferencia / anterior['p50'] if anterior['p50'] else 0.0
+        if cambio > tolerancia and diferencia > minimo_ms:
+            estado = 'regresion'
+        elif cambio < -tolerancia and -diferencia > minimo_ms:
+            estado = 'mejora'
+        else:
+            estado = 'igual'
+        filas.append({'caso': nombre, 'estado': estado, 'p50': actual['p50'],
+                      'base': anterior['p50'], 'cambio': round(cambio, 3)})
+    for nombre, anterior in anteriores.items():
+        if nombre not in resultados and incluido(nombre, filtro):
+            filas.append({'caso': nombre, 'estado': 'faltante', 'p50': None,
+                          'base': anterior['p50'], 'cambio': None})
+    return filas
+
+
+# Estados de comparar() que hacen fallar --estricto
+FALLAS = ('regresion', 'error', 'faltante')
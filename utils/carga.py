@@ -0,0 +1,214 @@
+"""
+Prueba de carga de extremo a extremo (flask prueba-carga)
+
+Llegadas de Poisson a una tasa fija (carga abierta): la latencia se mide
+desde el instante en que la solicitud debía salir, así que la espera por
+un hilo libre cuenta como en la puerta a las 18 h.
+"""
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import numpy as np
+from bson import ObjectId
+from reconocimiento.codec import template_json
+
+# Peso relativo de cada escenario por defecto
+MEZCLA = {'registrar': 40, 'verificar': 20, 'buscar': 15, 'pagina': 25}
+
+# Páginas que el personal navega mientras tanto
+PAGINAS = ['/', '/membresias/', '/asistencias/', '/usuarios/']
+
+
+def parse_mezcla(texto):
+    """'registrar=40,verificar=20' -> {'registrar': 40.0, 'verificar': 20.0}"""
+    mezcla = {}
+    for parte in filter(None, (p.strip() for p in texto.split(','))):
+        nombre, _, peso = parte.partition('=')
+        if nombre not in ESCENARIOS:
+            raise ValueError(f"Escenario desconocido: {nombre} (válidos: {', '.join(ESCENARIOS)})")
+        try:
+            mezcla[nombre] = float(peso)
+        except ValueError:
+            raise ValueError(f"Peso inválido para {nombre}: {peso}")
+    if not mezcla or sum(mezcla.values()) <= 0:
+        raise ValueError("La mezcla no tiene escenarios con peso")
+    return mezcla
+
+
+def preparar_datos(db, muestras=300, semilla=0):
+    """Usuarios activos, plantillas y textos de búsqueda reales para armar las solicitudes"""
+    usuarios = [u['_id'] for u in db.usuarios.aggregate([
+        {'$match': {'activo': True}}, {'$sample': {'size': muestras}}, {'$project': {'_id': 1}}
+    ])]
+    plantillas = []
+    for plantilla in db.plantillas_biometricas.aggregate([
+        {'$match': {'activo': {'$ne': False}, 'tiene_template_real': True}},
+        {'$sample': {'size': muestras}},
+        {'$project': {'usuario_id': 1, 'tipo': 1, 'tipo_plantilla': 1, 'template': 1}}
+    ]):
+        plantillas.append((plantilla['usuario_id'], plantilla.get('tipo_plantilla') or plantilla.get('tipo'),
+                           template_json(plantilla.get('template'))))
+
+    textos = sorted({u['nombre'][:3].lower() for u in db.usuarios.find(
+        {'_id': {'$in': usuarios}}, {'nombre': 1}) if u.get('nombre')}) or ['a']
+    return {'usuarios': usuarios or [1], 'plantillas': plantillas, 'textos': textos}
+
+
+# Escenario -> (rng, datos) -> (método, ruta, cuerpo JSON)
+ESCENARIOS = {
+    'registrar': lambda rng, datos: ('POST', '/asistencias/api/registrar', {
+        'usuario_id': int(datos['usuarios'][rng.integers(len(datos['usuarios']))]),
+        'metodo': 'biometrico'
+    }),
+    'verificar': lambda rng, datos: ('POST', '/biometria/api/verificar', dict(zip(
+        ('usuario_id', 'tipo', 'template'), datos['plantillas'][rng.integers(len(datos['plantillas']))]
+    ))),
+    'buscar': lambda rng, datos: ('GET', f"/usuarios/api/search?q={datos['textos'][rng.integers(len(datos['textos']))]}", None),
+    'pagina': lambda rng, datos: ('GET', PAGINAS[rng.integers(len(PAGINAS))], None),
+}
+
+
+class ClienteWSGI:
+    """Llama a la aplicación directamente (sin red), un cliente de prueba por hilo"""
+
+    def __init__(self, app):
+        from werkzeug.test import Client
+        self._crear = lambda: Client(app)
+        self._local = threading.local()
+
+    def solicitar(self, metodo, ruta, cuerpo=None):
+        cliente = getattr(self._local, 'cliente', None)
+        if cliente is None:
+            cliente = self._local.cliente = self._crear()
+        respuesta = cliente.open(ruta, method=metodo, json=cuerpo)
+        try:
+            return respuesta.status_code, respuesta.get_data()
+        finally:
+            respuesta.close()
+
+
+class ClienteHTTP:
+    """Contra un servidor en marcha, con una conexión keep-alive por hilo"""
+
+    def __init__(self, url, timeout=30):
+        partes = urlsplit(url)
+        self._clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self._host = partes.netloc
+        self._prefijo = partes.path.rstrip('/')
+        self._timeout = timeout
+        self._local = threading.local()
+
+    def solicitar(self, metodo, ruta, cuerpo=None):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = self._local.conexion = self._clase(self._host, timeout=self._timeout)
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        cabeceras = {'Content-Type': 'application/json'} if datos is not None else {}
+        try:
+            conexion.request(metodo, self._prefijo + ruta, body=datos, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            return respuesta.status, respuesta.read()
+        except (http.client.HTTPException, OSError):
+            # Reabrir en la próxima solicitud
+            conexion.close()
+            self._local.conexion = None
+            raise
+
+
+def ejecutar(cliente, datos, mezcla=MEZCLA, tasa=20.0, duracion=30.0, hilos=32, semilla=0, progreso=None,
+             creadas=None):
+    """Generar llegadas a 'tasa' solicitudes/s durante 'duracion' segundos
+
+    Devuelve {'escenarios': {nombre: resumen}, 'total': resumen, 'asistencias': [ids creados]}.
+    Los ids se van agregando a 'creadas' (si se pasa), para poder limpiarlos
+    aunque la prueba se interrumpa.
+    """
+    rng = np.random.default_rng(semilla)
+    nombres = list(mezcla)
+    pesos = np.array([mezcla[n] for n in nombres], dtype=float)
+    pesos /= pesos.sum()
+    if not datos['plantillas'] and 'verificar' in nombres:
+        raise ValueError("No hay plantillas con template para el escenario 'verificar'")
+
+    # Plan de llegadas completo por adelantado: no depende de lo que tarde el servidor
+    llegadas = np.cumsum(rng.exponential(1.0 / tasa, int(tasa * duracion * 1.2) + 10))
+    llegadas = llegadas[llegadas < duracion]
+    elegidos = rng.choice(len(nombres), len(llegadas), p=pesos)
+    solicitudes = [(nombres[i],) + ESCENARIOS[nombres[i]](rng, datos) for i in elegidos]
+
+    lock = threading.Lock()
+    registros = {nombre: {'latencias': [], 'errores': 0, 'status': {}} for nombre in nombres}
+    creadas = creadas if creadas is not None else []
+
+    def enviar(escenario, metodo, ruta, cuerpo, programada):
+        try:
+            status, contenido = cliente.solicitar(metodo, ruta, cuerpo)
+        except Exception as e:
+            status, contenido = type(e).__name__, b''
+        latencia = time.perf_counter() - programada
+        with lock:
+            registro = registros[escenario]
+            registro['latencias'].append(latencia)
+            registro['status'][str(status)] = registro['status'].get(str(status), 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                registro['errores'] += 1
+            elif escenario == 'registrar':
+                try:
+                    creadas.append(json.loads(contenido)['asistencia_id'])
+                except (ValueError, KeyError, TypeError):
+                    pass
+
+    atrasadas = 0
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='carga') as executor:
+        inicio = time.perf_counter()
+        siguiente_aviso = 1.0
+        for llegada, (escenario, metodo, ruta, cuerpo) in zip(llegadas, solicitudes):
+            programada = inicio + llegada
+            espera = programada - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            elif espera < -0.01:
+                atrasadas += 1
+            executor.submit(enviar, escenario, metodo, ruta, cuerpo, programada)
+            if progreso and llegada >= siguiente_aviso:
+                siguiente_aviso += 5.0
+                progreso(llegada)
+    transcurrido = time.perf_counter() - inicio
+
+    escenarios = {nombre: resumir(r['latencias'], r['errores'], r['status'], transcurrido)
+                  for nombre, r in registros.items() if r['latencias']}
+    todas = [lat for r in registros.values() for lat in r['latencias']]
+    total = resumir(todas, sum(r['errores'] for r in registros.values()), {}, transcurrido)
+    total['atrasadas'] = atrasadas
+    total['tasa_objetivo'] = tasa
+    return {'escenarios': escenarios, 'total': total, 'asistencias': creadas}
+
+
+def resumir(latencias, errores, status, segundos):
+    """Percentiles en ms, throughput y tasa de error"""
+    if not latencias:
+        return {'n': 0, 'errores': 0, 'tasa_error': 0.0, 'throughput': 0.0, 'status': status}
+    ms = np.asarray(latencias) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'n': len(latencias),
+        'errores': errores,
+        'tasa_error': round(errores / len(latencias), 4),
+        'throughput': round(len(latencias) / segundos, 2),
+        'p50': round(float(p50), 2),
+        'p95': round(float(p95), 2),
+        'p99': round(float(p99), 2),
+        'max': round(float(ms.max()), 2),
+        'status': status
+    }
+
+
+def limpiar(db, asistencia_ids):
+    """Borrar las asistencias creadas por la prueba"""
+    ids = [ObjectId(i) for i in asistencia_ids if ObjectId.is_valid(i)]
+    if not ids:
+        return 0
+    return db.asistencias.delete_many({'_id': {'$in': ids}}).deleted_count
@@ -0,0 +1,128 @@
+"""
+Compresión gzip/brotli de las respuestas, negociada con Accept-Encoding
+
+brotli es opcional (pip install brotli): sin él solo se ofrece gzip. Las
+respuestas en streaming se comprimen por partes, enviando cada una en
+cuanto llega; los archivos (send_file) y las fotos no se tocan.
+"""
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - solo gzip
+    brotli = None
+
+# Tipos que vale la pena comprimir (las imágenes ya vienen comprimidas)
+TIPOS_COMPRIMIBLES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'
+}
+
+# Blueprints que sirven medios ya comprimidos
+EXCLUIDOS = {'fotos'}
+
+
+def codificaciones():
+    """Codificaciones soportadas, en orden de preferencia ante igual calidad"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def _compresor(codificacion, nivel_gzip, nivel_brotli):
+    """Objeto con compress(bytes) y flush() para la codificación elegida"""
+    if codificacion == 'br':
+        return _Brotli(nivel_brotli)
+    return _Gzip(nivel_gzip)
+
+
+class _Gzip:
+    def __init__(self, nivel):
+        # wbits=31: formato gzip (cabecera y CRC), no deflate crudo
+        self._z = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+
+    def compress(self, datos):
+        return self._z.compress(datos)
+
+    def flush(self, final=True):
+        return self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _Brotli:
+    def __init__(self, nivel):
+        self._b = brotli.Compressor(quality=nivel)
+
+    def compress(self, datos):
+        return self._b.process(datos)
+
+    def flush(self, final=True):
+        return self._b.finish() if final else self._b.flush()
+
+
+def _comprimible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    # send_file (fotos, avatar) transmite el archivo tal cual
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return response.mimetype in TIPOS_COMPRIMIBLES
+
+
+def _por_partes(partes, compresor):
+    """Comprimir un cuerpo en streaming: cada parte sale sin esperar a las siguientes"""
+    try:
+        for parte in partes:
+            if isinstance(parte, str):
+                parte = parte.encode('utf-8')
+            datos = compresor.compress(parte) + compresor.flush(final=False)
+            if datos:
+                yield datos
+        yield compresor.flush()
+    finally:
+        if hasattr(partes, 'close'):
+            partes.close()
+
+
+def comprimir(response, minimo=500, nivel_gzip=6, nivel_brotli=4):
+    """Comprimir la respuesta si el cliente lo acepta y el cuerpo lo justifica"""
+    if request.blueprint in EXCLUIDOS or not _comprimible(response):
+        return response
+
+    # La representación depende de Accept-Encoding aunque esta vez no se comprima
+    response.vary.add('Accept-Encoding')
+    codificacion = request.accept_encodings.best_match(codificaciones())
+    if codificacion is None:
+        return response
+
+    if response.is_streamed:
+        # El tamaño no se conoce de antemano: se comprime siempre
+        response.response = _por_partes(response.response, _compresor(codificacion, nivel_gzip, nivel_brotli))
+        response.headers.pop('Content-Length', None)
+    else:
+        cuerpo = response.get_data()
+        if len(cuerpo) < minimo:
+            return response
+        compresor = _compresor(codificacion, nivel_gzip, nivel_brotli)
+        response.set_data(compresor.compress(cuerpo) + compresor.flush())
+
+    response.headers['Content-Encoding'] = codificacion
+    # Un ETag fuerte identifica los bytes sin comprimir
+    etag, debil = response.get_etag()
+    if etag and not debil:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def configurar_compresion(app):
+    """Comprimir las respuestas de la app según COMPRESION_* de la configuración"""
+    if not app.config['COMPRESION']:
+        return
+
+    minimo = app.config['COMPRESION_MINIMO']
+    nivel_gzip = app.config['COMPRESION_NIVEL_GZIP']
+    nivel_brotli = app.config['COMPRESION_NIVEL_BROTLI']
+
+    @app.after_request
+    def comprimir_respuesta(response):
+        return comprimir(response, minimo, nivel_gzip, nivel_brotli)
@@ -2,21 +2,50 @@
 Utilidades para manejo de fotos
 """
 import os
+import threading
 from pathlib import Path
+from utils.metricas import cache_acierto, cache_fallo
 
 # Ruta a la carpeta de fotos (dentro de gymControl)
 PHOTOS_DIR = Path(__file__).parent.parent / "fotos"
 
+EXTENSIONES = ['.jpg', '.JPG', '.jpeg', '.JPEG', '.png', '.PNG']
+
+# Índice {usuario_id: ruta} de la carpeta de fotos, se reconstruye si cambia su mtime
+_indice = {'mtime': None, 'fotos': {}}
+_indice_lock = threading.Lock()
+
+def _get_indice():
+    """Obtener el índice de fotos, releyendo la carpeta solo si cambió"""
+    try:
+        mtime = PHOTOS_DIR.stat().st_mtime_ns
+    except OSError:
+        return {}
+
+    if _indice['mtime'] == mtime:
+        cache_acierto('fotos')
+        return _indice['fotos']
+
+    cache_fallo('fotos')
+    with _indice_lock:
+        if _indice['mtime'] != mtime:
+            fotos = {}
+            with os.scandir(PHOTOS_DIR) as entradas:
+                for entrada in entradas:
+                    nombre, ext = os.path.splitext(entrada.name)
+                    if ext not in EXTENSIONES:
+                        continue
+                    # Respetar la prioridad de extensiones del listado
+                    actual = fotos.get(nombre)
+                    if actual is None or EXTENSIONES.index(ext) < EXTENSIONES.index(os.path.splitext(actual)[1]):
+                        fotos[nombre] = entrada.path
+            _indice['fotos'] = fotos
+            _indice['mtime'] = mtime
+    return _indice['fotos']
+
 def get_foto_path(usuario_id):
     """Obtener la ruta de la foto de un usuario"""
-    extensiones = ['.jpg', '.JPG', '.jpeg', '.JPEG', '.png', '.PNG']
-    
-    for ext in extensiones:
-        foto_path = PHOTOS_DIR / f"{usuario_id}{ext}"
-        if foto_path.exists():
-            return str(foto_path)
-    
-    return None
+    return _get_indice().get(str(usuario_id))
 
 def tiene_foto(usuario_id):
     """Verificar si un usuario tiene foto"""
@@ -0,0 +1,148 @@
+"""
+Caché de plantillas Jinja
+
+- Bytecode: las plantillas compiladas se guardan en disco (JINJA_CACHE_DIR)
+  y las reutilizan todos los workers y reinicios; cambiar el .html cambia
+  su checksum y se recompila.
+- Fragmentos: {% cache 'nombre', clave, ... %} ... {% endcache %} guarda el
+  HTML renderizado en memoria del proceso. La clave debe incluir todo lo
+  que cambia el resultado; para datos de MongoDB, version_datos('usuarios').
+  La versión se lee del primario: los datos del fragmento también, o se
+  guardaría HTML de un secundario atrasado bajo la versión nueva.
+
+    {% cache 'membresias-tabla', version_datos('usuarios'), filtro, fecha_hoy() %}
+        ... filas ...
+    {% endcache %}
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from flask import g
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from models import db_manager
+from models.versiones import VersionesDatos
+from .metricas import cache_acierto, cache_fallo
+
+
+class CacheFragmentos:
+    """LRU de HTML renderizado, limitado en bytes y con vencimiento
+
+    El vencimiento cubre cambios que no pasan por los modelos (edición
+    directa en MongoDB, fotos nuevas en disco).
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            if entrada[1] < time.monotonic():
+                self._quitar(clave)
+                return None
+            self._datos.move_to_end(clave)
+            return entrada[0]
+
+    def guardar(self, clave, html):
+        tamano = len(html)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (html, time.monotonic() + self.ttl)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                self._quitar(next(iter(self._datos)))
+
+    def _quitar(self, clave):
+        html, _ = self._datos.pop(clave)
+        self._bytes -= len(html)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    @property
+    def stats(self):
+        return {'entradas': len(self._datos), 'bytes': self._bytes}
+
+
+class FragmentosExtension(Extension):
+    """Etiqueta {% cache clave, ... %} ... {% endcache %}"""
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        # Sin caché asignada la etiqueta solo renderiza
+        environment.extend(fragmentos=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        partes = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            partes.append(parser.parse_expression())
+        cuerpo = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_renderizar', [nodes.List(partes)]), [], [], cuerpo).set_lineno(lineno)
+
+    def _renderizar(self, partes, caller):
+        cache = self.environment.fragmentos
+        if cache is None:
+            return caller()
+        clave = tuple(partes)
+        try:
+            hash(clave)
+        except TypeError:
+            # dicts/listas (por ejemplo stats): su repr es estable para los mismos datos
+            clave = repr(clave)
+
+        html = cache.obtener(clave)
+        if html is not None:
+            cache_acierto('fragmentos')
+            return html
+        cache_fallo('fragmentos')
+        html = caller()
+        cache.guardar(clave, html)
+        return html
+
+
+def version_datos(*colecciones):
+    """Versión de los datos de las colecciones (una consulta por solicitud)"""
+    memo = g.setdefault('versiones_datos', {})
+    faltan = [c for c in colecciones if c not in memo]
+    if faltan:
+        memo.update(zip(faltan, VersionesDatos(db_manager.db).leer(*faltan)))
+    return tuple(memo[c] for c in colecciones)
+
+
+def configurar_plantillas(app):
+    """Bytecode en disco y fragmentos según JINJA_CACHE_DIR / FRAGMENTOS_* de la configuración
+
+    Debe llamarse antes del primer uso de app.jinja_env.
+    """
+    opciones = dict(app.jinja_options)
+    opciones['extensions'] = list(opciones.get('extensions', ())) + [FragmentosExtension]
+
+    directorio = app.config['JINJA_CACHE_DIR']
+    if directorio:
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            opciones['bytecode_cache'] = FileSystemBytecodeCache(directorio)
+        except OSError as e:
+            print(f"✗ Caché de bytecode de plantillas desactivada ({directorio}): {e}")
+    app.jinja_options = opciones
+
+    if app.config['FRAGMENTOS']:
+        app.jinja_env.fragmentos = CacheFragmentos(app.config['FRAGMENTOS_MAX_MB'] * 1024 * 1024,
+                                                   app.config['FRAGMENTOS_TTL'])
+    app.jinja_env.globals.update(version_datos=version_datos, fecha_hoy=date.today)
@@ -0,0 +1,132 @@
+"""
+Utilidades para importación masiva de usuarios desde CSV o XLSX
+"""
+import csv
+import io
+from datetime import datetime
+from itertools import islice
+from models import Usuario, Departamento
+
+# Tamaño de cada lote de escritura
+TAMANO_LOTE = 500
+
+CAMPOS_FECHA = ['fecha_nacimiento', 'fecha_inicio', 'fecha_fin']
+FORMATOS_FECHA = ['%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S']
+CAMPOS_REQUERIDOS = ['id', 'nombre', 'apellido']
+
+
+def leer_filas(archivo, nombre_archivo):
+    """Leer las filas de un CSV o XLSX como diccionarios, sin cargar todo en memoria"""
+    if nombre_archivo.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            encabezados = [str(c).strip().lower() if c is not None else '' for c in next(filas, ())]
+            for fila in filas:
+                yield dict(zip(encabezados, fila))
+        finally:
+            libro.close()
+    else:
+        texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+        lector = csv.DictReader(texto)
+        lector.fieldnames = [c.strip().lower() for c in (lector.fieldnames or [])]
+        for fila in lector:
+            yield fila
+
+
+def parse_fecha(valor):
+    """Convertir un valor de celda a datetime"""
+    if valor in (None, ''):
+        return None
+    if isinstance(valor, datetime):
+        return valor
+    texto = str(valor).strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: {texto}")
+
+
+class ImportadorUsuarios:
+    """Importa usuarios por lotes y genera un reporte de errores por fila"""
+
+    def __init__(self, db, tamano_lote=TAMANO_LOTE):
+        self.usuario_model = Usuario(db)
+        self.departamentos = Departamento(db).get_mapa()
+        self.tamano_lote = tamano_lote
+
+    def normalizar(self, fila):
+        """Validar una fila y convertirla en datos de usuario"""
+        data = {k: (v.strip() if isinstance(v, str) else v)
+                for k, v in fila.items() if k and v not in (None, '')}
+
+        faltantes = [campo for campo in CAMPOS_REQUERIDOS if not data.get(campo)]
+        if faltantes:
+            raise ValueError(f"Campos requeridos: {', '.join(faltantes)}")
+
+        try:
+            data['id'] = int(float(data['id']))
+        except (TypeError, ValueError):
+            raise ValueError(f"ID inválido: {data['id']}")
+
+        for campo in CAMPOS_FECHA:
+            if campo in data:
+                data[campo] = parse_fecha(data[campo])
+
+        # Resolver departamento por ID o por nombre usando el mapa precargado
+        departamento = data.pop('departamento', None)
+        clave = data.get('departamento_id') or departamento
+        if clave:
+            entrada = self.departamentos.get(str(clave).strip()) or \
+                self.departamentos.get(str(clave).strip().lower())
+            if not entrada:
+                raise ValueError(f"Departamento no encontrado: {clave}")
+            data['departamento_id'], data['departamento_nombre'] = entrada
+
+        for campo in ('codigo', 'celular', 'numero_documento'):
+            if campo in data:
+                data[campo] = str(data[campo])
+
+        return data
+
+    def importar(self, filas):
+        """Importar un iterable de filas y devolver el reporte"""
+        reporte = {'total': 0, 'insertados': 0, 'actualizados': 0, 'errores': []}
+        # Las filas de datos empiezan en la 2 (la 1 es el encabezado)
+        numeradas = enumerate(filas, start=2)
+        vistos = set()
+
+        while True:
+            bloque = list(islice(numeradas, self.tamano_lote))
+            if not bloque:
+                break
+            reporte['total'] += len(bloque)
+
+            lote = []
+            numeros = []
+            for numero, fila in bloque:
+                if all(valor in (None, '') for valor in fila.values()):
+                    continue
+                try:
+                    data = self.normalizar(fila)
+                except ValueError as e:
+                    reporte['errores'].append({'fila': numero, 'error': str(e)})
+                    continue
+                if data['id'] in vistos:
+                    reporte['errores'].append({'fila': numero, 'error': f"ID duplicado en el archivo: {data['id']}"})
+                    continue
+                vistos.add(data['id'])
+                lote.append(data)
+                numeros.append(numero)
+
+            resultado = self.usuario_model.importar_lote(lote)
+            reporte['insertados'] += resultado['insertados']
+            reporte['actualizados'] += resultado['actualizados']
+            for indice, error in resultado['errores']:
+                reporte['errores'].append({'fila': numeros[indice], 'error': error})
+
+        reporte['errores'].sort(key=lambda e: e['fila'])
+        return reporte
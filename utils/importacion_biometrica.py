@@ -0,0 +1,308 @@
+"""
+Importación masiva de plantillas biométricas desde volcados de terminales
+(JSON lines o CSV con templates en base64)
+"""
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from itertools import islice
+from pymongo.errors import BulkWriteError
+from models import Usuario
+from reconocimiento import motor
+from reconocimiento.codec import FORMATO_VERSION, codificar_template
+from utils.importacion import leer_filas, parse_fecha
+from utils.trabajos import ColaTrabajos
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover - se usa el json estándar
+    _json_loads = json.loads
+
+# Registros por bloque (un bloque = una tarea de worker y un insert_many)
+TAMANO_LOTE = 1000
+
+EXTENSIONES_JSONL = ('.jsonl', '.ndjson', '.json')
+# Errores por fila que se guardan en el resultado de un trabajo (límite de 16 MB por documento)
+MAX_ERRORES = 1000
+CAMPOS_USUARIO = ['usuario_id', 'user_id', 'id']
+
+# Los templates en base64 superan el límite por defecto de campo del módulo csv
+csv.field_size_limit(max(csv.field_size_limit(), 1 << 24))
+
+
+def leer_registros(archivo, nombre_archivo):
+    """Registros numerados del volcado: líneas JSON crudas o filas CSV como diccionarios"""
+    if nombre_archivo.lower().endswith(EXTENSIONES_JSONL):
+        for numero, linea in enumerate(archivo, start=1):
+            if linea.strip():
+                yield numero, linea
+    else:
+        # Las filas de datos empiezan en la 2 (la 1 es el encabezado)
+        yield from enumerate(leer_filas(archivo, nombre_archivo), start=2)
+
+
+def normalizar_registro(registro, compresion='zlib', dispositivo='Importación', ahora=None):
+    """Validar un registro y convertirlo en documento de plantilla_biometrica"""
+    if isinstance(registro, (str, bytes)):
+        try:
+            registro = _json_loads(registro)
+        except ValueError:
+            raise ValueError("JSON inválido")
+        if not isinstance(registro, dict):
+            raise ValueError("Se esperaba un objeto JSON")
+
+    data = {str(k).strip().lower(): (v.strip() if isinstance(v, str) else v)
+            for k, v in registro.items() if k and v not in (None, '')}
+
+    usuario_id = next((data[campo] for campo in CAMPOS_USUARIO if campo in data), None)
+    tipo = data.get('tipo_plantilla') or data.get('tipo')
+    if usuario_id is None or not tipo or 'template' not in data:
+        raise ValueError("Campos requeridos: usuario_id, tipo_plantilla, template")
+
+    try:
+        usuario_id = int(float(usuario_id))
+    except (TypeError, ValueError):
+        raise ValueError(f"usuario_id inválido: {usuario_id}")
+
+    try:
+        calidad = float(data.get('calidad', 0.0))
+    except (TypeError, ValueError):
+        raise ValueError(f"Calidad inválida: {data['calidad']}")
+
+    ahora = ahora or datetime.now()
+    return {
+        'usuario_id': usuario_id,
+        'tipo': tipo,
+        'tipo_plantilla': tipo,
+        'template': codificar_template(data['template'], compresion),
+        'template_formato': FORMATO_VERSION,
+        'tiene_template_real': True,
+        'calidad': calidad,
+        'dispositivo': str(data.get('dispositivo', dispositivo)),
+        'fecha_registro': parse_fecha(data.get('fecha_registro')) or ahora,
+        'activo': True,
+        'created_at': ahora
+    }
+
+
+def normalizar_bloque(bloque, compresion='zlib', dispositivo='Importación'):
+    """Normalizar un bloque de (numero, registro) -> [(numero, documento, error)]
+
+    Se ejecuta en los procesos worker; los errores se devuelven por fila.
+    """
+    ahora = datetime.now()
+    resultado = []
+    for numero, registro in bloque:
+        try:
+            resultado.append((numero, normalizar_registro(registro, compresion, dispositivo, ahora), None))
+        except ValueError as e:
+            resultado.append((numero, None, str(e)))
+    return resultado
+
+
+def crear_pool(procesos):
+    """Pool de procesos para normalizar bloques (spawn: seguro con los threads de la app)"""
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('spawn'))
+
+
+class ImportadorPlantillas:
+    """Importa plantillas por bloques, normalizando en paralelo y con un reporte de errores por fila"""
+
+    def __init__(self, db, tamano_lote=TAMANO_LOTE, procesos=4, compresion='zlib', dispositivo='Importación',
+                 executor=None):
+        self.collection = db.plantillas_biometricas
+        self.usuario_model = Usuario(db)
+        # Un solo viaje a la base para validar todos los usuarios del archivo
+        self.usuario_ids = self.usuario_model.get_ids()
+        self.tamano_lote = tamano_lote
+        self.procesos = procesos
+        self.compresion = compresion
+        self.dispositivo = dispositivo
+        # Pool de procesos ajeno (se reutiliza entre importaciones); sin él se crea uno por importación
+        self.executor = executor
+
+    def _bloques(self, registros):
+        registros = iter(registros)
+        while True:
+            bloque = list(islice(registros, self.tamano_lote))
+            if not bloque:
+                break
+            yield bloque
+
+    def _normalizados(self, registros):
+        """Bloques normalizados en orden; con procesos > 0 se reparten entre workers"""
+        if not self.procesos:
+            for bloque in self._bloques(registros):
+                yield normalizar_bloque(bloque, self.compresion, self.dispositivo)
+            return
+
+        if self.executor is not None:
+            yield from self._en_paralelo(self.executor, registros)
+            return
+
+        with crear_pool(self.procesos) as executor:
+            yield from self._en_paralelo(executor, registros)
+
+    def _en_paralelo(self, executor, registros):
+        # Ventana acotada de bloques en vuelo para no leer todo el archivo en memoria
+        pendientes = deque()
+        for bloque in self._bloques(registros):
+            pendientes.append(executor.submit(normalizar_bloque, bloque, self.compresion, self.dispositivo))
+            if len(pendientes) >= self.procesos * 2:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+    def _insertar(self, documentos):
+        """insert_many no ordenado -> (insertadas, [(indice, error)])"""
+        if not documentos:
+            return 0, []
+        try:
+            return len(self.collection.insert_many(documentos, ordered=False).inserted_ids), []
+        except BulkWriteError as e:
+            detalle = e.details
+            return detalle.get('nInserted', 0), [(err['index'], err.get('errmsg', 'Error de escritura'))
+                                                 for err in detalle.get('writeErrors', [])]
+
+    def importar(self, registros, progreso=None):
+        """Importar un iterable de (numero, registro) y devolver el reporte
+
+        progreso(total=..., insertadas=..., errores=...) recibe lo sumado por cada bloque.
+        """
+        reporte = {'total': 0, 'insertadas': 0, 'usuarios': 0, 'errores': []}
+        afectados = set()
+
+        for bloque in self._normalizados(registros):
+            reporte['total'] += len(bloque)
+
+            documentos = []
+            numeros = []
+            for numero, documento, error in bloque:
+                if error is None and documento['usuario_id'] not in self.usuario_ids:
+                    error = f"Usuario no encontrado: {documento['usuario_id']}"
+                if error is not None:
+                    reporte['errores'].append({'fila': numero, 'error': error})
+                    continue
+                documentos.append(documento)
+                numeros.append(numero)
+
+            insertadas, fallidas = self._insertar(documentos)
+            reporte['insertadas'] += insertadas
+            fallidos = set()
+            for indice, error in fallidas:
+                fallidos.add(indice)
+                reporte['errores'].append({'fila': numeros[indice], 'error': error})
+            afectados.update(documento['usuario_id'] for i, documento in enumerate(documentos)
+                             if i not in fallidos)
+            if progreso:
+                progreso(total=len(bloque), insertadas=insertadas, errores=len(bloque) - insertadas)
+
+        # Resumen biométrico de todos los usuarios tocados en un solo bulk_write
+        self.usuario_model.actualizar_resumen_biometria(afectados)
+        reporte['usuarios'] = len(afectados)
+        reporte['errores'].sort(key=lambda e: e['fila'])
+        return reporte
+
+
+class ImportacionesPlantillas(ColaTrabajos):
+    """Importaciones de volcados en segundo plano (API)
+
+    El archivo subido se guarda en 'directorio' y lo importa un worker del
+    mismo host con un único pool de procesos, creado en la primera
+    importación y reutilizado por las siguientes. Una importación
+    interrumpida no se repite (duplicaría lo ya insertado): queda como error.
+    """
+    coleccion = 'trabajos_importacion'
+    local = True
+    reintentar = False
+
+    def __init__(self, directorio='data/importaciones', procesos=4, compresion='zlib', vencimiento=900.0, **opciones):
+        super().__init__(vencimiento=vencimiento, **opciones)
+        self.configurar(directorio, procesos, compresion)
+        self._executor = None
+        self._executor_pid = None
+
+    def configurar(self, directorio, procesos=4, compresion='zlib'):
+        """Directorio de los archivos en espera, procesos de normalización y compresión"""
+        self.directorio = str(directorio)
+        self.procesos = procesos
+        self.compresion = compresion
+
+    def encolar(self, archivo, nombre_archivo, dispositivo='Importación'):
+        """Guardar el archivo subido y encolar su importación -> id del trabajo"""
+        os.makedirs(self.directorio, exist_ok=True)
+        extension = os.path.splitext(nombre_archivo)[1].lower()
+        ruta = os.path.abspath(os.path.join(self.directorio, f'{uuid.uuid4().hex}{extension}'))
+        with open(ruta, 'wb') as destino:
+            shutil.copyfileobj(archivo, destino)
+
+        try:
+            return super().encolar(
+                {'ruta': ruta, 'archivo': nombre_archivo, 'dispositivo': dispositivo},
+                progreso={'total': 0, 'insertadas': 0, 'errores': 0}
+            )
+        except Exception:
+            self._borrar(ruta)
+            raise
+
+    def _pool(self):
+        """Pool de normalización de este worker (None con procesos=0)"""
+        if not self.procesos:
+            return None
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = crear_pool(self.procesos)
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def procesar(self, trabajo, db):
+        datos = trabajo['datos']
+        importador = ImportadorPlantillas(db, procesos=self.procesos, compresion=self.compresion,
+                                          dispositivo=datos['dispositivo'], executor=self._pool())
+        try:
+            with open(datos['ruta'], 'rb') as archivo:
+                reporte = importador.importar(leer_registros(archivo, datos['archivo']),
+                                              progreso=lambda **suma: self.avanzar(trabajo, db, **suma))
+        except BrokenProcessPool:
+            # Un worker del pool murió: la próxima importación crea otro
+            self._executor = None
+            raise
+        finally:
+            self._borrar(datos['ruta'])
+
+        # Las plantillas nuevas entran a la galería de identificación
+        if reporte['insertadas']:
+            self.avanzar(trabajo, db)
+            motor.reconstruir(db)
+
+        errores = reporte['errores']
+        reporte['errores'] = errores[:MAX_ERRORES]
+        reporte['errores_omitidos'] = max(0, len(errores) - MAX_ERRORES)
+        return reporte
+
+    def descartar(self, trabajo):
+        self._borrar(trabajo['datos']['ruta'])
+
+    @staticmethod
+    def _borrar(ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    def cerrar(self):
+        """Apagar el pool de procesos de este worker"""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+# Instancia global
+importaciones = ImportacionesPlantillas()
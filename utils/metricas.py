@@ -0,0 +1,330 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus (/metrics)
+
+Cada hilo acumula en su propio fragmento (sin locks al registrar una
+observación); los fragmentos se suman solo al exportar.
+"""
+import math
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from pymongo import monitoring
+
+# Límites (le) de los histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Fragmentos de hilos terminados que se toleran antes de consolidarlos
+MAX_FRAGMENTOS = 64
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        if math.isinf(valor):
+            return '+Inf' if valor > 0 else '-Inf'
+        if valor.is_integer():
+            return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class _Familia:
+    """Base de las métricas: nombre, ayuda y nombres de etiquetas"""
+
+    tipo = None
+
+    def __init__(self, registro, nombre, ayuda, etiquetas=()):
+        self.registro = registro
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+
+    def _clave(self, etiquetas):
+        return (self.nombre, tuple(etiquetas))
+
+
+class Contador(_Familia):
+    """Valor que solo crece (solicitudes, aciertos de caché, asistencias)"""
+
+    tipo = 'counter'
+
+    def incrementar(self, etiquetas=(), valor=1):
+        fragmento = self.registro._fragmento()
+        clave = (self.nombre, etiquetas)
+        fragmento[clave] = fragmento.get(clave, 0) + valor
+
+    def _lineas(self, valores):
+        for (_, etiquetas), valor in sorted(valores.items()):
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}"
+
+
+class Medidor(Contador):
+    """Valor que sube y baja (solicitudes en curso); cada hilo suma su parte"""
+
+    tipo = 'gauge'
+
+    def sumar(self, etiquetas=(), valor=1):
+        self.incrementar(etiquetas, valor)
+
+    def restar(self, etiquetas=(), valor=1):
+        self.incrementar(etiquetas, -valor)
+
+
+class Histograma(_Familia):
+    """Distribución en buckets fijos, más suma y cantidad"""
+
+    tipo = 'histogram'
+
+    def __init__(self, registro, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(registro, nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, etiquetas=()):
+        fragmento = self.registro._fragmento()
+        clave = (self.nombre, etiquetas)
+        cuentas = fragmento.get(clave)
+        if cuentas is None:
+            # [cuenta por bucket..., +Inf, suma, cantidad]
+            cuentas = fragmento[clave] = [0] * (len(self.buckets) + 3)
+        cuentas[bisect_left(self.buckets, valor)] += 1
+        cuentas[-2] += valor
+        cuentas[-1] += 1
+
+    def _lineas(self, valores):
+        limites = [_numero(float(b)) for b in self.buckets] + ['+Inf']
+        for (_, etiquetas), cuentas in sorted(valores.items()):
+            acumulado = 0
+            for limite, cuenta in zip(limites, cuentas):
+                acumulado += cuenta
+                extra = f'le="{limite}"'
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, etiquetas, extra)} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(float(cuentas[-2]))}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {cuentas[-1]}"
+
+
+def _sumar(destino, origen):
+    """Acumular un fragmento en otro (listas de histograma elemento a elemento)"""
+    for clave, valor in origen.items():
+        actual = destino.get(clave)
+        if actual is None:
+            destino[clave] = list(valor) if isinstance(valor, list) else valor
+        elif isinstance(valor, list):
+            destino[clave] = [a + b for a, b in zip(actual, valor)]
+        else:
+            destino[clave] = actual + valor
+
+
+class Registro:
+    """Métricas registradas y recolectores que se evalúan al exportar"""
+
+    def __init__(self):
+        self._familias = {}
+        self._recolectores = []
+        self._local = threading.local()
+        self._fragmentos = []  # [(referencia al hilo, valores)]
+        self._consolidado = {}  # Valores de hilos ya terminados
+        self._lock = threading.Lock()
+
+    def _fragmento(self):
+        """Valores del hilo actual (se crea la primera vez, única vez que se toma el lock)"""
+        try:
+            return self._local.valores
+        except AttributeError:
+            valores = self._local.valores = {}
+            with self._lock:
+                if len(self._fragmentos) >= MAX_FRAGMENTOS:
+                    self._consolidar()
+                self._fragmentos.append((weakref.ref(threading.current_thread()), valores))
+            return valores
+
+    def _consolidar(self):
+        """Pasar los fragmentos de hilos terminados al consolidado (con el lock tomado)"""
+        vivos = []
+        for hilo, valores in self._fragmentos:
+            actual = hilo()
+            if actual is not None and actual.is_alive():
+                vivos.append((hilo, valores))
+            else:
+                _sumar(self._consolidado, valores)
+        self._fragmentos = vivos
+
+    def _registrar(self, familia):
+        with self._lock:
+            existente = self._familias.get(familia.nombre)
+            if existente is not None:
+                return existente
+            self._familias[familia.nombre] = familia
+        return familia
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(self, nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Medidor(self, nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        return self._registrar(Histograma(self, nombre, ayuda, etiquetas, buckets))
+
+    def recolector(self, funcion):
+        """Registrar una función que devuelve [(nombre, tipo, ayuda, {etiquetas: valor})]
+
+        Se llama solo al exportar: sirve para valores que ya existen en otro
+        objeto (tamaño del pool, profundidad de cola) sin instrumentar su camino.
+        """
+        self._recolectores.append(funcion)
+        return funcion
+
+    def valores(self):
+        """Suma de todos los fragmentos -> {(nombre, etiquetas): valor}"""
+        with self._lock:
+            self._consolidar()
+            total = {}
+            _sumar(total, self._consolidado)
+            for _, valores in self._fragmentos:
+                # La copia es atómica con el GIL aunque el hilo siga escribiendo
+                _sumar(total, valores.copy())
+        return total
+
+    def exportar(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)"""
+        por_familia = {}
+        for clave, valor in self.valores().items():
+            por_familia.setdefault(clave[0], {})[clave] = valor
+
+        lineas = []
+        for nombre, familia in sorted(self._familias.items()):
+            lineas.append(f"# HELP {nombre} {familia.ayuda}")
+            lineas.append(f"# TYPE {nombre} {familia.tipo}")
+            lineas.extend(familia._lineas(por_familia.get(nombre, {})))
+
+        for funcion in self._recolectores:
+            try:
+                series = funcion()
+            except Exception as e:
+                lineas.append(f"# recolector {funcion.__name__} falló: {_escapar(e)}")
+                continue
+            for nombre, tipo, ayuda, muestras in series:
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                for etiquetas, valor in muestras.items():
+                    if valor is None:
+                        continue
+                    nombres = [n for n, _ in etiquetas]
+                    lineas.append(f"{nombre}{_etiquetas(nombres, [v for _, v in etiquetas])} {_numero(valor)}")
+        return '\n'.join(lineas) + '\n'
+
+    def reiniciar(self):
+        """Borrar lo acumulado (los hilos vivos empiezan un fragmento nuevo)"""
+        with self._lock:
+            self._fragmentos = []
+            self._consolidado = {}
+            self._local = threading.local()
+
+
+# Instancia global
+metricas = Registro()
+
+# --- Métricas compartidas por varios módulos ---
+
+CACHE = metricas.contador(
+    'gym_cache_consultas_total', 'Consultas a cachés en memoria por resultado (acierto/fallo)',
+    ('cache', 'resultado'))
+
+ASISTENCIAS = metricas.contador(
+    'gym_asistencias_registradas_total', 'Asistencias registradas por método de acceso',
+    ('metodo',))
+
+
+def cache_acierto(cache):
+    CACHE.incrementar((cache, 'acierto'))
+
+
+def cache_fallo(cache):
+    CACHE.incrementar((cache, 'fallo'))
+
+
+# =====================================
+# POOL DE CONEXIONES MONGODB
+# =====================================
+
+_CONEXIONES = metricas.medidor(
+    'gym_mongo_conexiones', 'Conexiones abiertas del pool de MongoDB', ('servidor',))
+_CONEXIONES_EN_USO = metricas.medidor(
+    'gym_mongo_conexiones_en_uso', 'Conexiones del pool tomadas por un hilo', ('servidor',))
+_ESPERA = metricas.histograma(
+    'gym_mongo_espera_conexion_segundos', 'Espera para obtener una conexión del pool', ('servidor',))
+_FALLOS_CHECKOUT = metricas.contador(
+    'gym_mongo_checkout_fallidos_total', 'Conexiones que no se pudieron obtener del pool',
+    ('servidor', 'motivo'))
+_POOL_LIMPIADO = metricas.contador(
+    'gym_mongo_pool_limpiado_total', 'Veces que el driver vació el pool (errores de red, failover)',
+    ('servidor',))
+
+
+def _servidor(address):
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+
+
+class MonitorPool(monitoring.ConnectionPoolListener):
+    """ConnectionPoolListener que lleva conexiones abiertas, en uso y la espera por una
+
+    Los eventos de checkout corren en el hilo que pide la conexión, así que
+    el inicio de la espera se guarda por hilo.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        _POOL_LIMPIADO.incrementar((_servidor(event.address),))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        _CONEXIONES.sumar((_servidor(event.address),))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        _CONEXIONES.restar((_servidor(event.address),))
+
+    def connection_check_out_started(self, event):
+        self._local.inicio = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._local.inicio = None
+        _FALLOS_CHECKOUT.incrementar((_servidor(event.address), str(event.reason)))
+
+    def connection_checked_out(self, event):
+        servidor = (_servidor(event.address),)
+        inicio = getattr(self._local, 'inicio', None)
+        if inicio is not None:
+            _ESPERA.observar(time.perf_counter() - inicio, servidor)
+            self._local.inicio = None
+        _CONEXIONES_EN_USO.sumar(servidor)
+
+    def connection_checked_in(self, event):
+        _CONEXIONES_EN_USO.restar((_servidor(event.address),))
+
+
+# Instancia global (registrada en el MongoClient por Database.connect)
+monitor_pool = MonitorPool()
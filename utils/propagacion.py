@@ -0,0 +1,68 @@
+"""
+Propagación en segundo plano de los campos denormalizados del usuario
+(nombre y departamento) hacia asistencias, membresías y plantillas
+"""
+import time
+from models import Usuario
+from .trabajos import ColaTrabajos
+
+COLECCIONES = ['asistencias', 'membresias', 'plantillas_biometricas']
+
+
+class PropagadorCambios(ColaTrabajos):
+    """Worker que reescribe documentos denormalizados en lotes con pausas
+
+    Los trabajos viven en 'trabajos_propagacion': el progreso se consulta
+    desde cualquier worker y los pendientes sobreviven al reciclado.
+    """
+    coleccion = 'trabajos_propagacion'
+
+    def __init__(self, tamano_lote=500, pausa=0.05, **opciones):
+        super().__init__(**opciones)
+        self.tamano_lote = tamano_lote
+        self.pausa = pausa
+
+    def encolar(self, usuario_id, campos):
+        """Encolar la propagación de los campos cambiados de un usuario"""
+        return super().encolar(
+            {'usuario_id': int(usuario_id), 'campos': dict(campos)},
+            progreso={coleccion: 0 for coleccion in COLECCIONES}
+        )
+
+    @staticmethod
+    def armar_estado(trabajo):
+        return {
+            'id': str(trabajo['_id']),
+            'usuario_id': trabajo['datos']['usuario_id'],
+            'campos': trabajo['datos']['campos'],
+            'estado': trabajo['estado'],
+            'actualizados': trabajo['progreso'],
+            'error': trabajo['error']
+        }
+
+    def procesar(self, trabajo, db):
+        """Reescribir los documentos de cada colección en lotes de update_many"""
+        usuario_id = trabajo['datos']['usuario_id']
+        # Los valores vigentes del usuario, no los del momento de encolar: si dos
+        # ediciones seguidas se procesan en workers distintos, gana la última
+        usuario = Usuario(db).find_by_id(usuario_id)
+        campos = Usuario.campos_denormalizados(usuario) if usuario else trabajo['datos']['campos']
+        filtro = {
+            'usuario_id': usuario_id,
+            '$or': [{campo: {'$ne': valor}} for campo, valor in campos.items()]
+        }
+
+        for coleccion in COLECCIONES:
+            collection = db[coleccion]
+            while True:
+                ids = [doc['_id'] for doc in collection.find(filtro, {'_id': 1}).limit(self.tamano_lote)]
+                if not ids:
+                    break
+                result = collection.update_many({'_id': {'$in': ids}}, {'$set': campos})
+                self.avanzar(trabajo, db, **{coleccion: result.modified_count})
+                # Ceder espacio a las escrituras del resto de la aplicación
+                time.sleep(self.pausa)
+
+
+# Instancia global
+propagador = PropagadorCambios()
@@ -0,0 +1,67 @@
+"""
+Proveedor JSON de Flask con soporte nativo para tipos BSON
+(ObjectId, datetime, Decimal128) usando orjson cuando está disponible
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - se usa el json estándar
+    orjson = None
+
+
+def bson_default(obj):
+    """Convertir tipos no serializables por defecto"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        # Arreglos y escalares de NumPy
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """Serializa respuestas JSON sin tener que convertir los documentos a mano"""
+
+    default = staticmethod(bson_default)
+
+    if orjson is not None:
+        OPCIONES = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+        def _opciones(self, indentar=False, ordenar=None):
+            opciones = self.OPCIONES
+            if self.sort_keys if ordenar is None else ordenar:
+                opciones |= orjson.OPT_SORT_KEYS
+            if indentar:
+                opciones |= orjson.OPT_INDENT_2
+            return opciones
+
+        def dumps(self, obj, **kwargs):
+            indent = kwargs.pop('indent', None)
+            ordenar = kwargs.pop('sort_keys', None)
+            default = kwargs.pop('default', bson_default)
+            # orjson solo indenta con 2 espacios y no tiene separators/ensure_ascii/...:
+            # esos casos los atiende el json estándar del proveedor base
+            if kwargs or indent not in (None, 2):
+                return super().dumps(obj, indent=indent, default=default,
+                                     sort_keys=self.sort_keys if ordenar is None else ordenar, **kwargs)
+            return orjson.dumps(obj, default=default, option=self._opciones(indent == 2, ordenar)).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            indentar = self.compact is False or (self.compact is None and self._app.debug)
+            data = orjson.dumps(obj, default=bson_default, option=self._opciones(indentar))
+            return self._app.response_class(data, mimetype=self.mimetype)
@@ -0,0 +1,206 @@
+"""
+Trabajos en segundo plano persistidos en MongoDB
+
+El estado de cada trabajo vive en una colección, no en la memoria del
+proceso: cualquier worker responde la consulta de progreso y los trabajos
+que dejó pendientes un worker reciclado los toma otro.
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from models import db_manager
+
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+
+class ColaTrabajos:
+    """Cola de trabajos en una colección de MongoDB, atendida por un thread en cada proceso
+
+    Un trabajo es un documento {_id: ObjectId, estado, datos, progreso, ...}.
+    El thread lo reclama con find_one_and_update (pendiente -> en_proceso)
+    y renueva 'latido' con cada avance; si el proceso muere a mitad, el
+    trabajo vuelve a reclamarse cuando el latido supera 'vencimiento'.
+    Las subclases definen 'coleccion' y procesar(trabajo, db).
+    """
+    coleccion = None
+    # True: solo lo procesa el host que lo encoló (los datos están en su disco)
+    local = False
+    # False: un trabajo abandonado se marca como error en vez de repetirse
+    # (para trabajos que no se pueden ejecutar dos veces sin duplicar datos)
+    reintentar = True
+
+    def __init__(self, espera=5.0, vencimiento=300.0, retencion=7 * 24 * 3600):
+        self.espera = espera
+        self.vencimiento = vencimiento
+        self.retencion = retencion
+        self.host = socket.gethostname()
+        self._despertar = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._indices = False
+
+    def _collection(self, db=None):
+        db = db if db is not None else db_manager.db
+        return db[self.coleccion]
+
+    def encolar(self, datos, progreso=None):
+        """Guardar un trabajo pendiente y devolver su id (texto del ObjectId)"""
+        trabajo = {
+            'estado': PENDIENTE,
+            'datos': datos,
+            'progreso': progreso or {},
+            'resultado': None,
+            'error': None,
+            'host': self.host,
+            'worker': None,
+            'intentos': 0,
+            'creado': datetime.now(),
+            'inicio': None,
+            'fin': None,
+            'latido': None
+        }
+        trabajo_id = self._collection().insert_one(trabajo).inserted_id
+        self.iniciar()
+        self._despertar.set()
+        return str(trabajo_id)
+
+    def estado(self, trabajo_id):
+        """Progreso de un trabajo; None si el id no existe o no es válido"""
+        try:
+            trabajo_id = ObjectId(trabajo_id)
+        except (InvalidId, TypeError):
+            return None
+        trabajo = self._collection().find_one({'_id': trabajo_id})
+        return self.armar_estado(trabajo) if trabajo else None
+
+    @staticmethod
+    def armar_estado(trabajo):
+        """Respuesta de la API de progreso para un documento de trabajo"""
+        return {
+            'id': str(trabajo['_id']),
+            'estado': trabajo['estado'],
+            'progreso': trabajo['progreso'],
+            'resultado': trabajo['resultado'],
+            'error': trabajo['error'],
+            'creado': trabajo['creado'],
+            'fin': trabajo['fin']
+        }
+
+    def pendientes(self):
+        """Cantidad de trabajos esperando un worker"""
+        return self._collection().count_documents({'estado': PENDIENTE})
+
+    def iniciar(self, db=None):
+        """Arrancar el thread de este proceso si no está corriendo (seguro tras un fork)
+
+        Acepta db para usarse como tarea de db_manager.calentar().
+        """
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return self._thread
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f'trabajos-{self.coleccion}', daemon=True)
+            self._thread.start()
+            return self._thread
+
+    def _asegurar_indices(self, collection):
+        if self._indices:
+            return
+        collection.create_index([('estado', 1), ('creado', 1)])
+        # Los terminados se borran solos pasado el tiempo de retención
+        collection.create_index([('fin', 1)], expireAfterSeconds=self.retencion)
+        self._indices = True
+
+    def _filtro(self, filtro):
+        if self.local:
+            filtro['host'] = self.host
+        return filtro
+
+    def _abandonados(self, collection):
+        """Marcar como error los trabajos de workers caídos que no se pueden repetir"""
+        ahora = datetime.now()
+        filtro = self._filtro({'estado': EN_PROCESO,
+                               'latido': {'$lt': ahora - timedelta(seconds=self.vencimiento)}})
+        for trabajo in collection.find(filtro):
+            marcado = collection.update_one(
+                {'_id': trabajo['_id'], 'estado': EN_PROCESO},
+                {'$set': {'estado': ERROR, 'error': 'El worker se detuvo antes de terminar', 'fin': ahora}}
+            )
+            if marcado.modified_count:
+                self.descartar(trabajo)
+
+    def _reclamar(self, collection):
+        """Tomar el trabajo pendiente más antiguo (o uno abandonado por un worker caído)"""
+        ahora = datetime.now()
+        if self.reintentar:
+            filtro = self._filtro({'$or': [
+                {'estado': PENDIENTE},
+                {'estado': EN_PROCESO, 'latido': {'$lt': ahora - timedelta(seconds=self.vencimiento)}}
+            ]})
+        else:
+            self._abandonados(collection)
+            filtro = self._filtro({'estado': PENDIENTE})
+        return collection.find_one_and_update(
+            filtro,
+            {'$set': {'estado': EN_PROCESO, 'worker': f'{self.host}:{os.getpid()}', 'inicio': ahora, 'latido': ahora},
+             '$inc': {'intentos': 1}},
+            sort=[('creado', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _run(self):
+        """Bucle del worker: reclamar y procesar; sin trabajos, esperar un aviso o 'espera' segundos"""
+        while True:
+            db = db_manager.db
+            trabajo = None
+            if db is not None:
+                try:
+                    collection = self._collection(db)
+                    self._asegurar_indices(collection)
+                    trabajo = self._reclamar(collection)
+                except PyMongoError as e:
+                    print(f"✗ Error al reclamar trabajos de {self.coleccion}: {e}")
+
+            if trabajo is None:
+                if self._despertar.wait(self.espera):
+                    self._despertar.clear()
+                continue
+            self._ejecutar(db, trabajo)
+
+    def _ejecutar(self, db, trabajo):
+        collection = self._collection(db)
+        try:
+            resultado = self.procesar(trabajo, db)
+            cambios = {'estado': COMPLETADO, 'resultado': resultado}
+        except Exception as e:
+            cambios = {'estado': ERROR, 'error': str(e)}
+            print(f"✗ Error en el trabajo {trabajo['_id']} de {self.coleccion}: {e}")
+        cambios['fin'] = datetime.now()
+        try:
+            collection.update_one({'_id': trabajo['_id']}, {'$set': cambios})
+        except PyMongoError as e:
+            # Queda en_proceso: otro worker lo retoma al vencer el latido
+            print(f"✗ No se pudo guardar el estado del trabajo {trabajo['_id']}: {e}")
+
+    def avanzar(self, trabajo, db, **incrementos):
+        """Sumar al progreso del trabajo y renovar su latido"""
+        operacion = {'$set': {'latido': datetime.now()}}
+        if incrementos:
+            operacion['$inc'] = {f'progreso.{clave}': valor for clave, valor in incrementos.items()}
+        self._collection(db).update_one({'_id': trabajo['_id']}, operacion)
+
+    def procesar(self, trabajo, db):
+        """Ejecutar el trabajo; lo que devuelve queda en 'resultado'"""
+        raise NotImplementedError
+
+    def descartar(self, trabajo):
+        """Liberar lo que dejó un trabajo abandonado (con reintentar=False)"""
@@ -0,0 +1,38 @@
+"""
+Punto de entrada WSGI para producción
+
+    gunicorn -c gunicorn.conf.py wsgi:app    (Linux: WEB_WORKERS procesos x WEB_THREADS hilos)
+    python wsgi.py                           (Windows: waitress, un proceso con WEB_THREADS hilos)
+
+La app se crea sin dejar abierta ninguna conexión a MongoDB: con preload los
+workers nacen por fork del maestro y cada uno conecta en segundo plano al
+arrancar (post_fork en gunicorn.conf.py), así aceptan tráfico enseguida.
+"""
+import atexit
+import os
+from app import create_app, cerrar_recursos, iniciar_trabajos, preparar_galeria_compartida
+from models import db_manager
+from reconocimiento import despachador
+
+app = create_app(os.getenv('FLASK_ENV', 'production'), conectar=False)
+
+# Con varios procesos (workers de gunicorn o pool de puntuación) la galería
+# en disco se construye una sola vez, antes del fork; si MongoDB no responde
+# todavía, la construye el primer worker que conecta (post_fork).
+# Todo lo demás lo hace cada worker al arrancar con db_manager.calentar().
+if despachador.pool is not None or (__name__ != '__main__' and app.config['WEB_WORKERS'] > 1):
+    preparar_galeria_compartida()
+
+# Apagado ordenado del proceso (gunicorn también llama a cerrar_recursos en worker_exit)
+atexit.register(cerrar_recursos)
+
+
+if __name__ == '__main__':
+    try:
+        from waitress import serve
+    except ImportError:
+        raise SystemExit("waitress no está instalado (pip install waitress); en Linux usar gunicorn -c gunicorn.conf.py wsgi:app")
+
+    db_manager.calentar(tareas=[iniciar_trabajos])
+    serve(app, host=app.config['HOST'], port=app.config['PORT'], threads=app.config['WEB_THREADS'],
+          connection_limit=app.config['WEB_THREADS'] * 100, channel_timeout=app.config['WEB_TIMEOUT'])